@@ -115,3 +115,212 @@ CREATE TABLE IF NOT EXISTS pstand_aggregates
     aggregate_description VARCHAR(255) NOT NULL,
     aggregate_info TEXT  -- Store as JSON string
 );
+
+-- Item to label associations, one row per label in pstand_items.tags.
+-- project_id and bought_date are copied from the item, so label filters page
+-- through the label index alone. The triggers below keep the table in sync
+-- with the items on every write.
+CREATE TABLE IF NOT EXISTS pstand_item_labels
+(
+    item_id INTEGER NOT NULL REFERENCES pstand_items (item_id),
+    label_id INTEGER NOT NULL REFERENCES pstand_labels (label_id),
+    project_id INTEGER NOT NULL,
+    bought_date TIMESTAMP NOT NULL,
+    PRIMARY KEY (item_id, label_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS pstand_item_labels_insert
+AFTER INSERT ON pstand_items
+BEGIN
+    INSERT OR IGNORE INTO pstand_item_labels (item_id, label_id, project_id, bought_date)
+        SELECT NEW.item_id, value, NEW.project_id, NEW.bought_date FROM json_each(NEW.tags);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pstand_item_labels_update
+AFTER UPDATE OF tags, project_id, bought_date ON pstand_items
+BEGIN
+    DELETE FROM pstand_item_labels WHERE item_id = OLD.item_id;
+    INSERT OR IGNORE INTO pstand_item_labels (item_id, label_id, project_id, bought_date)
+        SELECT NEW.item_id, value, NEW.project_id, NEW.bought_date FROM json_each(NEW.tags);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pstand_item_labels_delete
+AFTER DELETE ON pstand_items
+BEGIN
+    DELETE FROM pstand_item_labels WHERE item_id = OLD.item_id;
+END;
+
+-- Transitive closure of the composite label hierarchy: a label is the parent
+-- of the labels in its composite list. One row per ancestor, descendant and
+-- path length, with the number of such paths (every label reaches itself
+-- with depth 0), so removing an edge is an exact subtraction.
+CREATE TABLE IF NOT EXISTS pstand_label_closure
+(
+    ancestor_id INTEGER NOT NULL REFERENCES pstand_labels (label_id),
+    descendant_id INTEGER NOT NULL REFERENCES pstand_labels (label_id),
+    depth INTEGER NOT NULL,
+    paths INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (ancestor_id, descendant_id, depth)
+) WITHOUT ROWID;
+
+-- Exchange rates, "1 base = rate quote" per day (functions/rates.py); the
+-- primary key serves the as-of lookups of a pair
+CREATE TABLE IF NOT EXISTS pstand_exchange_rates
+(
+    base VARCHAR(3) NOT NULL,
+    quote VARCHAR(3) NOT NULL,
+    rate_date DATE NOT NULL,
+    rate DECIMAL NOT NULL,
+    source VARCHAR(64) NOT NULL,
+    PRIMARY KEY (base, quote, rate_date)
+) WITHOUT ROWID;
+
+
+-- Full-text search over item names and notes and label names and
+-- descriptions (op_search). Both indexes are external content tables: they
+-- only store the index and read the text from pstand_items/pstand_labels. The
+-- triggers below keep them in sync; 'delete' must be given the old values.
+CREATE VIRTUAL TABLE IF NOT EXISTS pstand_items_fts USING fts5
+(
+    name, note,
+    content='pstand_items', content_rowid='item_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS pstand_items_fts_insert
+AFTER INSERT ON pstand_items
+BEGIN
+    INSERT INTO pstand_items_fts (rowid, name, note) VALUES (NEW.item_id, NEW.name, NEW.note);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pstand_items_fts_update
+AFTER UPDATE OF name, note ON pstand_items
+BEGIN
+    INSERT INTO pstand_items_fts (pstand_items_fts, rowid, name, note) VALUES ('delete', OLD.item_id, OLD.name, OLD.note);
+    INSERT INTO pstand_items_fts (rowid, name, note) VALUES (NEW.item_id, NEW.name, NEW.note);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pstand_items_fts_delete
+AFTER DELETE ON pstand_items
+BEGIN
+    INSERT INTO pstand_items_fts (pstand_items_fts, rowid, name, note) VALUES ('delete', OLD.item_id, OLD.name, OLD.note);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS pstand_labels_fts USING fts5
+(
+    name, description,
+    content='pstand_labels', content_rowid='label_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS pstand_labels_fts_insert
+AFTER INSERT ON pstand_labels
+BEGIN
+    INSERT INTO pstand_labels_fts (rowid, name, description) VALUES (NEW.label_id, NEW.name, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pstand_labels_fts_update
+AFTER UPDATE OF name, description ON pstand_labels
+BEGIN
+    INSERT INTO pstand_labels_fts (pstand_labels_fts, rowid, name, description) VALUES ('delete', OLD.label_id, OLD.name, OLD.description);
+    INSERT INTO pstand_labels_fts (rowid, name, description) VALUES (NEW.label_id, NEW.name, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pstand_labels_fts_delete
+AFTER DELETE ON pstand_labels
+BEGIN
+    INSERT INTO pstand_labels_fts (pstand_labels_fts, rowid, name, description) VALUES ('delete', OLD.label_id, OLD.name, OLD.description);
+END;
+
+-- Change log of the items for the delta sync of functions/sync.py: one row
+-- per item_uuid, moved to a new change_seq by every insert, update and delete
+-- (INSERT OR REPLACE). changed_at (UTC, milliseconds) decides conflicts;
+-- synced is set once the change is known to the other side.
+CREATE TABLE IF NOT EXISTS pstand_changes
+(
+    change_seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_uuid VARCHAR(36) NOT NULL UNIQUE,
+    project_id INTEGER NOT NULL,
+    deleted BOOLEAN NOT NULL DEFAULT 0,
+    changed_at TEXT NOT NULL,
+    synced BOOLEAN NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS pstand_changes_insert
+AFTER INSERT ON pstand_items
+BEGIN
+    INSERT OR REPLACE INTO pstand_changes (item_uuid, project_id, deleted, changed_at)
+        VALUES (NEW.item_uuid, NEW.project_id, 0, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS pstand_changes_update
+AFTER UPDATE ON pstand_items
+BEGIN
+    INSERT OR REPLACE INTO pstand_changes (item_uuid, project_id, deleted, changed_at)
+        VALUES (NEW.item_uuid, NEW.project_id, 0, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS pstand_changes_delete
+AFTER DELETE ON pstand_items
+BEGIN
+    INSERT OR REPLACE INTO pstand_changes (item_uuid, project_id, deleted, changed_at)
+        VALUES (OLD.item_uuid, OLD.project_id, 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'));
+END;
+
+-- Sync watermarks, e.g. the last change_seq of the server pulled per project
+CREATE TABLE IF NOT EXISTS pstand_sync_state
+(
+    name VARCHAR(255) PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+
+
+-- Indexes for the hot access paths. Existing databases pick up new entries
+-- of this section through SQLLiteHandler.op_ensure_indexes().
+
+-- Login looks users up by username OR email; email is covered by its UNIQUE
+-- constraint, so with this index both sides of the OR are index lookups
+CREATE INDEX IF NOT EXISTS pstand_users_username_idx
+    ON pstand_users (username);
+
+-- Projects of a user (op_project_get_info) and members of a project
+CREATE INDEX IF NOT EXISTS pstand_user_project_map_user_idx
+    ON pstand_user_project_map (user_id, project_id);
+CREATE INDEX IF NOT EXISTS pstand_user_project_map_project_idx
+    ON pstand_user_project_map (project_id, user_id);
+
+-- Labels of a project, already in the ORDER BY name order of op_label_get_all
+CREATE INDEX IF NOT EXISTS pstand_labels_project_idx
+    ON pstand_labels (project_id, name);
+
+-- Items of a project by date; item_id makes it usable as a keyset cursor
+CREATE INDEX IF NOT EXISTS pstand_items_project_date_idx
+    ON pstand_items (project_id, bought_date, item_id);
+CREATE INDEX IF NOT EXISTS pstand_items_uuid_idx
+    ON pstand_items (item_uuid);
+
+-- Items of a label by date (label filters with a keyset cursor); the primary
+-- key covers the labels of an item
+CREATE INDEX IF NOT EXISTS pstand_item_labels_label_idx
+    ON pstand_item_labels (label_id, project_id, bought_date, item_id);
+
+-- Ancestors and direct parents of a label in the composite hierarchy
+CREATE INDEX IF NOT EXISTS pstand_label_closure_descendant_idx
+    ON pstand_label_closure (descendant_id, depth, ancestor_id);
+
+-- Sessions are looked up by uuid (logout) and deleted per user (login)
+CREATE INDEX IF NOT EXISTS pstand_session_table_uuid_idx
+    ON pstand_session_table (session_uuid);
+CREATE INDEX IF NOT EXISTS pstand_session_table_user_idx
+    ON pstand_session_table (user_id);
+
+-- One monthly rollup row per project, dimension and month; the upserts of
+-- the rollup statements in functions/statements.py conflict on this key
+CREATE UNIQUE INDEX IF NOT EXISTS pstand_aggregates_rollup_idx
+    ON pstand_aggregates (project_id, aggregate_type, aggregate_name, begin, interval_seconds);
+
+-- Changes of a project in log order (op_sync_changes) and the unsynced ones
+CREATE INDEX IF NOT EXISTS pstand_changes_project_idx
+    ON pstand_changes (project_id, change_seq);
+CREATE INDEX IF NOT EXISTS pstand_changes_synced_idx
+    ON pstand_changes (synced, project_id, change_seq);
@@ -0,0 +1,235 @@
+"""
+Vectorized analytics over the items of a project.
+
+The item columns needed for reports are loaded from SQLite in chunks straight
+into NumPy arrays (ItemColumns). All reports are computed on those arrays with
+vectorized operations (np.bincount, np.add.at, np.searchsorted, np.cumsum),
+never with a Python loop per item, so a ledger with millions of items is
+summarized in milliseconds once it is loaded.
+
+NumPy is an optional dependency: pip install fiwa-cli[analytics]
+"""
+import contextlib
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the installation
+    np = None
+
+from functions.items import format_bought_date
+
+# number of items per op_item_columns() page
+ANALYTICS_PAGE_SIZE = 50000
+
+# dimensions an item can be grouped by
+GROUP_BY = ("label", "bought_by", "bought_for")
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise ImportError("The analytics need NumPy, install it with: pip install fiwa-cli[analytics]")
+
+
+class ItemColumns:
+    """
+    Columns of the items of one project as NumPy arrays, ordered by item_id.
+
+    Attributes:
+        item_id: int64 item IDs (sorted)
+        price: float64 price_final, the price in the project currency
+        date: int64 bought_date as seconds since the epoch
+        bought_by: int64 buyer user IDs
+        bought_for: int64 user IDs the items were bought for
+        tag_item: int64 row index into the arrays above, one entry per (item, label) pair
+        tag_label: int64 label ID of each (item, label) pair
+    """
+
+    ROW_DTYPE = [("item_id", "i8"), ("price", "f8"), ("date", "i8"), ("bought_by", "i8"), ("bought_for", "i8")]
+
+    def __init__(self, rows, tag_item_ids, tag_label):
+        require_numpy()
+        order = np.argsort(rows["item_id"], kind="stable")
+        rows = rows[order]
+        self.item_id = rows["item_id"]
+        self.price = rows["price"]
+        self.date = rows["date"]
+        self.bought_by = rows["bought_by"]
+        self.bought_for = rows["bought_for"]
+
+        # map the item IDs of the tags to row indexes; tags of items outside
+        # the loaded date range are dropped
+        index = np.searchsorted(self.item_id, tag_item_ids)
+        index = np.minimum(index, max(len(self.item_id) - 1, 0))
+        found = (self.item_id[index] == tag_item_ids) if len(self.item_id) else np.zeros(len(tag_item_ids), bool)
+        self.tag_item = index[found]
+        self.tag_label = tag_label[found]
+
+    def __len__(self) -> int:
+        return len(self.item_id)
+
+    def months(self):
+        """Month of each item as an integer count of months since 1970-01."""
+        return self.date.astype("datetime64[s]").astype("datetime64[M]").astype("i8")
+
+    def keys(self, by: str):
+        """
+        Return (row_index, key) arrays for a grouping dimension. Items have one
+        entry per label for "label", and exactly one entry otherwise.
+        """
+        if by == "label":
+            return self.tag_item, self.tag_label
+        if by in ("bought_by", "bought_for"):
+            return np.arange(len(self)), getattr(self, by)
+        raise ValueError(f"Unknown grouping '{by}', known: {', '.join(GROUP_BY)}")
+
+
+def _to_array(rows, dtype) -> "np.ndarray":
+    # rows arrive as tuples from SQLite and as lists from the API
+    return np.array([tuple(row) for row in rows], dtype=dtype)
+
+
+def load_item_columns(dbh, project_id: int, since=None, until=None,
+                      chunk_size: int = ANALYTICS_PAGE_SIZE) -> ItemColumns:
+    """
+    Load the report columns of the items of a project into NumPy arrays.
+
+    The items are fetched in pages of chunk_size with op_item_columns(), and
+    each page is converted on its own, so only one page of Python rows is
+    held at a time. Works with the SQLite and the API backend; on SQLite all
+    pages are read in one transaction, a consistent snapshot.
+
+    Args:
+        dbh: The SQLLiteHandler or HandlerApi of the database
+        project_id: The ID of the project
+        since: Only items bought at or after this date
+        until: Only items bought before this date
+        chunk_size: Number of items per page
+
+    Returns:
+        ItemColumns of the matching items
+    """
+    require_numpy()
+
+    rows, tags = [], []
+    scope = dbh.transaction(immediate=False) if hasattr(dbh, "transaction") else contextlib.nullcontext()
+    with scope:
+        after_item_id = 0
+        while True:
+            page = dbh.op_item_columns(project_id, since=since, until=until, after_item_id=after_item_id,
+                                       limit=chunk_size)
+            rows.append(_to_array(page["rows"], ItemColumns.ROW_DTYPE))
+            tags.append(_to_array(page["tags"], [("item_id", "i8"), ("label_id", "i8")]))
+            after_item_id = page["next_item_id"]
+            if not page["more"]:
+                break
+
+    rows, tags = np.concatenate(rows), np.concatenate(tags)
+    return ItemColumns(rows, tags["item_id"], tags["label_id"])
+
+
+def month_label(month: int) -> str:
+    """Format a month index of ItemColumns.months() as 'YYYY-MM'."""
+    return str(np.datetime64(int(month), "M"))
+
+
+def monthly_totals(columns: ItemColumns) -> Dict:
+    """
+    Sum and count the items per calendar month, including empty months.
+
+    Returns:
+        Dictionary with the lists months ('YYYY-MM'), totals and counts
+    """
+    if not len(columns):
+        return {"months": [], "totals": [], "counts": []}
+    months = columns.months()
+    first = months.min()
+    index = months - first
+    totals = np.bincount(index, weights=columns.price)
+    counts = np.bincount(index)
+    return {
+        "months": [month_label(first + i) for i in range(len(totals))],
+        "totals": np.round(totals, 2).tolist(),
+        "counts": counts.tolist(),
+    }
+
+
+def breakdown(columns: ItemColumns, by: str = "label") -> List[Dict]:
+    """
+    Total spending per label or user, largest first.
+
+    Items with several labels count fully towards each of them, so the shares
+    of a label breakdown can add up to more than 100%.
+
+    Returns:
+        List of dictionaries with the keys key, total, count and share (of the
+        total spending of all loaded items)
+    """
+    rows, keys = columns.keys(by)
+    if not len(keys):
+        return []
+    unique, inverse = np.unique(keys, return_inverse=True)
+    totals = np.bincount(inverse, weights=columns.price[rows], minlength=len(unique))
+    counts = np.bincount(inverse, minlength=len(unique))
+    grand_total = columns.price.sum()
+
+    order = np.argsort(-totals, kind="stable")
+    return [{
+        "key": int(unique[i]),
+        "total": round(float(totals[i]), 2),
+        "count": int(counts[i]),
+        "share": float(totals[i] / grand_total) if grand_total else 0.0,
+    } for i in order]
+
+
+def pivot(columns: ItemColumns, by: str = "label") -> Dict:
+    """
+    Monthly spending per label or user as a matrix.
+
+    Returns:
+        Dictionary with months ('YYYY-MM', the rows), keys (label or user
+        IDs, the columns) and values, a months x keys float array
+    """
+    rows, keys = columns.keys(by)
+    if not len(keys):
+        return {"months": [], "keys": [], "values": np.zeros((0, 0))}
+    months = columns.months()[rows]
+    first = months.min()
+    unique, key_index = np.unique(keys, return_inverse=True)
+
+    values = np.zeros((months.max() - first + 1, len(unique)))
+    np.add.at(values, (months - first, key_index), columns.price[rows])
+    return {
+        "months": [month_label(first + i) for i in range(values.shape[0])],
+        "keys": unique.tolist(),
+        "values": values,
+    }
+
+
+def cumulative(columns: ItemColumns, edges) -> "np.ndarray":
+    """
+    Cumulative spending at each of the given points in time, e.g. to draw a
+    spending trend.
+
+    Args:
+        columns: The loaded items
+        edges: Sorted dates (datetime, date or ISO string); the result holds the
+            spending of all items bought before each of them
+
+    Returns:
+        Float array with one cumulative total per edge
+    """
+    edges = np.array([np.datetime64(format_bought_date(edge), "s").astype("i8") for edge in edges])
+    order = np.argsort(columns.date, kind="stable")
+    running = np.concatenate(([0.0], np.cumsum(columns.price[order])))
+    return np.round(running[np.searchsorted(columns.date[order], edges, side="left")], 2)
+
+
+def period_totals(columns: ItemColumns, edges) -> "np.ndarray":
+    """
+    Spending between consecutive dates of edges, e.g. weeks or quarters.
+
+    Returns:
+        Float array with len(edges) - 1 totals
+    """
+    return np.round(np.diff(cumulative(columns, edges)), 2)
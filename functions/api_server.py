@@ -0,0 +1,392 @@
+"""
+Stand-in FiWa API server on localhost, for testing and tuning the API mode.
+
+ApiServer answers the requests of HandlerApi (functions/handler_api.py)
+with a SQLLiteHandler on its own SQLite file. It speaks the same protocol as
+the real server:
+
+    GET  /api/ops/<op>?call=...   reads, with ETag and 304 Not Modified
+    POST /api/ops/<op>            writes, deduplicated by their Idempotency-Key
+    POST /api/batch               several reads in one request
+    HEAD <any path>               connection warm-up of HandlerApi.open()
+
+It is a small HTTP/1.1 server on asyncio streams: connections are kept
+alive, request bodies may be gzip compressed, and responses are compressed
+when the client accepts it. The operations run in a thread pool, so the
+event loop keeps accepting requests while SQLite works; with writer=True
+the writes of concurrent requests are committed together by the handler's
+writer thread (functions/writer.py).
+
+Run it from the repository root:
+
+    python -m functions.api_server --db /tmp/fiwa-server.sqlite --port 8082
+
+functions/load_test.py drives it with concurrent simulated clients.
+"""
+import argparse
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from functions.handler_api import (BATCH_PATH, OP_PATH, WRITE_OPS, decode_body, decode_call, dispatch_batch,
+                                   dispatch_call, dumps, encode_body, error_payload, etag_for)
+
+# upper bound of a request head and body
+MAX_HEAD_BYTES = 64 * 1024
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+            404: "Not Found", 405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large",
+            500: "Internal Server Error", 501: "Not Implemented", 503: "Service Unavailable"}
+
+
+class RequestRecord(NamedTuple):
+    """One answered request, see ApiServer(record=True)."""
+    method: str
+    op: str  # the op name, or "batch"
+    authorization: Optional[str]
+    status: int
+    request_encoding: Optional[str]
+    response_encoding: Optional[str]
+
+
+class HttpError(Exception):
+    """A request the server answers with an error status before running any operation."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiServer:
+    """
+    Serve the op_ methods of a SQLLiteHandler over HTTP.
+
+    Args:
+        dbh: Handler of the server database
+        host: Address to listen on
+        port: Port to listen on (0: any free port, see url)
+        bearer_token: Token the clients must send (default: none required)
+        workers: Threads running the operations (default: the handler's pool size)
+        writer: Commit concurrent writes together through the handler's writer thread
+        max_keys: Number of idempotency keys remembered for retried writes
+        cache_control: Cache-Control header of the read responses, e.g. "max-age=5"
+        record: Keep a RequestRecord of every answered request in requests
+
+    Attributes fail_next (answer this many requests with 503) and batch
+    (False: answer the batch endpoint with 404, like a server without it)
+    simulate a failing or older server, e.g. in tests.
+    """
+
+    def __init__(self, dbh, host: str = "127.0.0.1", port: int = 8082, bearer_token: Optional[str] = None,
+                 workers: Optional[int] = None, writer: bool = False, max_keys: int = 10000,
+                 cache_control: Optional[str] = None, record: bool = False):
+        self.dbh = dbh
+        self.host = host
+        self.port = port
+        self._authorization = f"Bearer {bearer_token}" if bearer_token else None
+        self._workers = workers or getattr(dbh, "_pool_size", 4)
+        self._use_writer = writer
+        self._max_keys = max_keys
+        self.cache_control = cache_control
+        self.record = record
+        self.requests: List[RequestRecord] = []
+        self.fail_next = 0
+        self.batch = True
+        self._keys: "OrderedDict[str, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {"connections": 0, "requests": 0, "batches": 0, "replayed": 0, "not_modified": 0}
+        self._statuses: Dict[int, int] = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def stats(self) -> Dict[str, Any]:
+        """Connections accepted, requests answered (per status), batches, replayed writes and 304s."""
+        return dict(self._counters, statuses=dict(self._statuses))
+
+    async def start(self) -> None:
+        """Open the database and start listening; port 0 is replaced by the port taken."""
+        self.dbh.open()
+        if self._use_writer and self.dbh.writer is None:
+            self.dbh.start_writer()
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="fiwa-api")
+        self._server = await asyncio.start_server(self._serve, self.host, self.port, limit=MAX_HEAD_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """Stop listening, finish the running operations and close the database."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.dbh.shutdown()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def start_in_thread(self) -> "ApiServer":
+        """Run the server in a thread with its own event loop; returns once it listens."""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            self._loop = loop
+            try:
+                loop.run_until_complete(self.start())
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                loop.close()
+                return
+            started.set()
+            try:
+                loop.run_forever()
+            finally:
+                loop.run_until_complete(self.close())
+                loop.close()
+
+        self._thread = threading.Thread(target=run, name="fiwa-api-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            self._thread = None
+            raise errors[0]
+        return self
+
+    def stop_thread(self, timeout: Optional[float] = None) -> None:
+        """Stop a server started with start_in_thread()."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            thread.join(timeout)
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """Read one request; None when the client closed the connection."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Request head too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(411, "Chunked request bodies are not supported")
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "Malformed Content-Length")
+        if length < 0:
+            raise HttpError(400, "Malformed Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, version, headers, body
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._counters["connections"] += 1
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    await self._respond(writer, None, e.status, _error(e), {}, close=True)
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                close = (headers.get("connection", "").lower() == "close"
+                         or (version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive"))
+                try:
+                    status, payload = await self._handle(method, target, headers, body)
+                except HttpError as e:
+                    status, payload = e.status, _error(e)
+                except Exception as e:
+                    status, payload = 500, error_payload(e)
+                await self._respond(writer, method, status, payload, headers, close, target)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _handle(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        if method == "HEAD":
+            return 200, None
+        if self._authorization and headers.get("authorization") != self._authorization:
+            raise HttpError(401, "Missing or wrong bearer token")
+        url = urlsplit(target)
+        try:
+            text = decode_body(body, headers.get("content-encoding")) if body else ""
+        except (OSError, UnicodeDecodeError):
+            raise HttpError(400, "Request body can not be decoded")
+
+        if self.fail_next:
+            self.fail_next -= 1
+            raise HttpError(503, "Server restarting")
+        if url.path == BATCH_PATH:
+            if not self.batch:
+                raise HttpError(404, f"Unknown path '{url.path}'")
+            if method != "POST":
+                raise HttpError(405, "The batch endpoint takes POST requests")
+            self._counters["batches"] += 1
+            return 200, await self._run(dispatch_batch, self.dbh, text)
+        if not url.path.startswith(OP_PATH):
+            raise HttpError(404, f"Unknown path '{url.path}'")
+
+        name = url.path[len(OP_PATH):]
+        if method == "GET":
+            if name in WRITE_OPS:
+                raise HttpError(405, f"Write operation '{name}' must be sent as POST")
+            text = parse_qs(url.query).get("call", [""])[0]
+        elif method != "POST":
+            raise HttpError(405, f"Method {method} is not supported")
+        try:
+            args, kwargs = decode_call(text)
+        except ValueError as e:
+            raise HttpError(400, f"Malformed call: {e}")
+
+        key = headers.get("idempotency-key") if method == "POST" else None
+        if not key:
+            return await self._run(dispatch_call, self.dbh, name, args, kwargs)
+        return await self._once(key, name, args, kwargs)
+
+    async def _once(self, key: str, name: str, args, kwargs):
+        """Run a write once per idempotency key; a retry gets the first answer."""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            self._counters["replayed"] += 1
+            return self._keys[key]
+        if key in self._in_flight:
+            # the retry arrived while the first attempt still runs
+            self._counters["replayed"] += 1
+            return await asyncio.shield(self._in_flight[key])
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            outcome = await self._run(dispatch_call, self.dbh, name, args, kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here, a waiting retry gets it as well
+            raise
+        finally:
+            del self._in_flight[key]
+        if outcome[0] == 200:
+            self._keys[key] = outcome
+            while len(self._keys) > self._max_keys:
+                self._keys.popitem(last=False)
+        future.set_result(outcome)
+        return outcome
+
+    async def _respond(self, writer: asyncio.StreamWriter, method: Optional[str], status: int,
+                       payload, headers: Dict[str, str], close: bool, target: Optional[str] = None) -> None:
+        extra = []
+        try:
+            body = b"" if payload is None else dumps(payload)
+        except (TypeError, ValueError) as e:
+            # e.g. an operation returned something JSON can not carry
+            status, body = 500, dumps(error_payload(e))
+        if method == "GET" and status == 200:
+            etag = etag_for(body)
+            extra.append(("ETag", etag))
+            if self.cache_control:
+                extra.append(("Cache-Control", self.cache_control))
+            if headers.get("if-none-match") == etag:
+                status, body = 304, b""
+                self._counters["not_modified"] += 1
+        encoding = None
+        if body:
+            body, encoding = encode_body(body, headers.get("accept-encoding"))
+            if encoding:
+                extra.append(("Content-Encoding", encoding))
+        self._counters["requests"] += 1
+        if self.record and target is not None and method != "HEAD":
+            path = urlsplit(target).path
+            op = "batch" if path == BATCH_PATH else path[len(OP_PATH):]
+            self.requests.append(RequestRecord(method, op, headers.get("authorization"), status,
+                                               headers.get("content-encoding"), encoding))
+        self._statuses[status] = self._statuses.get(status, 0) + 1
+
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}",
+                 "Content-Type: application/json", f"Content-Length: {len(body)}",
+                 "Connection: close" if close else "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in extra]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (b"" if method == "HEAD" else body))
+        await writer.drain()
+
+
+def _error(exc: HttpError) -> Dict[str, Any]:
+    error_type = ("PermissionError" if exc.status in (401, 403) else "LookupError" if exc.status == 404
+                  else "Unavailable" if exc.status == 503 else "ValueError")
+    return {"error": {"type": error_type, "message": str(exc)}}
+
+
+def main(argv=None) -> None:
+    """Command line entry point: serve a database file until Ctrl+C."""
+    import os
+
+    from functions.handler_sqllite import SQLLiteHandler
+    from functions.loader import get_abs_path
+
+    parser = argparse.ArgumentParser(description="Stand-in FiWa API server on a SQLite file")
+    parser.add_argument("--db", required=True, help="database file, created if missing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--token", default=None, help="bearer token the clients must send")
+    parser.add_argument("--pool-size", type=int, default=8, help="SQLite connections and worker threads")
+    parser.add_argument("--writer", action="store_true", help="commit concurrent writes together")
+    parser.add_argument("--cache-control", default=None, help='Cache-Control of reads, e.g. "max-age=5"')
+    parser.add_argument("--seed", type=int, default=0, help="create a demo project with this many items")
+    args = parser.parse_args(argv)
+
+    dbh = SQLLiteHandler(db_path=args.db, pool_size=args.pool_size)
+    dbh.initialize_database(schema_path=os.path.join(get_abs_path(), "database", "schema.sql"))
+    if args.seed:
+        from functions.load_test import seed
+        print(json.dumps(seed(dbh, items=args.seed)))
+
+    server = ApiServer(dbh, host=args.host, port=args.port, bearer_token=args.token,
+                       workers=args.pool_size, writer=args.writer, cache_control=args.cache_control)
+    print(f"Serving {args.db} on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
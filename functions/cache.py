@@ -0,0 +1,146 @@
+"""
+In-process caches used by the database handler.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_ABSENT = object()
+
+
+class LRUCache:
+    """
+    Thread-safe mapping with at most maxsize entries. When it is full, the
+    least recently used entry is evicted. Hits, misses and evictions are
+    counted, see stats().
+
+    Every invalidate() and clear() moves the generation on. A reader that
+    passes the generation from before its read to put() does not store a
+    result that an invalidation overtook while it was being read.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None) -> bool:
+        """
+        Store value under key. With a generation, nothing is stored if the
+        cache was invalidated since; returns whether the value was stored.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Remove key; returns whether it was cached."""
+        with self._lock:
+            self.generation += 1
+            if self._data.pop(key, _ABSENT) is _ABSENT:
+                return False
+            self.invalidations += 1
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size, maxsize, hits, misses, evictions, invalidations and the hit_rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+
+class TTLCache:
+    """
+    Thread-safe mapping whose entries expire ttl seconds after they were put.
+    At most maxsize entries are kept; when it is full, the entry closest to
+    expiring is evicted.
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = {}  # key -> (expires, value)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= self._clock():
+                del self._data[key]
+                return default
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store value under key for ttl seconds (default: the ttl of the cache)."""
+        with self._lock:
+            now = self._clock()
+            self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+            if len(self._data) > self.maxsize:
+                # drop what has expired, then the entries expiring first
+                for old_key in [k for k, (expires, _) in self._data.items() if expires <= now]:
+                    del self._data[old_key]
+                while len(self._data) > self.maxsize:
+                    del self._data[min(self._data, key=lambda k: self._data[k][0])]
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Remove key; returns whether it was cached."""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -5,6 +5,13 @@ def faker_users(dbh, num_users=10):
     from faker import Faker
     fake = Faker()
 
+    # one commit for all users instead of one per insert
+    with dbh.transaction():
+        _faker_users(dbh, fake, num_users)
+
+    print(f"Created {num_users} fake users.")
+
+def _faker_users(dbh, fake, num_users):
     for i in range(num_users):
         if i == 0:
             _superu = True
@@ -27,8 +34,6 @@ def faker_users(dbh, num_users=10):
         print(_f)
         dbh.op_user_create(_f)
 
-    print(f"Created {num_users} fake users.")
-
 def faker_user_login(user, password, dbh):
     """Test login for a fake user."""
     try:
@@ -48,6 +53,11 @@ def faker_projects(dbh):
     - User 2 gets 1 more project
     - User 2 is added to user 1's second project
     """
+    # one commit for the whole run; each project gets its own savepoint
+    with dbh.transaction():
+        return _faker_projects(dbh)
+
+def _faker_projects(dbh):
     from faker import Faker
     import random
     fake = Faker()
@@ -78,7 +88,8 @@ def faker_projects(dbh):
         }
 
         try:
-            project_id = dbh.op_project_create(project_data, user_id)
+            with dbh.transaction():
+                project_id = dbh.op_project_create(project_data, user_id)
             print(f"Created project {project_id} for user {user_id}: {project_data['name']}")
 
             # Track projects for each user
@@ -110,7 +121,8 @@ def faker_projects(dbh):
             }
 
             try:
-                project_id = dbh.op_project_create(project_data, 1)
+                with dbh.transaction():
+                    project_id = dbh.op_project_create(project_data, 1)
                 print(f"Created additional project {project_id} for user 1: {project_data['name']}")
                 user_projects[1].append(project_id)
                 project_count += 1
@@ -136,7 +148,8 @@ def faker_projects(dbh):
         }
 
         try:
-            project_id = dbh.op_project_create(project_data, 2)
+            with dbh.transaction():
+                project_id = dbh.op_project_create(project_data, 2)
             print(f"Created additional project {project_id} for user 2: {project_data['name']}")
             user_projects[2].append(project_id)
             project_count += 1
@@ -150,7 +163,8 @@ def faker_projects(dbh):
     if 1 in user_projects and len(user_projects[1]) >= 2 and 2 in user_ids:
         second_project_of_user1 = user_projects[1][1]  # Index 1 is the second project
         try:
-            dbh.op_project_add_user(project_id=second_project_of_user1, user_id=2, project_perm_model='000000', project_primary=False)
+            with dbh.transaction():
+                dbh.op_project_add_user(project_id=second_project_of_user1, user_id=2, project_perm_model='000000', project_primary=False)
             print(f"Successfully added user 2 to project {second_project_of_user1} (user 1's second project)")
         except ValueError as e:
             print(f"Could not add user 2 to project {second_project_of_user1}: {e}")
@@ -173,6 +187,11 @@ def faker_labels(dbh, project_ids=[]):
     """Populate the database with fake labels for testing purposes.
     Creates 3 labels for each project in the database.
     """
+    # one commit for all labels; each label gets its own savepoint
+    with dbh.transaction():
+        _faker_labels(dbh, project_ids)
+
+def _faker_labels(dbh, project_ids):
     from faker import Faker
     import random
     fake = Faker()
@@ -196,7 +215,8 @@ def faker_labels(dbh, project_ids=[]):
             }
 
             try:
-                label_id = dbh.op_label_create(label_data, project_id)
+                with dbh.transaction():
+                    label_id = dbh.op_label_create(label_data, project_id)
                 print(f"Created label {label_id} for project {project_id}: {label_data['name']}")
                 label_count += 1
             except ValueError as e:
@@ -1,16 +1,17 @@
-
 from functions.handler_api import HandlerApi
 from functions.handler_sqllite import SQLLiteHandler
 
 class Handler():
-    def __init__(self, method):
+    def __init__(self, method, **options):
         self._method = method
+        # keyword arguments of the backend, e.g. base_url and bearer_token of HandlerApi
+        self._options = options
 
 
     def load(self):
         if self._method == "api":
-            return HandlerApi(self)
+            return HandlerApi(**self._options)
         elif self._method == "sqlite":
             return SQLLiteHandler(self)
         else:
-            raise NotImplementedError(f"Handler method '{self._method}' is not implemented.")
\ No newline at end of file
+            raise NotImplementedError(f"Handler method '{self._method}' is not implemented.")
@@ -1,16 +1,674 @@
+"""
+Remote backend: the op_ methods of SQLLiteHandler over HTTP.
+
+HandlerApi has the same op_ surface as SQLLiteHandler, so the app and its
+screens work unchanged against a FiWa API server:
+
+    dbh = HandlerApi(base_url="http://127.0.0.1:8082", bearer_token="...")
+    labels = dbh.op_label_get_all(project_id)
+
+Every operation is one request to /api/ops/<op name>:
+
+    reads   GET  /api/ops/op_label_get_all?call={"args":[1],"kwargs":{}}
+    writes  POST /api/ops/op_label_create   {"args": [...], "kwargs": {...}}
+
+Only the op_ methods in REMOTE_OPS are served; maintenance ops and ops
+taking server file paths stay local. Writes are the op_ methods marked
+with @write_op in SQLLiteHandler. They carry an Idempotency-Key header,
+so the server can recognize a retried write and answer it without running
+it twice. A successful call is
+answered with {"result": ...}. A failed call is answered with
+{"error": {"type": ..., "message": ...}}, and the client raises the same
+built-in exception type (e.g. ValueError) or ApiError.
+
+All requests share one httpx.Client (and one httpx.AsyncClient for the
+coroutines of acall()). Their connections are pooled and kept alive, so
+a call pays for the network round trip and not for TCP and TLS
+handshakes. HTTP/2 is used when the h2 package is installed
+(pip install fiwa-cli[http2]). Transport errors and the statuses in
+RETRY_STATUSES are retried with exponential backoff and jitter.
+
+Screens often open with several small, independent reads. The reads
+awaited through acall() (and so through AsyncHandler) in the same event
+loop iteration are coalesced: identical calls are sent once, and the
+others travel together in one request to the batch endpoint:
+
+    POST /api/batch  {"calls": [{"op": "op_label_get_all", "call": {"args": [1], "kwargs": {}}}, ...]}
+    ->               {"results": [{"result": ...}, {"error": {...}, "status": 400}, ...]}
+
+The results are handed back to the individual callers. If the server
+answers the batch request with one of NO_BATCH_STATUSES, the client stops
+using the endpoint and sends the reads as parallel single requests.
+
+With an HttpCache (functions/http_cache.py), read responses are kept on
+disk and revalidated with their ETag, so a repeated read costs a 304 or,
+while the response is fresh, no request at all. Batch results carry
+their ETag too. After every write of this client all cached responses
+have to be revalidated before they are used again.
+
+Request bodies of at least COMPRESS_MIN_BYTES (e.g. the changes pushed
+by functions/sync.py) are sent gzip compressed, and httpx asks for and
+decodes compressed responses.
+
+With an Outbox (functions/outbox.py), the writes in its ops are queued on
+disk and answered at once; they reach the server in the background.
+"""
+import asyncio
+import copy
+import gzip
+import hashlib
+import json
+import random
+import socket
+import time
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from functions.handler_sqllite import SQLLiteHandler
+from functions.http_cache import CachedResponse, HttpCache, parse_cache_control
+
+# path prefix of the operations on the server
+OP_PATH = "/api/ops/"
+# path of the endpoint running several reads in one request
+BATCH_PATH = "/api/batch"
+# answers of a server without the batch endpoint
+NO_BATCH_STATUSES = frozenset({404, 405, 501})
+# responses worth another attempt: rate limited, proxy errors, server restarting
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# request and response bodies from this size on are sent gzip compressed
+COMPRESS_MIN_BYTES = 1024
+# op_ methods that change data and are sent as POST
+WRITE_OPS = frozenset(name for name in dir(SQLLiteHandler)
+                      if name.startswith("op_") and getattr(getattr(SQLLiteHandler, name), "_write_op", False))
+# op_ methods a server runs for remote callers. Maintenance and migration
+# ops, ops taking paths on the server and generators are left out.
+REMOTE_OPS = frozenset({
+    "op_total_number_of_users", "op_user_create", "op_user_login", "op_user_logout", "op_get_user_sessions",
+    "op_session_context", "op_user_get_info", "op_get_max_projects", "op_user_get_all_ids", "op_get_current_user",
+    "op_project_get_info", "op_project_create", "op_project_update", "op_project_add_user",
+    "op_label_get_all", "op_label_create", "op_label_update", "op_label_delete",
+    "op_label_descendants", "op_label_ancestors", "op_label_rollup",
+    "op_item_create_many", "op_item_page", "op_item_columns", "op_item_get", "op_item_update", "op_item_delete",
+    "op_rollup_get", "op_search", "op_rate_get", "op_rates_convert", "op_unit_of_work",
+    "op_sync_changes", "op_sync_apply", "op_sync_projects",
+})
+# exceptions that are raised again on the client with their own type
+REMOTE_EXCEPTIONS = {exc.__name__: exc for exc in (ValueError, TypeError, KeyError, LookupError,
+                                                   PermissionError, NotImplementedError)}
+
+
+class ApiError(RuntimeError):
+    """An operation failed on the server with an error the client has no own type for."""
+
+    def __init__(self, message: str, status: Optional[int] = None, error_type: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+
+class ApiUnavailable(ApiError):
+    """The server could not be reached or kept failing after all retries."""
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_call(args=(), kwargs=None) -> str:
+    """Encode the arguments of an operation as compact JSON with sorted keys, the same for equal calls."""
+    return json.dumps({"args": list(args), "kwargs": kwargs or {}}, default=_json_default,
+                      separators=(",", ":"), sort_keys=True)
+
+
+def decode_call(text: str):
+    """Decode arguments encoded with encode_call() into an (args, kwargs) tuple."""
+    call = json.loads(text) if text else {}
+    args, kwargs = call.get("args", []), call.get("kwargs", {})
+    if not isinstance(args, list) or not isinstance(kwargs, dict):
+        raise ValueError("Call arguments must be a list and a dictionary")
+    return args, kwargs
+
+
+def error_payload(exc: BaseException) -> Dict[str, Any]:
+    """The error body of a failed operation."""
+    return {"error": {"type": type(exc).__name__, "message": str(exc)}}
+
+
+def error_status(exc: BaseException) -> int:
+    """The HTTP status of a failed operation."""
+    if isinstance(exc, PermissionError):
+        return 403
+    if isinstance(exc, (ValueError, TypeError, LookupError)):
+        return 400
+    if isinstance(exc, NotImplementedError):
+        return 501
+    return 500
+
+
+def dumps(payload) -> bytes:
+    """Serialize a request or response body."""
+    return json.dumps(payload, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def _unknown_operation(name) -> Dict[str, Any]:
+    return {"error": {"type": "LookupError", "message": f"Unknown operation '{name}'"}}
+
+
+def dispatch_call(target, name: str, args, kwargs) -> Tuple[int, Dict[str, Any]]:
+    """
+    Server side of an operation: run op name of target (a SQLLiteHandler) and
+    return the HTTP status and body of the response. Only the REMOTE_OPS are
+    run; others are answered as unknown (404).
+    """
+    if name not in REMOTE_OPS:
+        return 404, _unknown_operation(name)
+    if name == "op_unit_of_work":
+        # the calls of a unit of work are bound by the same allowlist
+        calls = args[0] if args else kwargs.get("calls")
+        for call in calls if isinstance(calls, list) else []:
+            op = call.get("op") if isinstance(call, dict) else None
+            if op not in REMOTE_OPS:
+                return 404, _unknown_operation(op)
+    try:
+        return 200, {"result": getattr(target, name)(*args, **kwargs)}
+    except Exception as e:
+        return error_status(e), error_payload(e)
+
+
+def dispatch_batch(target, text: str) -> Dict[str, Any]:
+    """
+    Server side of the batch endpoint: run the reads of a batch body one after
+    another and return the response body with one result per call. Failed
+    calls carry their status next to the error.
+    """
+    calls: List[Dict[str, Any]] = json.loads(text).get("calls", [])
+    results = []
+    for entry in calls:
+        name = entry.get("op", "")
+        if name in WRITE_OPS:
+            status, payload = 405, {"error": {"type": "ValueError",
+                                              "message": f"Write operation '{name}' can not be batched"}}
+        else:
+            call = entry.get("call") or {}
+            status, payload = dispatch_call(target, name, call.get("args", []), call.get("kwargs", {}))
+        if status == 200:
+            try:
+                payload["etag"] = etag_for(dumps(payload))
+            except (TypeError, ValueError) as e:
+                status, payload = 500, error_payload(e)
+        if status != 200:
+            payload["status"] = status
+        results.append(payload)
+    return {"results": results}
+
+
+def decode_body(body: bytes, content_encoding: Optional[str] = None) -> str:
+    """Server side: the text of a request body, which may be gzip compressed."""
+    if (content_encoding or "").strip().lower() == "gzip":
+        body = gzip.decompress(body)
+    return body.decode("utf-8")
+
+
+def encode_body(body: bytes, accept_encoding: Optional[str] = None,
+                min_bytes: int = COMPRESS_MIN_BYTES) -> Tuple[bytes, Optional[str]]:
+    """
+    Server side: compress a response body if the client accepts gzip and the
+    body is large enough. Returns the body and its Content-Encoding (or None).
+    """
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if "gzip" in accepted and len(body) >= min_bytes:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
+
+
+def etag_for(body: bytes) -> str:
+    """Server side: the ETag of a response body."""
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
 
 class HandlerApi:
-    def __init__(self, handler):
-        self.handler = handler
+    """
+    The op_ methods of SQLLiteHandler against a FiWa API server.
+
+    Args:
+        base_url: URL of the API server
+        bearer_token: Token sent in the Authorization header
+        timeout: Seconds to wait for a response
+        connect_timeout: Seconds to wait for a new connection
+        max_connections: Maximum number of open connections
+        max_keepalive: Maximum number of idle connections kept open
+        keepalive_expiry: Seconds an idle connection is kept open
+        http2: Use HTTP/2 (default: if the h2 package is installed)
+        retries: Additional attempts after a transport error or a status in RETRY_STATUSES
+        backoff: Seconds before the first retry, doubled for every further one
+        backoff_max: Upper bound of the wait between two attempts
+        transport: httpx transport for the sync client, e.g. for tests
+        coalesce: Send the reads of acall() issued in one event loop iteration together
+        max_batch: Maximum number of reads in one batch request
+        cache: HttpCache for the read responses (default: none)
+        stale_while_revalidate: Seconds an expired cached response may still be
+            served by acall() while it is revalidated in the background, unless
+            the server's Cache-Control says otherwise
+        outbox: Outbox (functions/outbox.py) queuing the writes in its ops and
+            replaying them in the background (default: none, writes are sent at once)
+        compress_min_bytes: Send request bodies from this size on gzip compressed
+            (None: never compress, e.g. for a server without support)
+    """
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8082", bearer_token: Optional[str] = None,
+                 timeout: float = 15.0, connect_timeout: float = 3.0, max_connections: int = 20,
+                 max_keepalive: int = 10, keepalive_expiry: float = 60.0, http2: Optional[bool] = None,
+                 retries: int = 3, backoff: float = 0.1, backoff_max: float = 2.0, transport=None,
+                 coalesce: bool = True, max_batch: int = 50, cache: Optional[HttpCache] = None,
+                 stale_while_revalidate: float = 0.0, outbox=None,
+                 compress_min_bytes: Optional[int] = COMPRESS_MIN_BYTES):
+        self._base_url = base_url.rstrip("/")
+        self._headers = {"Accept": "application/json", "User-Agent": "fiwa-cli"}
+        if bearer_token:
+            self._headers["Authorization"] = f"Bearer {bearer_token}"
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive,
+                                    keepalive_expiry=keepalive_expiry)
+        self._http2 = http2_available() if http2 is None else http2
+        self._retries = retries
+        self._backoff = backoff
+        self._backoff_max = backoff_max
+        self._transport = transport
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop = None
+        self._coalesce = coalesce
+        self._max_batch = max_batch
+        # None until the first batch request tells whether the server has the endpoint
+        self._batch_supported: Optional[bool] = None
+        self._pending = []
+        self._tasks = set()
+        self._cache = cache
+        self._stale_while_revalidate = float(stale_while_revalidate)
+        self._revalidating = set()
+        self._outbox = outbox
+        self._compress_min_bytes = compress_min_bytes
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    @property
+    def cache(self) -> Optional[HttpCache]:
+        return self._cache
+
+    @property
+    def outbox(self):
+        return self._outbox
+
+    def _client_options(self) -> Dict[str, Any]:
+        return {"base_url": self._base_url, "headers": self._headers, "timeout": self._timeout,
+                "limits": self._limits, "http2": self._http2}
+
+    def _get_client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(transport=self._transport, **self._client_options())
+        return self._client
+
+    def _get_aclient(self) -> httpx.AsyncClient:
+        # an AsyncClient belongs to the event loop it was first used on
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._retire_aclient()
+            self._aclient = httpx.AsyncClient(**self._client_options())
+            self._aclient_loop = loop
+        return self._aclient
+
+    def _retire_aclient(self) -> None:
+        """
+        Close the AsyncClient of the event loop used so far. Its connections
+        belong to that loop, so aclose() is scheduled there. A closed loop can
+        not run it any more; then the pooled connections are shut down
+        directly, and their descriptors go with the transports.
+        """
+        client, loop = self._aclient, self._aclient_loop
+        self._aclient = self._aclient_loop = None
+        if client is None:
+            return
+        if not loop.is_closed():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                self._spawn(client.aclose())
+            else:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        for connection in getattr(pool, "connections", ()):
+            stream = getattr(getattr(connection, "_connection", None), "_network_stream", None)
+            sock = stream.get_extra_info("socket") if stream is not None else None
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def open(self):
+        """
+        Open the first connection, so the first op_ call does not pay for the
+        handshake, and start replaying the outbox.
+        """
+        try:
+            self._get_client().request("HEAD", OP_PATH)
+        except httpx.HTTPError:
+            pass
+        if self._outbox is not None:
+            self._outbox.start(self)
+
+    def shutdown(self):
+        """Stop the outbox replay and close the pooled connections; a later call opens new ones."""
+        if self._outbox is not None:
+            self._outbox.stop()
+        client, self._client = self._client, None
+        if client is not None:
+            client.close()
+        self._retire_aclient()
+
+    async def aclose(self):
+        """Wait for the background requests (batches, revalidations), then close the async client."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        aclient, self._aclient = self._aclient, None
+        self._aclient_loop = None
+        if aclient is not None:
+            await aclient.aclose()
+
+    @staticmethod
+    def _check(name: str) -> None:
+        if name not in REMOTE_OPS:
+            raise AttributeError(f"Unknown operation '{name}'")
+
+    def _build(self, name: str, call: str, entry: Optional[CachedResponse] = None) -> Dict[str, Any]:
+        if name in WRITE_OPS:
+            content = call.encode("utf-8")
+            headers = {"Content-Type": "application/json", "Idempotency-Key": uuid.uuid4().hex}
+            if self._compress_min_bytes is not None and len(content) >= self._compress_min_bytes:
+                content = gzip.compress(content, compresslevel=6)
+                headers["Content-Encoding"] = "gzip"
+            return {"method": "POST", "url": OP_PATH + name, "content": content, "headers": headers}
+        request = {"method": "GET", "url": OP_PATH + name, "params": {"call": call}}
+        if entry is not None:
+            request["headers"] = entry.validators()
+        return request
+
+    def _cache_key(self, name: str, call: str) -> str:
+        # the server and the token are part of the key: users never see each other's responses
+        raw = "\n".join((self._base_url, self._headers.get("Authorization", ""), name, call))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup(self, name: str, call: str):
+        """Return the cache key and the cached response of a read, (None, None) without a cache."""
+        if self._cache is None or name in WRITE_OPS:
+            return None, None
+        key = self._cache_key(name, call)
+        return key, self._cache.get(key)
+
+    def _freshness(self, directives: Dict[str, Any]):
+        max_age = directives.get("max-age", 0.0)
+        swr = directives.get("stale-while-revalidate", self._stale_while_revalidate)
+        if directives.get("no-cache"):
+            max_age = swr = 0.0
+        return (max_age if isinstance(max_age, float) else 0.0), (swr if isinstance(swr, float) else 0.0)
+
+    def _handle(self, name: str, response: httpx.Response, key: Optional[str] = None,
+                entry: Optional[CachedResponse] = None):
+        """The result of a response, keeping the response cache up to date."""
+        if self._cache is None:
+            return self._result(name, response)
+        if name in WRITE_OPS:
+            # the write may have changed any cached read
+            self._cache.expire_all()
+            return self._result(name, response)
+        directives = parse_cache_control(response.headers.get("Cache-Control"))
+        if response.status_code == 304 and entry is not None:
+            self._cache.refresh(key, *self._freshness(directives))
+            return self._unwrap(name, 200, json.loads(entry.body))
+        result = self._result(name, response)
+        if key is not None and not directives.get("no-store"):
+            self._cache.put(key, response.content, response.headers.get("ETag"),
+                            response.headers.get("Last-Modified"), *self._freshness(directives))
+        return result
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.replace(".", "", 1).isdigit():
+                return min(float(retry_after), self._backoff_max)
+        # full jitter: spread the retries of many clients over the whole interval
+        return random.uniform(0, min(self._backoff_max, self._backoff * 2 ** attempt))
+
+    @staticmethod
+    def _body(name: str, response: httpx.Response) -> Dict[str, Any]:
+        try:
+            return response.json()
+        except ValueError:
+            raise ApiError(f"{name}: invalid response with status {response.status_code}",
+                           status=response.status_code)
+
+    @staticmethod
+    def _unwrap(name: str, status: int, body: Dict[str, Any]):
+        if status < 400 and "result" in body:
+            return body["result"]
+        error = body.get("error") or {}
+        error_type, message = error.get("type"), error.get("message", f"status {status}")
+        exc = REMOTE_EXCEPTIONS.get(error_type)
+        if exc is not None:
+            raise exc(message)
+        raise ApiError(f"{name}: {message}", status=status, error_type=error_type)
+
+    def _result(self, name: str, response: httpx.Response):
+        return self._unwrap(name, response.status_code, self._body(name, response))
+
+    def _send(self, name: str, request: Dict[str, Any]) -> httpx.Response:
+        client = self._get_client()
+        for attempt in range(self._retries + 1):
+            last = attempt == self._retries
+            try:
+                response = client.request(**request)
+            except httpx.TransportError as e:
+                if last:
+                    raise ApiUnavailable(f"{name}: {self._base_url} not reachable: {e}") from e
+                time.sleep(self._delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and not last:
+                time.sleep(self._delay(attempt, response))
+                continue
+            return response
+
+    async def _asend(self, name: str, request: Dict[str, Any]) -> httpx.Response:
+        client = self._get_aclient()
+        for attempt in range(self._retries + 1):
+            last = attempt == self._retries
+            try:
+                response = await client.request(**request)
+            except httpx.TransportError as e:
+                if last:
+                    raise ApiUnavailable(f"{name}: {self._base_url} not reachable: {e}") from e
+                await asyncio.sleep(self._delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and not last:
+                await asyncio.sleep(self._delay(attempt, response))
+                continue
+            return response
+
+    def call(self, name: str, *args, **kwargs):
+        """
+        Run an operation on the server and return its result. A fresh cached
+        read is returned without a request, an expired one is revalidated.
+        """
+        self._check(name)
+        if self._outbox is not None and name in self._outbox.ops:
+            return self._outbox.submit(name, *args, **kwargs)
+        call = encode_call(args, kwargs)
+        key, entry = self._lookup(name, call)
+        if entry is not None and entry.is_fresh(self._cache.now()):
+            return self._unwrap(name, 200, json.loads(entry.body))
+        return self._handle(name, self._send(name, self._build(name, call, entry)), key, entry)
+
+    def call_with_key(self, idempotency_key: str, name: str, *args, **kwargs):
+        """Send a write with the given idempotency key, past the outbox (which uses it to replay)."""
+        if name not in WRITE_OPS:
+            raise ValueError(f"'{name}' is not a write operation")
+        request = self._build(name, encode_call(args, kwargs))
+        request["headers"]["Idempotency-Key"] = idempotency_key
+        return self._handle(name, self._send(name, request))
+
+    async def _acall_now(self, name: str, call: str, key: Optional[str] = None,
+                         entry: Optional[CachedResponse] = None):
+        return self._handle(name, await self._asend(name, self._build(name, call, entry)), key, entry)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _revalidate(self, name: str, call: str, key: str, entry: CachedResponse) -> None:
+        try:
+            await self._acall_now(name, call, key, entry)
+        except Exception:
+            # the stale response stays cached, the next read tries again
+            pass
+        finally:
+            self._revalidating.discard(key)
+
+    async def acall(self, name: str, *args, **kwargs):
+        """
+        Coroutine version of call() on the shared async client.
+
+        Reads issued in the same event loop iteration are sent together, see
+        the module docstring; writes are sent on their own, in call order.
+        """
+        self._check(name)
+        if self._outbox is not None and name in self._outbox.ops:
+            # a local insert, no network round trip
+            return self._outbox.submit(name, *args, **kwargs)
+        call = encode_call(args, kwargs)
+        if name in WRITE_OPS:
+            return await self._acall_now(name, call)
+        key, entry = self._lookup(name, call)
+        if entry is not None:
+            now = self._cache.now()
+            if entry.is_fresh(now):
+                return self._unwrap(name, 200, json.loads(entry.body))
+            if entry.is_usable_stale(now):
+                if key not in self._revalidating:
+                    self._revalidating.add(key)
+                    self._spawn(self._revalidate(name, call, key, entry))
+                return self._unwrap(name, 200, json.loads(entry.body))
+            # conditional requests are sent on their own, a batch has no validators
+            return await self._acall_now(name, call, key, entry)
+        if not self._coalesce:
+            return await self._acall_now(name, call, key)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            # runs after the callbacks already scheduled, i.e. after every
+            # task that is ready in this iteration had its turn to add calls
+            loop.call_soon(self._flush_pending)
+        self._pending.append((name, call, future))
+        return await future
+
+    def _flush_pending(self) -> None:
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self._max_batch):
+            self._spawn(self._run_batch(pending[start:start + self._max_batch]))
+
+    async def _run_batch(self, pending: list) -> None:
+        # identical reads of one iteration are sent once
+        waiters: Dict[tuple, list] = {}
+        for name, call, future in pending:
+            waiters.setdefault((name, call), []).append(future)
+        calls = list(waiters)
+
+        outcomes = None
+        try:
+            if len(calls) > 1 and self._batch_supported is not False:
+                outcomes = await self._abatch(calls)
+            if outcomes is None:
+                outcomes = await asyncio.gather(*[self._acall_now(name, call, *self._lookup(name, call))
+                                                  for name, call in calls], return_exceptions=True)
+        except Exception as e:
+            outcomes = [e] * len(calls)
+
+        for key, outcome in zip(calls, outcomes):
+            for i, future in enumerate(waiters[key]):
+                if future.done():
+                    continue
+                if isinstance(outcome, BaseException):
+                    future.set_exception(outcome)
+                else:
+                    # every caller gets its own copy to modify
+                    future.set_result(outcome if i == 0 else copy.deepcopy(outcome))
+
+    async def _abatch(self, calls: list) -> Optional[list]:
+        """Send calls to the batch endpoint; None if the server has none."""
+        content = '{"calls":[' + ",".join(
+            '{"op":' + json.dumps(name) + ',"call":' + call + '}' for name, call in calls) + ']}'
+        response = await self._asend("batch", {"method": "POST", "url": BATCH_PATH,
+                                               "content": content.encode("utf-8"),
+                                               "headers": {"Content-Type": "application/json"}})
+        if response.status_code in NO_BATCH_STATUSES:
+            self._batch_supported = False
+            return None
+        results = self._body("batch", response).get("results")
+        if not response.is_success or not isinstance(results, list) or len(results) != len(calls):
+            self._result("batch", response)
+            raise ApiError("batch: invalid response", status=response.status_code)
+        self._batch_supported = True
+
+        outcomes = []
+        for (name, call), body in zip(calls, results):
+            try:
+                outcomes.append(self._unwrap(name, body.get("status", 200), body))
+            except Exception as e:
+                outcomes.append(e)
+                continue
+            if self._cache is not None and body.get("etag"):
+                self._cache.put(self._cache_key(name, call), dumps({"result": body["result"]}), body["etag"],
+                                stale_while_revalidate=self._stale_while_revalidate)
+        return outcomes
 
-    def get(self, *args, **kwargs):
-        return self.handler.get(*args, **kwargs)
+    def __getattr__(self, name):
+        if name not in REMOTE_OPS:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
-    def post(self, *args, **kwargs):
-        return self.handler.post(*args, **kwargs)
+        def call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
 
-    def put(self, *args, **kwargs):
-        return self.handler.put(*args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = getattr(SQLLiteHandler, name).__doc__
+        call._write_op = name in WRITE_OPS
+        return call
 
-    def delete(self, *args, **kwargs):
-        return self.handler.delete(*args, **kwargs)
\ No newline at end of file
+    def op_item_iter(self, project_id: int, **kwargs):
+        """Iterate over the items of a project, one op_item_page() request per page."""
+        cursor = kwargs.pop("cursor", None)
+        while True:
+            page = self.call("op_item_page", project_id, cursor=cursor, **kwargs)
+            yield from page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
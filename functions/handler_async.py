@@ -0,0 +1,111 @@
+"""
+Asyncio facade over SQLLiteHandler.
+
+SQLite calls block, so coroutines on the event loop (Textual event handlers
+and async workers) must not run them directly. AsyncHandler exposes every
+op_ method of a SQLLiteHandler as a coroutine that runs on a bounded thread
+pool, so the UI keeps rendering frames while a query runs:
+
+    adbh = AsyncHandler(dbh)
+    labels = await adbh.op_label_get_all(project_id)
+
+The pool has as many threads as the handler's connection pool has
+connections, so the AsyncHandler on its own never has more calls running
+than there are connections; further calls queue in the executor instead.
+Connections held by other threads at the same time (synchronous calls of
+worker threads such as the CSV import, the writer or sync thread, an open
+atransaction()) are not accounted for: then a worker thread can still wait
+for a connection, up to the pool's timeout.
+
+While the handler's writer thread runs (SQLLiteHandler.start_writer()),
+write operations are handed to it directly and awaited without taking a
+pool thread. For the API backend (functions/handler_api.py) the operations are
+awaited on its async HTTP client instead.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+
+class AsyncHandler:
+    """
+    Awaitable op_ methods of a SQLLiteHandler.
+
+    Args:
+        handler: The SQLLiteHandler to run the operations on
+        max_workers: Number of threads running operations concurrently
+            (default: the size of the handler's connection pool)
+    """
+
+    def __init__(self, handler, max_workers: Optional[int] = None):
+        self._handler = handler
+        self._max_workers = max_workers or getattr(handler, "_pool_size", 4)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def handler(self):
+        """The wrapped SQLLiteHandler."""
+        return self._handler
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix="fiwa-db")
+            return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        """Run any blocking callable, e.g. a helper taking the handler, on the pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self._handler, name)
+        if not name.startswith("op_") or not callable(attr):
+            raise AttributeError(f"AsyncHandler only wraps op_ methods, not '{name}'")
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            if hasattr(self._handler, "acall"):
+                # the API backend has its own async client
+                return await self._handler.acall(name, *args, **kwargs)
+            writer = getattr(self._handler, "writer", None)
+            if writer is not None and getattr(attr, "_write_op", False):
+                return await writer.asubmit(name, *args, **kwargs)
+            return await self.run(attr, *args, **kwargs)
+
+        return call
+
+    async def op_item_iter(self, project_id: int, **kwargs):
+        """
+        Async generator over the items of a project, see SQLLiteHandler.op_item_iter().
+        Each page is fetched on the pool; no connection is held between pages.
+        """
+        cursor = kwargs.pop("cursor", None)
+        while True:
+            page = await self.op_item_page(project_id, cursor=cursor, **kwargs)
+            for item in page["items"]:
+                yield item
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    def atransaction(self, immediate: bool = True):
+        """
+        Async unit of work, see SQLLiteHandler.atransaction(). The API backend
+        has no client-side transactions; send the calls together with
+        op_unit_of_work() instead, which works with both backends.
+        """
+        if not hasattr(self._handler, "atransaction"):
+            raise NotImplementedError(f"{type(self._handler).__name__} has no transactions, use op_unit_of_work()")
+        return self._handler.atransaction(immediate=immediate)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker threads; a later call starts new ones."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -1,21 +1,73 @@
 import sqlite3
+import copy
+import json
 from typing import Dict, Optional
 from pathlib import Path
 import os
+import re
+import time
 import hashlib
 import uuid
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, asynccontextmanager
 from datetime import datetime
 from datetime import timedelta
 
+from functions.sqlite_pool import SQLitePool
+from functions.storage import resolve_storage_profile, apply_pragmas, read_pragmas
+from functions.migrations import run_migrations, latest_version, set_version
+from functions.statements import StatementRegistry
+from functions.items import (normalize_item, chunked, format_bought_date, item_row_to_dict,
+                             encode_cursor, decode_cursor, ITEM_SELECT_COLUMNS, ITEM_FIELDS)
+from functions.cache import LRUCache, TTLCache
+from functions.rates import RateStore
+from functions.search import SEARCH_KINDS, build_match_query, encode_search_cursor, decode_search_cursor
+from functions.writer import SingleWriter, write_op
+from functions.rollups import ROLLUP_TYPES, month_begin, next_month_begin, rollup_row_to_dict
+from functions.sync import change_row_to_dict, change_version, SYNC_PAGE_SIZE
+from functions.analytics import ANALYTICS_PAGE_SIZE
+
+# sessions expire this long after the login
+SESSION_TIMEOUT = timedelta(minutes=30)
+# seconds a session context is served from memory before it is read again
+SESSION_CACHE_TTL = 60.0
+# number of results of project and label reads kept in memory
+READ_CACHE_SIZE = 512
+
+_MISSING = object()
+
+
 class SQLLiteHandler:
-    def __init__(self, db_path=":memory:"):
+    def __init__(self, db_path=":memory:", pool_size=4):
         self._pw_salt = "fiwa_default_salt_2026"
         self._db_salt = "stand"
         self._db_path = db_path
-        self._connection = None
-        self._cursor = None
+        self._pool_size = pool_size
+        self._pool = None
+        self._local = threading.local()
+        self._schema_path = None
+        self._statements = StatementRegistry()
+        self._rates = RateStore(self)
+        self._session_cache = TTLCache(maxsize=8, ttl=SESSION_CACHE_TTL)
+        self._read_cache = LRUCache(maxsize=READ_CACHE_SIZE)
+        self._writer = None
+        self._storage_profile, self._pragmas = resolve_storage_profile()
+
+    @property
+    def _connection(self):
+        # the connection borrowed by the calling thread (None outside load/close)
+        return self._pool.current() if self._pool is not None else None
+
+    @property
+    def _cursor(self):
+        return getattr(self._local, "cursor", None)
 
     def set_path(self, db_path):
+        # connections to the old path must not be handed out any more
+        self.shutdown()
         self._db_path = db_path
 
     def set_pw_salt(self, pw_salt):
@@ -24,6 +76,22 @@ class SQLLiteHandler:
     def set_db_salt(self, db_salt):
         self._db_salt = db_salt
 
+    def set_storage_profile(self, storage_config: Dict = None) -> str:
+        """
+        Select the SQLite performance profile (journal mode, synchronous, cache,
+        mmap, temp store and busy timeout) applied to every new connection.
+
+        Args:
+            storage_config: The "storage" section of config.yml
+
+        Returns:
+            The name of the active profile
+        """
+        self._storage_profile, self._pragmas = resolve_storage_profile(storage_config)
+        # pooled connections were opened with the previous settings
+        self.shutdown()
+        return self._storage_profile
+
     @staticmethod
     def hash_password(password: str, salt: str = None) -> str:
         """
@@ -48,11 +116,12 @@ class SQLLiteHandler:
         return hash_object.hexdigest()
 
     def initialize_database(self, schema_path=None):
+        self._schema_path = schema_path
 
         if os.path.exists(self._db_path):
-            return 2  # Database already exists, no need to initialize
-
-        self.load()
+            # Database already exists: bring it up to the latest schema version
+            self.migrate()
+            return 2
 
         # Read and execute schema file
         schema_file = Path(schema_path)
@@ -60,26 +129,361 @@ class SQLLiteHandler:
             raise FileNotFoundError(f"Schema file not found: {schema_path}")
 
         schema_sql = schema_file.read_text(encoding='utf-8')
+
+        self.load()
         self._cursor.executescript(schema_sql)
         self._connection.commit()
+        # schema.sql always describes the latest version, nothing to migrate
+        set_version(self, latest_version())
 
         self.close()
 
         return 1
 
+    def migrate(self, progress=None) -> list:
+        """
+        Apply all schema migrations above the database's PRAGMA user_version.
+
+        Args:
+            progress: Optional callable(step, done, total) reporting the progress
+
+        Returns:
+            List of the versions that were applied
+        """
+        return run_migrations(self, progress=progress)
+
+    def open(self):
+        """
+        Open the connection pool and warm up one connection, so the first
+        op_ call does not pay for connection setup and schema parsing.
+        """
+        self.load()
+        self.close()
+
+    def shutdown(self):
+        """
+        Close all pooled connections. The pool is re-created lazily if the
+        handler is used again afterwards.
+        """
+        self.stop_writer()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    @property
+    def writer(self) -> Optional[SingleWriter]:
+        """The running writer thread, see start_writer(), or None."""
+        return self._writer
+
+    def start_writer(self, max_batch: int = 256, max_delay: float = 0.002) -> SingleWriter:
+        """
+        Route all writes through one writer thread that commits the writes of
+        concurrent callers together (see functions/writer.py). The writer keeps
+        one connection of the pool for itself.
+
+        Args:
+            max_batch: Maximum number of operations committed together
+            max_delay: Seconds to wait for more operations before a commit
+
+        Returns:
+            The started SingleWriter
+        """
+        if self._writer is None:
+            if self._pool_size < 2:
+                raise ValueError("The writer needs a pool of at least 2 connections")
+            self._writer = SingleWriter(self, max_batch=max_batch, max_delay=max_delay)
+            self._writer.start()
+        return self._writer
+
+    def stop_writer(self) -> None:
+        """Commit the queued writes and stop the writer; writes run on the calling thread again."""
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.stop()
+
+    def _get_pool(self):
+        if self._pool is None:
+            pragmas = self._pragmas
+            self._pool = SQLitePool(self._db_path, size=self._pool_size,
+                                    # room for every named statement plus the dynamic ones
+                                    cached_statements=2 * len(self._statements) + 64,
+                                    on_connect=lambda connection: apply_pragmas(connection, pragmas))
+        return self._pool
+
     def load(self):
-        self._connection = sqlite3.connect(self._db_path)
-        self._cursor = self._connection.cursor()
+        """
+        Borrow a pooled connection for the calling thread. Calls nest: only the
+        outermost load() takes a connection from the pool.
+        """
+        pool = self._get_pool()
+        connection = pool.acquire()
+        if pool.depth() == 1:
+            self._local.cursor = connection.cursor()
 
     def execute_query(self, query, params=None):
         if params is None:
             params = []
         self._cursor.execute(query, params)
-        self._connection.commit()
+        if not self.in_transaction():
+            # outside a unit of work every statement is committed on its own
+            self._connection.commit()
         return self._cursor.fetchall()
 
+    def execute_named(self, name, params=None):
+        """
+        Execute a statement of the registry in functions/statements.py by name.
+
+        The SQL text is rendered once per db_salt and reused, so the connection's
+        statement cache finds the prepared statement again. Execution count and
+        time are recorded per statement, see op_statement_stats().
+        """
+        query = self._statements.sql(name, self._db_salt)
+        start = time.perf_counter()
+        try:
+            return self.execute_query(query, params)
+        finally:
+            self._statements.record(name, time.perf_counter() - start)
+
+    def execute_named_many(self, name, seq_of_params):
+        """Run a named statement once per parameter set with executemany()."""
+        query = self._statements.sql(name, self._db_salt)
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(query, seq_of_params)
+            if not self.in_transaction():
+                self._connection.commit()
+            return self._cursor.rowcount
+        finally:
+            self._statements.record(name, time.perf_counter() - start)
+
+    def in_transaction(self) -> bool:
+        """Return True if the calling thread is inside a transaction() scope."""
+        return getattr(self._local, "tx_depth", 0) > 0
+
+    def _cached_read(self, key, read):
+        """
+        Read-through cache of the project and label reads: return a copy of the
+        cached result of key, or call read() and cache what it returns. Results
+        read inside a transaction are not cached, they may never be committed,
+        and neither are results a write invalidated while they were read.
+        """
+        value = self._read_cache.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._read_cache.generation
+            value = read()
+            if not self.in_transaction():
+                self._read_cache.put(key, value, generation=generation)
+        return copy.deepcopy(value)
+
+    def _invalidate_reads(self, *keys) -> None:
+        """
+        Drop the cached results of keys after a write. Inside a transaction the
+        keys are dropped again when it ends, so no other thread can cache the
+        state from before the commit in between.
+        """
+        for key in keys:
+            self._read_cache.invalidate(key)
+        if keys and self.in_transaction():
+            self._local.__dict__.setdefault("stale_reads", set()).update(keys)
+
+    def _invalidate_stale(self) -> None:
+        """At the end of the outermost transaction: drop again what its writes invalidated."""
+        self._invalidate_reads(*self._local.__dict__.pop("stale_reads", ()))
+        if self._local.__dict__.pop("stale_session", False):
+            self._session_cache.clear()
+
+    @contextmanager
+    def transaction(self, immediate: bool = True):
+        """
+        Group several op_ calls into one atomic commit.
+
+        The outermost scope opens a transaction and commits it on exit, so all
+        writes inside share one fsync. Nested scopes become savepoints: if a
+        nested block raises, only its own changes are rolled back and the
+        exception propagates to the caller, which may catch it and carry on.
+
+        Example:
+            with dbh.transaction():
+                for label in labels:
+                    try:
+                        with dbh.transaction():
+                            dbh.op_label_create(label, project_id)
+                    except ValueError:
+                        pass  # this label is skipped, the others are kept
+
+        Args:
+            immediate: Take the write lock when the transaction starts (default: True)
+        """
+        self.load()
+        depth = getattr(self._local, "tx_depth", 0)
+        savepoint = f"fiwa_sp_{depth}"
+        try:
+            if depth == 0:
+                self._connection.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            else:
+                self._connection.execute(f"SAVEPOINT {savepoint}")
+        except Exception:
+            self.close()
+            raise
+
+        self._local.tx_depth = depth + 1
+        try:
+            yield self
+        except BaseException:
+            self._local.tx_depth = depth
+            if depth == 0:
+                self._connection.execute("ROLLBACK")
+                self._invalidate_stale()
+            else:
+                self._connection.execute(f"ROLLBACK TO {savepoint}")
+                self._connection.execute(f"RELEASE {savepoint}")
+            raise
+        else:
+            self._local.tx_depth = depth
+            if depth == 0:
+                try:
+                    self._connection.execute("COMMIT")
+                except Exception:
+                    self._connection.execute("ROLLBACK")
+                    raise
+                finally:
+                    self._invalidate_stale()
+            else:
+                self._connection.execute(f"RELEASE {savepoint}")
+        finally:
+            self.close()
+
+    @asynccontextmanager
+    async def atransaction(self, immediate: bool = True):
+        """
+        Async equivalent of transaction().
+
+        SQLite transactions belong to one connection, and the pool hands out
+        connections per thread, so the whole unit of work runs on a single
+        dedicated thread. The yielded object exposes every op_ method as a
+        coroutine executed on that thread.
+
+        Example:
+            async with dbh.atransaction() as tx:
+                await tx.op_label_create(label_dict, project_id)
+                async with tx.savepoint():
+                    await tx.op_label_update(label_id, changes)
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fiwa-tx")
+        tx = AsyncTransaction(self, executor)
+        try:
+            async with tx.savepoint(immediate=immediate):
+                yield tx
+        finally:
+            executor.shutdown(wait=False)
+
     def close(self):
-        self._connection.close()
+        """
+        Give the borrowed connection back to the pool once the outermost
+        load() is matched. The connection itself stays open.
+        """
+        if self._pool is None:
+            return
+        self._pool.release()
+        if self._pool.depth() == 0:
+            self._local.cursor = None
+
+    def op_ensure_indexes(self, schema_path=None, progress=None) -> list:
+        """
+        This is database operation (op_) to build the indexes declared in the
+        schema file that an existing database does not have yet.
+
+        Args:
+            schema_path: Path to schema.sql, the source of the index definitions
+            progress: Optional callable(done, total, index_name, seconds) called after
+                each index is built. By default progress is printed.
+
+        Returns:
+            List of the names of the indexes that were created
+        """
+        schema_file = Path(schema_path)
+        if not schema_file.exists():
+            raise FileNotFoundError(f"Schema file not found: {schema_path}")
+
+        # index name -> (table, CREATE INDEX statement), with the table prefix of this handler
+        index_sql = {}
+        for match in re.finditer(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+IF\s+NOT\s+EXISTS\s+(\w+)\s+ON\s+(\w+)[^;]*;",
+                                 schema_file.read_text(encoding='utf-8')):
+            index_sql[match.group(1).replace("pstand_", f"p{self._db_salt}_", 1)] = (
+                match.group(2).replace("pstand_", f"p{self._db_salt}_", 1),
+                match.group(0).replace("pstand_", f"p{self._db_salt}_"))
+
+        self.load()
+        try:
+            existing = {row[0] for row in self.execute_query(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )}
+            tables = {row[0] for row in self.execute_query(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )}
+            # indexes of tables a later migration creates are built by that migration
+            missing = [name for name, (table, _) in index_sql.items()
+                       if name not in existing and table in tables]
+
+            created = []
+            for i, name in enumerate(missing, start=1):
+                start = time.perf_counter()
+                self.execute_query(index_sql[name][1])
+                elapsed = time.perf_counter() - start
+                created.append(name)
+                if progress is not None:
+                    progress(i, len(missing), name, elapsed)
+                else:
+                    print(f"Building index {i}/{len(missing)}: {name} ({elapsed:.2f}s)")
+
+            if created:
+                # refresh the planner statistics so the new indexes get used
+                self.execute_query("PRAGMA optimize")
+        finally:
+            self.close()
+        return created
+
+    def op_storage_info(self) -> Dict:
+        """
+        This is database operation (op_) to get the active storage profile and
+        the PRAGMA settings actually in effect on the connection.
+        :return: Dictionary with the profile name and its settings
+        """
+        self.load()
+        pragmas = read_pragmas(self._connection)
+        self.close()
+        return {"profile": self._storage_profile, **pragmas}
+
+    def op_statement_stats(self, reset: bool = False) -> list:
+        """
+        This is database operation (op_) to get the execution statistics of the
+        named statements, the ones with the highest cumulative time first.
+
+        Args:
+            reset: Clear the statistics after reading them
+
+        Returns:
+            List of dictionaries with statement, count, total_ms and mean_ms
+        """
+        stats = self._statements.stats()
+        if reset:
+            self._statements.reset_stats()
+        return stats
+
+    def op_cache_stats(self, reset: bool = False) -> Dict:
+        """
+        Get the statistics of the read-through cache of project and label reads.
+
+        Args:
+            reset: Reset the counters after reading them
+
+        Returns:
+            Dictionary with size, maxsize, hits, misses, evictions, invalidations and hit_rate
+        """
+        stats = self._read_cache.stats()
+        if reset:
+            self._read_cache.reset_stats()
+        return stats
 
     def op_total_number_of_users(self):
         """
@@ -87,10 +491,11 @@ class SQLLiteHandler:
         :return:
         """
         self.load()
-        result = self.execute_query(f"SELECT COUNT(*) FROM p{self._db_salt}_users")
+        result = self.execute_named("users.count")
         self.close()
         return result[0][0] if result else 0
 
+    @write_op
     def op_user_create(self, user_dict: Dict) -> Optional[int]:
         """
         Create a user in the database based on the schema.
@@ -135,14 +540,6 @@ class SQLLiteHandler:
         scope = user_dict.get('scope', 'user:write')
         activated = 1 if user_dict.get('activated', True) else 0
 
-        # Construct query
-        query = f"""
-            INSERT INTO p{self._db_salt}_users 
-            (first_name, last_name, username, birthday, email, password_hash, 
-             activated, is_superuser, scope, max_projects, unique_identifier)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-
         params = [
             first_name, last_name, username, birthday, email, password_hash,
             activated, is_superuser, scope, max_projects, unique_identifier
@@ -150,10 +547,11 @@ class SQLLiteHandler:
 
         try:
             self.load()
-            self.execute_query(query, params)
+            self.execute_named("users.insert", params)
             # Get the last inserted row id
             user_id = self._cursor.lastrowid
             self.close()
+            self._invalidate_reads(("op_get_max_projects", user_id), ("op_project_get_info", user_id))
             return user_id
         except sqlite3.IntegrityError as e:
             self.close()
@@ -167,6 +565,7 @@ class SQLLiteHandler:
             self.close()
             raise Exception(f"Failed to create user: {str(e)}")
 
+    @write_op
     def op_user_login(self, username, password):
         """
         This is database operation (op_) to login a user from the database.
@@ -186,11 +585,7 @@ class SQLLiteHandler:
 
         self.load()
         # Check against both username and email fields
-        result = self.execute_query(
-            f"""SELECT user_id FROM p{self._db_salt}_users 
-                WHERE (username = ? OR email = ?) AND password_hash = ? AND activated = 1""",
-            [username, username, password_hash]
-        )
+        result = self.execute_named("users.login", [username, username, password_hash])
 
         # If no matching user is found, return None
         if not result:
@@ -205,20 +600,13 @@ class SQLLiteHandler:
         session_type = "local_login"
 
         # Delete any existing sessions for this user (enforce single session)
-        self.execute_query(
-            f"DELETE FROM p{self._db_salt}_session_table WHERE user_id = ?",
-            [user_id]
-        )
+        self.execute_named("sessions.delete_by_user", [user_id])
 
         # Insert new session
-        self.execute_query(
-            f"""INSERT INTO p{self._db_salt}_session_table 
-                (user_id, session_start, session_uuid, session_type) 
-                VALUES (?, ?, ?, ?)""",
-            [user_id, now, session_uuid, session_type]
-        )
+        self.execute_named("sessions.insert", [user_id, now, session_uuid, session_type])
 
         self.close()
+        self._invalidate_session_context()
 
         # Return session information as a dictionary
         return {
@@ -228,6 +616,7 @@ class SQLLiteHandler:
             "session_type": session_type
         }
 
+    @write_op
     def op_user_logout(self, session_uuid):
         """
         This is database operation (op_) to logout a user from the database.
@@ -241,11 +630,9 @@ class SQLLiteHandler:
         self.load()
         # Delete the session with the given UUID
         try:
-            self.execute_query(
-                f"DELETE FROM p{self._db_salt}_session_table WHERE session_uuid = ?",
-                [session_uuid]
-            )
+            self.execute_named("sessions.delete_by_uuid", [session_uuid])
             self.close()
+            self._invalidate_session_context()
             return True
         except Exception as e:
             self.close()
@@ -253,77 +640,89 @@ class SQLLiteHandler:
 
     def op_get_user_sessions(self) -> Dict:
         """
-        This is database operation (op_) to get all active sessions for a user from the database.
+        This is database operation (op_) to get the active session with its user and projects.
+        Same as op_session_context(), which serves it from memory.
+
+        Returns:
+            A dictionary containing session information for the user, empty without a valid session
+        """
+        return self.op_session_context()
+
+    def op_session_context(self, refresh: bool = False) -> Dict:
+        """
+        Get "who am I and which projects": the active session, its user and the
+        projects of the user, read in one joined query.
+
+        The result is cached in memory for SESSION_CACHE_TTL seconds (never beyond
+        the expiry of the session); a context read inside a transaction is not
+        cached. Login, logout and changes of projects and project memberships
+        invalidate it.
 
         Args:
-            user_id: The ID of the user to retrieve sessions for
+            refresh: Read the database even if a cached context exists
+
         Returns:
-            A dictionary containing session information for the user
+            Dictionary with user_id, session_info, user_info and project_info (see
+            op_user_get_info and op_project_get_info), or an empty dictionary if
+            there is no single valid session
         """
-        dt_now = datetime.utcnow()
+        if not refresh:
+            context = self._session_cache.get("session")
+            if context is not None:
+                return copy.deepcopy(context)
 
         self.load()
-        result = self.execute_query(
-            f"""SELECT * FROM p{self._db_salt}_session_table"""
-        )
+        try:
+            result = self.execute_named("sessions.context")
+        finally:
+            self.close()
 
-        if len(result) != 1:
+        if not result:
+            if not self.in_transaction():
+                self._session_cache.put("session", {})
+            return {}
+        if result[0][0] != 1:
             print("Not allowed to have multiple sessions for one user, but found multiple sessions in the database. This should not happen.")
-            self.close()
             return {}
 
-        elif len(result) == 1:
-            # we use the first session, extract the user_id and session_uuid and session_start and session_type
-            result = result[0]
-            user_id = result[1]
-            session_uuid = result[3]
-            session_start = result[2]
-            session_type = result[4]
-            session_start = datetime.fromisoformat(session_start)
-
-            self.close()
-
-            if dt_now - session_start > timedelta(minutes=30):
-                # session expired, delete it and return empty
-                self.op_user_logout(session_uuid)
-                return {}
-
-            # Fetch user info and project info
-            user_info = self.op_user_get_info(user_id)
-            project_info = self.op_project_get_info(user_id)
-
-            return {
-                "user_id": user_info["user_id"],
-                "session_info": {
-                    "session_uuid": session_uuid,
-                    "session_start": session_start,
-                    "session_type": session_type,
-                    "is_logged_in": True
-                },
-                "user_info": user_info,
-                "project_info": project_info
-            }
+        first = result[0]
+        session_uuid, session_start, session_type = first[1:4]
+        session_start = datetime.fromisoformat(session_start)
+        remaining = (session_start + SESSION_TIMEOUT - datetime.utcnow()).total_seconds()
+        if remaining <= 0:
+            # session expired, delete it and return empty
+            self.op_user_logout(session_uuid)
+            return {}
 
-        return True
+        user_info = self._user_info_from_row(first[4:15])
+        context = {
+            "user_id": user_info["user_id"],
+            "session_info": {
+                "session_uuid": session_uuid,
+                "session_start": session_start,
+                "session_type": session_type,
+                "is_logged_in": True
+            },
+            "user_info": user_info,
+            "project_info": [self._project_info_from_row(row[15:]) for row in result if row[15] is not None]
+        }
+        # a context read inside a transaction may never be committed
+        if not self.in_transaction():
+            self._session_cache.put("session", context, ttl=min(SESSION_CACHE_TTL, remaining))
+        return copy.deepcopy(context)
 
-    def op_user_get_info(self, user_id):
+    def _invalidate_session_context(self) -> None:
         """
-        This is database operation (op_) to get user information from the database.
-        :return:
+        Drop the cached session context after a login, logout or project change.
+        Inside a transaction it is dropped again when the transaction ends.
         """
-        self.load()
-        result = self.execute_query(
-            f"""SELECT user_id, first_name, last_name, username, email, birthday, 
-                activated, is_superuser, scope, max_projects, unique_identifier 
-                FROM p{self._db_salt}_users WHERE user_id = ?""",
-            [user_id]
-        )
-        self.close()
-        if not result:
-            return None
+        self._session_cache.clear()
+        if self.in_transaction():
+            self._local.stale_session = True
 
-        row = result[0]
-        user_info = {
+    @staticmethod
+    def _user_info_from_row(row) -> Dict:
+        return {
             "user_id": row[0],
             "first_name": row[1],
             "last_name": row[2],
@@ -336,7 +735,33 @@ class SQLLiteHandler:
             "max_projects": row[9],
             "unique_identifier": row[10]
         }
-        return user_info
+
+    @staticmethod
+    def _project_info_from_row(row) -> Dict:
+        return {
+            "project_id": row[0],
+            "project_name": row[1],  # Column is 'name' in DB, but we return as 'project_name'
+            "description": row[2],
+            "created_at": row[3],
+            "currency_main": row[4],
+            "currency_list": row[5],
+            "project_hash": row[6],
+            "project_primary": bool(row[7]),
+            "project_perm_model": row[8]
+        }
+
+    def op_user_get_info(self, user_id):
+        """
+        This is database operation (op_) to get user information from the database.
+        :return:
+        """
+        self.load()
+        result = self.execute_named("users.info", [user_id])
+        self.close()
+        if not result:
+            return None
+
+        return self._user_info_from_row(result[0])
 
     def op_get_max_projects(self, user_id: int) -> int:
         """
@@ -348,51 +773,29 @@ class SQLLiteHandler:
         Returns:
             The max_projects value for the user, or 3 (default) if not found
         """
-        self.load()
-        result = self.execute_query(
-            f"""SELECT max_projects FROM p{self._db_salt}_users WHERE user_id = ?""",
-            [user_id]
-        )
-        self.close()
+        def read():
+            self.load()
+            result = self.execute_named("users.max_projects", [user_id])
+            self.close()
 
-        if result and len(result) > 0:
-            return result[0][0]
-        return 3  # Default
+            if result and len(result) > 0:
+                return result[0][0]
+            return 3  # Default
+
+        return self._cached_read(("op_get_max_projects", user_id), read)
 
     def op_project_get_info(self, user_id):
         """
         This is database operation (op_) to get project information for a user from the database.
         :return:
         """
-        self.load()
-        result = self.execute_query(
-            f"""SELECT p.project_id, p.name, p.description, p.created_at, 
-                p.currency_main, p.currency_list, p.project_hash, 
-                upm.project_primary, upm.project_perm_model
-                FROM p{self._db_salt}_projects p 
-                JOIN p{self._db_salt}_user_project_map upm ON p.project_id = upm.project_id 
-                WHERE upm.user_id = ?""",
-            [user_id]
-        )
-        self.close()
-        if not result:
-            return []
+        def read():
+            self.load()
+            result = self.execute_named("projects.of_user", [user_id])
+            self.close()
+            return [self._project_info_from_row(row) for row in result]
 
-        project_list = []
-        for row in result:
-            project_info = {
-                "project_id": row[0],
-                "project_name": row[1],  # Column is 'name' in DB, but we return as 'project_name'
-                "description": row[2],
-                "created_at": row[3],
-                "currency_main": row[4],
-                "currency_list": row[5],
-                "project_hash": row[6],
-                "project_primary": bool(row[7]),
-                "project_perm_model": row[8]
-            }
-            project_list.append(project_info)
-        return project_list
+        return self._cached_read(("op_project_get_info", user_id), read)
 
     def op_user_get_all_ids(self):
         """
@@ -400,12 +803,11 @@ class SQLLiteHandler:
         :return: List of user_ids
         """
         self.load()
-        result = self.execute_query(
-            f"""SELECT user_id FROM p{self._db_salt}_users"""
-        )
+        result = self.execute_named("users.all_ids")
         self.close()
         return [row[0] for row in result] if result else []
 
+    @write_op
     def op_project_create(self, project_dict: Dict, user_id: int) -> Optional[int]:
         """
         Create a project in the database and link it to a user.
@@ -443,24 +845,16 @@ class SQLLiteHandler:
 
         # Check if user exists and get max_projects
         self.load()
-        user_result = self.execute_query(
-            f"""SELECT user_id, max_projects FROM p{self._db_salt}_users 
-                WHERE user_id = ?""",
-            [user_id]
-        )
+        user_result = self.execute_named("users.max_projects", [user_id])
 
         if not user_result:
             self.close()
             raise ValueError(f"User with ID {user_id} not found")
 
-        max_projects = user_result[0][1]
+        max_projects = user_result[0][0]
 
         # Count current projects for this user
-        current_projects = self.execute_query(
-            f"""SELECT COUNT(*) FROM p{self._db_salt}_user_project_map 
-                WHERE user_id = ?""",
-            [user_id]
-        )
+        current_projects = self.execute_named("memberships.count_of_user", [user_id])
         project_count = current_projects[0][0] if current_projects else 0
 
         if project_count >= max_projects:
@@ -468,35 +862,26 @@ class SQLLiteHandler:
             raise ValueError(f"User {user_id} has reached the maximum number of projects ({max_projects})")
 
         # Insert project
-        query = f"""
-            INSERT INTO p{self._db_salt}_projects 
-            (name, description, created_at, currency_main, currency_list, project_hash)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """
-
         params = [
             name, description, created_at, currency_main, currency_list_str, project_hash
         ]
 
         try:
-            self.execute_query(query, params)
+            self.execute_named("projects.insert", params)
             project_id = self._cursor.lastrowid
 
             # Determine if this is the user's first/primary project
             is_primary = 1 if project_count == 0 else 0
 
             # Link project to user in user_project_map
-            map_query = f"""
-                INSERT INTO p{self._db_salt}_user_project_map
-                (user_id, project_id, created_at, project_perm_model, project_primary)
-                VALUES (?, ?, ?, ?, ?)
-            """
             map_params = [
                 user_id, project_id, datetime.utcnow().isoformat(), '000000', is_primary
             ]
-            self.execute_query(map_query, map_params)
+            self.execute_named("memberships.insert", map_params)
 
             self.close()
+            self._invalidate_session_context()
+            self._invalidate_reads(("op_project_get_info", user_id))
             return project_id
         except sqlite3.IntegrityError as e:
             self.close()
@@ -510,6 +895,7 @@ class SQLLiteHandler:
             self.close()
             raise Exception(f"Failed to create project: {str(e)}")
 
+    @write_op
     def op_project_update(self, project_dict: Dict) -> bool:
         """
         Update an existing project in the database.
@@ -535,10 +921,7 @@ class SQLLiteHandler:
         self.load()
 
         # Check if project exists
-        existing = self.execute_query(
-            f"""SELECT project_id FROM p{self._db_salt}_projects WHERE project_id = ?""",
-            [project_id]
-        )
+        existing = self.execute_named("projects.exists", [project_id])
         if not existing:
             self.close()
             raise ValueError(f"Project with ID {project_id} not found")
@@ -571,11 +954,7 @@ class SQLLiteHandler:
         # Generate new project hash if name, description, or currency_main changed
         if any(k in project_dict for k in ['name', 'description', 'currency_main']):
             # Get current values for hash calculation
-            current_data = self.execute_query(
-                f"""SELECT name, description, currency_main FROM p{self._db_salt}_projects 
-                    WHERE project_id = ?""",
-                [project_id]
-            )
+            current_data = self.execute_named("projects.hash_fields", [project_id])
             if current_data:
                 current_name = project_dict.get('name', current_data[0][0])
                 current_desc = project_dict.get('description', current_data[0][1] or '')
@@ -599,7 +978,10 @@ class SQLLiteHandler:
 
         try:
             self.execute_query(query, params)
+            members = self.execute_named("memberships.users_of_project", [project_id])
             self.close()
+            self._invalidate_session_context()
+            self._invalidate_reads(*[("op_project_get_info", member) for (member,) in members])
             return True
         except sqlite3.IntegrityError as e:
             self.close()
@@ -610,6 +992,7 @@ class SQLLiteHandler:
             self.close()
             raise Exception(f"Failed to update project: {str(e)}")
 
+    @write_op
     def op_project_add_user(self, project_id: int, user_id: int, project_perm_model: str = '000000', project_primary: bool = False) -> bool:
         """
         Add a user to an existing project.
@@ -626,46 +1009,33 @@ class SQLLiteHandler:
         self.load()
 
         # Check if project exists
-        project_check = self.execute_query(
-            f"""SELECT project_id FROM p{self._db_salt}_projects WHERE project_id = ?""",
-            [project_id]
-        )
+        project_check = self.execute_named("projects.exists", [project_id])
         if not project_check:
             self.close()
             raise ValueError(f"Project with ID {project_id} not found")
 
         # Check if user exists
-        user_check = self.execute_query(
-            f"""SELECT user_id FROM p{self._db_salt}_users WHERE user_id = ?""",
-            [user_id]
-        )
+        user_check = self.execute_named("users.exists", [user_id])
         if not user_check:
             self.close()
             raise ValueError(f"User with ID {user_id} not found")
 
         # Check if user is already in the project
-        existing = self.execute_query(
-            f"""SELECT id FROM p{self._db_salt}_user_project_map 
-                WHERE user_id = ? AND project_id = ?""",
-            [user_id, project_id]
-        )
+        existing = self.execute_named("memberships.find", [user_id, project_id])
         if existing:
             self.close()
             raise ValueError(f"User {user_id} is already a member of project {project_id}")
 
         # Add user to project
         try:
-            map_query = f"""
-                INSERT INTO p{self._db_salt}_user_project_map
-                (user_id, project_id, created_at, project_perm_model, project_primary)
-                VALUES (?, ?, ?, ?, ?)
-            """
             map_params = [
                 user_id, project_id, datetime.utcnow().isoformat(),
                 project_perm_model, 1 if project_primary else 0
             ]
-            self.execute_query(map_query, map_params)
+            self.execute_named("memberships.insert", map_params)
             self.close()
+            self._invalidate_session_context()
+            self._invalidate_reads(("op_project_get_info", user_id))
             return True
         except Exception as e:
             self.close()
@@ -681,41 +1051,74 @@ class SQLLiteHandler:
         Returns:
             List of label dictionaries
         """
-        self.load()
-        result = self.execute_query(
-            f"""SELECT label_id, name, description, created_at, composite, 
-                label_status, label_type
-                FROM p{self._db_salt}_labels 
-                WHERE project_id = ?
-                ORDER BY name""",
-            [project_id]
-        )
-        self.close()
+        def read():
+            self.load()
+            result = self.execute_named("labels.of_project", [project_id])
+            self.close()
 
-        if not result:
+            labels = []
+            for row in result:
+                import json
+                try:
+                    composite = json.loads(row[4]) if row[4] else []
+                except:
+                    composite = []
+
+                label = {
+                    "label_id": row[0],
+                    "name": row[1],
+                    "description": row[2],
+                    "created_at": row[3],
+                    "composite": composite,
+                    "label_status": row[5],  # 0=deleted, 1=deactivated, 2=active
+                    "label_type": row[6]
+                }
+                labels.append(label)
+            return labels
+
+        return self._cached_read(("op_label_get_all", project_id), read)
+
+    def _label_children(self, composite) -> list:
+        """Validate a composite list and return the child label IDs it contains."""
+        if composite is None:
             return []
-
-        labels = []
-        for row in result:
-            import json
+        if not isinstance(composite, (list, tuple)):
+            raise ValueError(f"Composite must be a list of label IDs, got {composite!r}")
+        children = []
+        for child in composite:
+            if isinstance(child, bool):
+                raise ValueError(f"Composite must contain label IDs, got {child!r}")
             try:
-                composite = json.loads(row[4]) if row[4] else []
-            except:
-                composite = []
-
-            label = {
-                "label_id": row[0],
-                "name": row[1],
-                "description": row[2],
-                "created_at": row[3],
-                "composite": composite,
-                "label_status": row[5],  # 0=deleted, 1=deactivated, 2=active
-                "label_type": row[6]
-            }
-            labels.append(label)
-
-        return labels
-
+                child = int(child)
+            except (TypeError, ValueError):
+                raise ValueError(f"Composite must contain label IDs, got {child!r}")
+            if child not in children:
+                children.append(child)
+        return children
+
+    def _label_set_children(self, label_id: int, project_id: int, old_children: list, new_children: list) -> None:
+        """
+        Move the label's edges in the closure table from old_children to
+        new_children. Must run inside a transaction.
+        """
+        for child in old_children:
+            if child not in new_children:
+                self.execute_named("label_closure.remove_edge", {"parent": label_id, "child": child})
+        self.execute_named("label_closure.prune")
+
+        for child in new_children:
+            if child in old_children:
+                continue
+            existing = self.execute_named("labels.composite", [child])
+            if not existing or existing[0][0] != project_id:
+                raise ValueError(f"Composite label {child} not found in this project")
+            # the new edge closes a cycle if the parent is reachable from the child
+            if self.execute_named("label_closure.reaches", [child, label_id]):
+                raise ValueError(f"Label {child} cannot be part of label {label_id}: "
+                                 f"this would create a cycle in the label hierarchy")
+            self.execute_named("label_closure.add_edge", {"parent": label_id, "child": child})
+
+    @write_op
     def op_label_create(self, label_dict: Dict, project_id: int) -> Optional[int]:
         """
         Create a new label for a project.
@@ -724,7 +1127,8 @@ class SQLLiteHandler:
             label_dict: Dictionary containing label information with keys:
                 - name (required): Label name
                 - description (optional): Label description
-                - composite (optional): List of composite elements
+                - composite (optional): List of the IDs of the labels this label is
+                  composed of (its children in the label hierarchy)
                 - label_status (optional): Status (0=deleted, 1=deactivated, 2=active)
                 - label_type (optional): Type (default: 1)
             project_id: The ID of the project
@@ -741,48 +1145,38 @@ class SQLLiteHandler:
         # Prepare values with defaults
         name = label_dict['name']
         description = label_dict.get('description', '')
-        composite = label_dict.get('composite', [])
-        composite_str = json.dumps(composite)
+        children = self._label_children(label_dict.get('composite', []))
+        composite_str = json.dumps(children)
         label_status = label_dict.get('label_status', 2)  # Default: active
         label_type = label_dict.get('label_type', 1)
         created_at = datetime.utcnow().isoformat()
 
-        self.load()
-
-        # Check if label with same name exists in this project
-        existing = self.execute_query(
-            f"""SELECT label_id FROM p{self._db_salt}_labels 
-                WHERE name = ? AND project_id = ?""",
-            [name, project_id]
-        )
-
-        if existing:
-            self.close()
-            raise ValueError(f"Label '{name}' already exists in this project")
-
         # Insert label
-        query = f"""
-            INSERT INTO p{self._db_salt}_labels 
-            (name, description, created_at, project_id, composite, label_status, label_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """
-
         params = [name, description, created_at, project_id, composite_str, label_status, label_type]
 
         try:
-            self.execute_query(query, params)
-            label_id = self._cursor.lastrowid
-            self.close()
+            with self.transaction():
+                # Check if label with same name exists in this project
+                existing = self.execute_named("labels.find_by_name", [name, project_id])
+                if existing:
+                    raise ValueError(f"Label '{name}' already exists in this project")
+
+                self.execute_named("labels.insert", params)
+                label_id = self._cursor.lastrowid
+                self.execute_named("label_closure.insert_self", [label_id, label_id])
+                self._label_set_children(label_id, project_id, [], children)
+                self._invalidate_reads(("op_label_get_all", project_id))
             return label_id
+        except ValueError:
+            raise
         except sqlite3.IntegrityError as e:
-            self.close()
             if "UNIQUE constraint failed" in str(e):
                 raise ValueError(f"Label '{name}' already exists in this project")
             raise
         except Exception as e:
-            self.close()
             raise Exception(f"Failed to create label: {str(e)}")
 
+    @write_op
     def op_label_update(self, label_id: int, label_dict: Dict) -> bool:
         """
         Update an existing label.
@@ -792,7 +1186,8 @@ class SQLLiteHandler:
             label_dict: Dictionary containing label information with keys:
                 - name (optional): Updated label name
                 - description (optional): Updated description
-                - composite (optional): Updated composite list
+                - composite (optional): Updated list of child label IDs; the label
+                  hierarchy is updated and a ValueError is raised for cycles
                 - label_status (optional): Updated status
                 - label_type (optional): Updated type
 
@@ -801,18 +1196,6 @@ class SQLLiteHandler:
         """
         import json
 
-        self.load()
-
-        # Check if label exists
-        existing = self.execute_query(
-            f"""SELECT label_id FROM p{self._db_salt}_labels WHERE label_id = ?""",
-            [label_id]
-        )
-
-        if not existing:
-            self.close()
-            raise ValueError(f"Label with ID {label_id} not found")
-
         # Build update query dynamically
         update_fields = []
         params = []
@@ -825,9 +1208,11 @@ class SQLLiteHandler:
             update_fields.append("description = ?")
             params.append(label_dict['description'])
 
+        children = None
         if 'composite' in label_dict:
+            children = self._label_children(label_dict['composite'])
             update_fields.append("composite = ?")
-            params.append(json.dumps(label_dict['composite']))
+            params.append(json.dumps(children))
 
         if 'label_status' in label_dict:
             update_fields.append("label_status = ?")
@@ -838,7 +1223,6 @@ class SQLLiteHandler:
             params.append(label_dict['label_type'])
 
         if not update_fields:
-            self.close()
             raise ValueError("No fields to update")
 
         # Add label_id for WHERE clause
@@ -852,22 +1236,36 @@ class SQLLiteHandler:
         """
 
         try:
-            self.execute_query(query, params)
-            self.close()
+            with self.transaction():
+                # Check if label exists
+                existing = self.execute_named("labels.composite", [label_id])
+                if not existing:
+                    raise ValueError(f"Label with ID {label_id} not found")
+
+                project_id, old_composite = existing[0]
+                if children is not None:
+                    self._label_set_children(label_id, project_id,
+                                             self._label_children(json.loads(old_composite or "[]")), children)
+                self.execute_query(query, params)
+                self._invalidate_reads(("op_label_get_all", project_id))
             return True
+        except ValueError:
+            raise
         except sqlite3.IntegrityError as e:
-            self.close()
             if "UNIQUE constraint failed" in str(e):
                 raise ValueError(f"Label name must be unique within the project")
             raise
         except Exception as e:
-            self.close()
             raise Exception(f"Failed to update label: {str(e)}")
 
+    @write_op
     def op_label_delete(self, label_id: int, hard_delete: bool = False) -> bool:
         """
         Delete a label (soft or hard delete).
 
+        A hard delete also removes the label from the label hierarchy: it is
+        dropped from the composite lists of its parents.
+
         Args:
             label_id: The ID of the label to delete
             hard_delete: If True, permanently delete. If False, mark as deleted (status=0)
@@ -875,22 +1273,777 @@ class SQLLiteHandler:
         Returns:
             True if successful, raises exception otherwise
         """
+        import json
+
+        try:
+            with self.transaction():
+                existing = self.execute_named("labels.composite", [label_id])
+                if existing:
+                    self._invalidate_reads(("op_label_get_all", existing[0][0]))
+
+                if not hard_delete:
+                    # Soft delete - mark as deleted (status = 0)
+                    self.execute_named("labels.soft_delete", [label_id])
+                    return True
+
+                # Permanently delete the label, after unlinking it from the hierarchy
+                if existing:
+                    project_id, composite = existing[0]
+                    self._label_set_children(label_id, project_id,
+                                             self._label_children(json.loads(composite or "[]")), [])
+                    for (parent_id,) in self.execute_named("label_closure.parents", [label_id]):
+                        parent = self.execute_named("labels.composite", [parent_id])
+                        siblings = self._label_children(json.loads(parent[0][1] or "[]"))
+                        self._label_set_children(parent_id, project_id, siblings,
+                                                 [child for child in siblings if child != label_id])
+                        self.execute_named("labels.set_composite",
+                                           [json.dumps([child for child in siblings if child != label_id]),
+                                            parent_id])
+                    self.execute_named("label_closure.delete_label", [label_id, label_id])
+                self.execute_named("labels.delete", [label_id])
+            return True
+        except Exception as e:
+            raise Exception(f"Failed to delete label: {str(e)}")
+
+    def op_label_descendants(self, label_id: int) -> list:
+        """
+        Get all labels below a label in the composite hierarchy.
+
+        Args:
+            label_id: The ID of the label
+
+        Returns:
+            List of (label_id, depth) tuples, nearest first; the label itself is
+            included with depth 0
+        """
+        self.load()
+        try:
+            return [tuple(row) for row in self.execute_named("label_closure.descendants", [label_id])]
+        finally:
+            self.close()
+
+    def op_label_ancestors(self, label_id: int) -> list:
+        """
+        Get all labels a label is part of, directly or through other composites.
+
+        Args:
+            label_id: The ID of the label
+
+        Returns:
+            List of (label_id, depth) tuples, nearest first; the label itself is
+            included with depth 0
+        """
         self.load()
+        try:
+            return [tuple(row) for row in self.execute_named("label_closure.ancestors", [label_id])]
+        finally:
+            self.close()
+
+    def op_label_rollup(self, label_id: int, since=None, until=None) -> Dict:
+        """
+        Sum the items of a label and of every label below it in the composite
+        hierarchy, with one join over the closure table. Items carrying
+        several of these labels are counted once.
+
+        Args:
+            label_id: The ID of the label
+            since: Only items bought at or after this date
+            until: Only items bought before this date
+
+        Returns:
+            Dictionary with the keys label_id, count and sum (of price_final)
+        """
+        begin = format_bought_date(since) if since is not None else ""
+        end = format_bought_date(until) if until is not None else "9999-12-31"
+
+        self.load()
+        try:
+            label = self.execute_named("labels.composite", [label_id])
+            if not label:
+                raise ValueError(f"Label with ID {label_id} not found")
+            count, total = self.execute_named("label_closure.rollup", [label_id, label[0][0], begin, end])[0]
+        finally:
+            self.close()
+        return {"label_id": label_id, "count": count, "sum": total}
 
-        if hard_delete:
-            # Permanently delete the label
-            query = f"""DELETE FROM p{self._db_salt}_labels WHERE label_id = ?"""
+    @write_op
+    def op_item_create_many(self, project_id: int, items, added_by_id: Optional[int] = None,
+                            chunk_size: int = 5000, skip_invalid: bool = False,
+                            return_ids: bool = True, skip_existing: bool = False) -> Dict:
+        """
+        Insert many items into a project in one transaction.
+
+        The items are consumed lazily, validated and inserted with executemany()
+        in chunks of chunk_size rows, so generators of any length can be loaded
+        with constant memory. Either all valid items are stored or none. The
+        monthly rollups (see functions/rollups.py) of the new items are added in
+        the same transaction with one grouped statement.
+
+        Args:
+            project_id: The ID of the project
+            items: Iterable or generator of item dictionaries or tuples, see
+                functions/items.py normalize_item() for the fields
+            added_by_id: User entering the items (default: the buyer of each item)
+            chunk_size: Number of rows per executemany() call
+            skip_invalid: If True, invalid items are reported in the summary and
+                skipped. If False (default), the first invalid item raises a
+                ValueError and nothing is stored.
+            return_ids: Include the IDs of the created items in the summary
+            skip_existing: Skip items whose item_uuid is already stored, so a
+                repeated call (e.g. a replayed offline write) stores each item once
+
+        Returns:
+            Summary dictionary with keys created, skipped, errors (list of
+            (index, message)), existing (number of items skipped by
+            skip_existing), item_ids (if return_ids) and seconds
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        start = time.perf_counter()
+        created = 0
+        existing = 0
+        errors = []
+        item_ids = []
+
+        with self.transaction():
+            project = self.execute_named("projects.currency_main", [project_id])
+            if not project:
+                raise ValueError(f"Project with ID {project_id} not found")
+            currency_main = project[0][0]
+
+            def rows():
+                for index, item in enumerate(items):
+                    try:
+                        yield normalize_item(item, project_id, currency_main=currency_main,
+                                             added_by_id=added_by_id, rate_lookup=self._rates.rate)
+                    except ValueError as e:
+                        if not skip_invalid:
+                            raise ValueError(f"Item {index}: {e}")
+                        errors.append((index, str(e)))
+
+            result = self.execute_named("items.last_id")
+            first_id = result[0][0] if result else 0
+            for chunk in chunked(rows(), chunk_size):
+                if skip_existing:
+                    # item_uuid is the first column of a row
+                    seen = {row[0] for row in self.execute_named(
+                        "items.existing_uuids", [json.dumps([row[0] for row in chunk])])}
+                    new_rows = []
+                    for row in chunk:
+                        if row[0] not in seen:
+                            seen.add(row[0])
+                            new_rows.append(row)
+                    existing += len(chunk) - len(new_rows)
+                    chunk = new_rows
+                    if not chunk:
+                        continue
+                self.execute_named_many("items.insert", chunk)
+                created += len(chunk)
+
+            # the write lock is held, so the rows got the next consecutive IDs
+            last_id = first_id + created
+            if return_ids:
+                item_ids = list(range(first_id + 1, last_id + 1))
+            if created:
+                self.execute_named("aggregates.add_item_range",
+                                   {"sign": 1, "first_id": first_id, "last_id": last_id})
+
+        summary = {
+            "created": created,
+            "skipped": len(errors),
+            "errors": errors,
+            "existing": existing,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        if return_ids:
+            summary["item_ids"] = item_ids
+        return summary
+
+    def op_item_page(self, project_id: int, since=None, until=None, labels=None,
+                     page_size: int = 500, cursor: Optional[str] = None, label_mode: str = "any") -> Dict:
+        """
+        Get one page of the items of a project, ordered by (bought_date, item_id).
+
+        Pages are addressed with a keyset cursor instead of LIMIT/OFFSET, so every
+        page is one index range scan, no matter how deep it is.
+
+        Args:
+            project_id: The ID of the project
+            since: Only items bought at or after this date (datetime, date or ISO string)
+            until: Only items bought before this date
+            labels: Only items tagged with these label IDs, see label_mode
+            page_size: Maximum number of items per page
+            cursor: Token returned as next_cursor by the previous page
+            label_mode: "any" for items with at least one of the labels (default),
+                "all" for items with every one of them
+
+        Returns:
+            Dictionary with the list of item dictionaries (items) and the cursor of
+            the next page (next_cursor), which is None after the last page
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        if label_mode not in ("any", "all"):
+            raise ValueError(f"label_mode must be 'any' or 'all', got {label_mode!r}")
+
+        # the keyset and date conditions work the same on the items and on the
+        # label association table, which carries bought_date as well
+        conditions = ["project_id = ?"]
+        params = [project_id]
+        if cursor is not None:
+            conditions.append("(bought_date, item_id) > (?, ?)")
+            params.extend(decode_cursor(cursor))
+        if since is not None:
+            conditions.append("bought_date >= ?")
+            params.append(format_bought_date(since))
+        if until is not None:
+            conditions.append("bought_date < ?")
+            params.append(format_bought_date(until))
+
+        if labels:
+            # walk the label index (label_id, project_id, bought_date, item_id) and
+            # only fetch the items of this page
+            label_ids = sorted({int(label) for label in labels})
+            having = f"HAVING COUNT(*) = {len(label_ids)}" if label_mode == "all" else ""
+            query = f"""
+                SELECT {', '.join(ITEM_SELECT_COLUMNS)}
+                FROM p{self._db_salt}_items
+                WHERE item_id IN (
+                    SELECT item_id FROM p{self._db_salt}_item_labels
+                    WHERE label_id IN ({', '.join('?' * len(label_ids))}) AND {' AND '.join(conditions)}
+                    GROUP BY bought_date, item_id {having}
+                    ORDER BY bought_date, item_id
+                    LIMIT ?
+                )
+                ORDER BY bought_date, item_id
+            """
+            params = label_ids + params
         else:
-            # Soft delete - mark as deleted (status = 0)
-            query = f"""UPDATE p{self._db_salt}_labels SET label_status = 0 WHERE label_id = ?"""
+            query = f"""
+                SELECT {', '.join(ITEM_SELECT_COLUMNS)}
+                FROM p{self._db_salt}_items
+                WHERE {' AND '.join(conditions)}
+                ORDER BY bought_date, item_id
+                LIMIT ?
+            """
+        params.append(page_size)
 
+        self.load()
         try:
-            self.execute_query(query, [label_id])
+            result = self.execute_query(query, params)
+        finally:
             self.close()
-            return True
-        except Exception as e:
+
+        items = [item_row_to_dict(row) for row in result]
+        next_cursor = None
+        if len(items) == page_size:
+            next_cursor = encode_cursor(items[-1]["bought_date"], items[-1]["item_id"])
+        return {"items": items, "next_cursor": next_cursor}
+
+    def op_item_iter(self, project_id: int, since=None, until=None, labels=None,
+                     page_size: int = 500, cursor: Optional[str] = None, label_mode: str = "any"):
+        """
+        Iterate over the items of a project, ordered by (bought_date, item_id).
+
+        This is a generator that fetches one page at a time with op_item_page(),
+        so memory stays flat however many items are consumed. No connection is
+        held between pages. To resume an interrupted iteration later, pass
+        functions.items.item_cursor(last_item) as cursor.
+
+        Args:
+            project_id: The ID of the project
+            since: Only items bought at or after this date
+            until: Only items bought before this date
+            labels: Only items tagged with these label IDs, see label_mode
+            page_size: Number of items fetched per query
+            cursor: Start right after the item this cursor token points to
+            label_mode: "any" or "all" of the labels, see op_item_page()
+
+        Yields:
+            Item dictionaries
+        """
+        while True:
+            page = self.op_item_page(project_id, since=since, until=until, labels=labels,
+                                     page_size=page_size, cursor=cursor, label_mode=label_mode)
+            yield from page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    def op_item_columns(self, project_id: int, since=None, until=None, after_item_id: int = 0,
+                        limit: int = ANALYTICS_PAGE_SIZE) -> Dict:
+        """
+        Get one page of the report columns of the items of a project in
+        item_id order, see functions/analytics.load_item_columns().
+
+        Args:
+            project_id: The ID of the project
+            since: Only items bought at or after this date
+            until: Only items bought before this date
+            after_item_id: Return the items after this item_id (the next_item_id of the previous page)
+            limit: Maximum number of items
+
+        Returns:
+            Dictionary with the rows ([item_id, price_final, bought_date as
+            seconds since the epoch, bought_by_id, bought_for_id]), the tags
+            of these items ([item_id, label_id]), next_item_id and more
+            (whether further items may follow)
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        params = {
+            "project_id": project_id,
+            "after_item_id": after_item_id,
+            "since": format_bought_date(since) if since is not None else "0000-01-01",
+            "until": format_bought_date(until) if until is not None else "9999-12-31",
+        }
+        # one read transaction, so the tags belong to the rows
+        with self.transaction(immediate=False):
+            rows = self.execute_named("analytics.item_columns", dict(params, limit=limit))
+            tags = self.execute_named("analytics.item_tags", dict(params, last_item_id=rows[-1][0])) if rows else []
+        return {"rows": rows, "tags": tags, "next_item_id": rows[-1][0] if rows else after_item_id,
+                "more": len(rows) == limit}
+
+    def op_item_get(self, item_id: int) -> Optional[Dict]:
+        """
+        Get one item.
+
+        Args:
+            item_id: The ID of the item
+
+        Returns:
+            Item dictionary, or None if the item does not exist
+        """
+        self.load()
+        try:
+            result = self.execute_named("items.get", [item_id])
+        finally:
             self.close()
-            raise Exception(f"Failed to delete label: {str(e)}")
+        return item_row_to_dict(result[0]) if result else None
+
+    @write_op
+    def op_item_update(self, item_id: int, item_dict: Dict) -> bool:
+        """
+        Update an existing item and move its share of the monthly rollups.
+
+        Args:
+            item_id: The ID of the item to update
+            item_dict: Dictionary with the fields to change, see
+                functions/items.py normalize_item(). exchange_rate is looked up
+                again when the currencies or bought_date change, and price_final is recomputed
+                when price or exchange_rate change, unless they are given.
+
+        Returns:
+            True if successful, raises exception otherwise
+        """
+        unknown = set(item_dict) - set(ITEM_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown item fields: {', '.join(sorted(unknown))}")
+        if not item_dict:
+            raise ValueError("No fields to update")
+
+        with self.transaction():
+            result = self.execute_named("items.get", [item_id])
+            if not result:
+                raise ValueError(f"Item with ID {item_id} not found")
+            item = item_row_to_dict(result[0])
+            project_id = item["project_id"]
+
+            if any(key in item_dict for key in ("currency", "currency_final", "bought_date")) \
+                    and "exchange_rate" not in item_dict:
+                item["exchange_rate"] = None
+                item["exchange_rate_date"] = None
+            if ("price" in item_dict or item["exchange_rate"] is None or "exchange_rate" in item_dict) \
+                    and "price_final" not in item_dict:
+                item["price_final"] = None
+            item.update(item_dict)
+            currency_main = self.execute_named("projects.currency_main", [project_id])[0][0]
+            row = normalize_item(item, project_id, currency_main=currency_main, rate_lookup=self._rates.rate)
+
+            self.execute_named("aggregates.add_item", {"sign": -1, "item_id": item_id})
+            self.execute_named("items.update", list(row) + [item_id])
+            self.execute_named("aggregates.add_item", {"sign": 1, "item_id": item_id})
+            self.execute_named("aggregates.prune", [project_id])
+        return True
+
+    @write_op
+    def op_item_delete(self, item_id: int) -> bool:
+        """
+        Delete an item and remove it from the monthly rollups.
+
+        Args:
+            item_id: The ID of the item to delete
+
+        Returns:
+            True if successful, raises exception otherwise
+        """
+        with self.transaction():
+            result = self.execute_named("items.get", [item_id])
+            if not result:
+                raise ValueError(f"Item with ID {item_id} not found")
+            project_id = item_row_to_dict(result[0])["project_id"]
+
+            self.execute_named("aggregates.add_item", {"sign": -1, "item_id": item_id})
+            self.execute_named("items.delete", [item_id])
+            self.execute_named("aggregates.prune", [project_id])
+        return True
+
+    @write_op
+    def op_rollup_rebuild(self, project_id: Optional[int] = None) -> int:
+        """
+        Recompute the monthly rollups from the items, e.g. after items were
+        written with plain SQL. Each project is rebuilt in its own transaction.
+
+        Args:
+            project_id: The project to rebuild (default: all projects)
+
+        Returns:
+            Number of rollup rows after the rebuild
+        """
+        if project_id is None:
+            self.load()
+            try:
+                project_ids = [row[0] for row in self.execute_named("projects.all_ids")]
+            finally:
+                self.close()
+        else:
+            project_ids = [project_id]
+
+        rows = 0
+        for pid in project_ids:
+            with self.transaction():
+                self.execute_named("aggregates.delete_project", [pid])
+                self.execute_named("aggregates.add_project", {"sign": 1, "project_id": pid})
+                rows += self.execute_named("aggregates.count_project", [pid])[0][0]
+        return rows
+
+    def op_rollup_get(self, project_id: int, dimension: str = "project", since=None, until=None) -> list:
+        """
+        Get the monthly rollups of a project, e.g. the monthly spending by label.
+
+        Args:
+            project_id: The ID of the project
+            dimension: "project", "label", "bought_by" or "bought_for"
+            since: First month to include (any date within it)
+            until: Last month to include (any date within it)
+
+        Returns:
+            List of dictionaries with the keys begin ('YYYY-MM-01'), key (label
+            or user ID, None for the project), count and sum, ordered by month
+        """
+        if dimension not in ROLLUP_TYPES:
+            raise ValueError(f"Unknown rollup dimension '{dimension}', known: {', '.join(ROLLUP_TYPES)}")
+
+        begin = month_begin(since) if since is not None else "0000-01-01"
+        end = next_month_begin(until) if until is not None else "9999-12-31"
+
+        self.load()
+        try:
+            result = self.execute_named("aggregates.of_type", [project_id, ROLLUP_TYPES[dimension], begin, end])
+        finally:
+            self.close()
+        return [rollup_row_to_dict(row) for row in result]
+
+    @write_op
+    def op_unit_of_work(self, calls) -> list:
+        """
+        Run several operations in one transaction, each in its own savepoint,
+        so a failing call is rolled back without undoing the others. Unlike
+        transaction() and atransaction() this is a single operation, so it is
+        also a unit of work of the API backend: one POST, one commit on the
+        server.
+
+        Args:
+            calls: List of {"op": name, "args": [...], "kwargs": {...}}
+
+        Returns:
+            One entry per call: {"result": ...} or {"error": {"type": ..., "message": ...}}
+        """
+        calls = list(calls)
+        for index, call in enumerate(calls):
+            name = call.get("op", "")
+            if not name.startswith("op_") or name == "op_unit_of_work" or not callable(getattr(self, name, None)):
+                raise ValueError(f"Call {index}: unknown operation '{name}'")
+
+        results = []
+        with self.transaction():
+            for call in calls:
+                try:
+                    with self.transaction():
+                        result = getattr(self, call["op"])(*call.get("args", ()), **call.get("kwargs", {}))
+                except Exception as e:
+                    results.append({"error": {"type": type(e).__name__, "message": str(e)}})
+                else:
+                    results.append({"result": result})
+        return results
+
+    def op_sync_changes(self, project_id: int, since_seq: int = 0, limit: int = SYNC_PAGE_SIZE,
+                        unsynced: bool = False) -> Dict:
+        """
+        Get the logged item changes of a project in change_seq order, see
+        functions/sync.py.
+
+        Args:
+            project_id: The ID of the project
+            since_seq: Return the changes after this change_seq (the watermark)
+            limit: Maximum number of changes
+            unsynced: Only return the changes not yet marked synced
+
+        Returns:
+            Dictionary with the changes (seq, item_uuid, deleted, changed_at
+            and the item values, None for deletes), next_seq (the watermark
+            after this page) and more (whether further changes may follow)
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.load()
+        try:
+            result = self.execute_named("changes.unsynced" if unsynced else "changes.since",
+                                        [project_id, since_seq, limit])
+        finally:
+            self.close()
+        changes = [change_row_to_dict(row) for row in result]
+        return {"changes": changes, "next_seq": changes[-1]["seq"] if changes else since_seq,
+                "more": len(changes) == limit}
+
+    @write_op
+    def op_sync_apply(self, project_id: int, changes, synced: bool = False, watermark=None) -> Dict:
+        """
+        Apply item changes of the other side of a sync in one transaction. A
+        change only replaces the local state of its item if its
+        change_version() is higher; the change log keeps its changed_at.
+
+        Args:
+            project_id: The ID of the project
+            changes: List of change dictionaries as returned by op_sync_changes()
+            synced: Mark the applied changes as known to the other side
+            watermark: Optional [name, change_seq] stored with the changes, so
+                the pull position moves together with the applied data
+
+        Returns:
+            Dictionary with the number of changes applied and the conflicts:
+            the local changes that won over a given change, in the same format
+        """
+        applied = 0
+        conflicts = []
+        with self.transaction():
+            project = self.execute_named("projects.currency_main", [project_id])
+            if not project:
+                raise ValueError(f"Project with ID {project_id} not found")
+            currency_main = project[0][0]
+
+            for index, change in enumerate(changes):
+                if not change.get("item_uuid") or not change.get("changed_at"):
+                    raise ValueError(f"Change {index}: item_uuid and changed_at are required")
+                item_uuid = change["item_uuid"]
+                deleted = bool(change.get("deleted")) or not change.get("item")
+                change = dict(change, deleted=deleted)
+
+                result = self.execute_named("changes.of_uuid", [item_uuid])
+                item_id = result[0][-1] if result else None
+                if result:
+                    local = change_row_to_dict(result[0][:-1])
+                    if change_version(local) >= change_version(change):
+                        if change_version(local) > change_version(change):
+                            # the local change wins and has to reach the other side
+                            self.execute_named("changes.mark_unsynced", [item_uuid])
+                            conflicts.append(local)
+                        continue
+
+                if deleted:
+                    if item_id is not None:
+                        self.execute_named("aggregates.add_item", {"sign": -1, "item_id": item_id})
+                        self.execute_named("items.delete", [item_id])
+                    elif not result:
+                        # keep the delete in the log, so it is passed on
+                        self.execute_named("changes.insert_deleted", [item_uuid, project_id, change["changed_at"]])
+                else:
+                    try:
+                        row = normalize_item(dict(change["item"], item_uuid=item_uuid), project_id,
+                                             currency_main=currency_main)
+                    except ValueError as e:
+                        raise ValueError(f"Change {index}: {e}")
+                    if item_id is None:
+                        self.execute_named("items.insert", row)
+                        item_id = self.execute_named("items.last_id")[0][0]
+                    else:
+                        self.execute_named("aggregates.add_item", {"sign": -1, "item_id": item_id})
+                        self.execute_named("items.update", list(row) + [item_id])
+                    self.execute_named("aggregates.add_item", {"sign": 1, "item_id": item_id})
+                self.execute_named("changes.restamp", [change["changed_at"], 1 if synced else 0, item_uuid])
+                applied += 1
+
+            self.execute_named("aggregates.prune", [project_id])
+            if watermark is not None:
+                self.execute_named("sync_state.set", [watermark[0], int(watermark[1])])
+        return {"applied": applied, "conflicts": conflicts}
+
+    @write_op
+    def op_sync_mark_synced(self, seqs) -> int:
+        """
+        Mark logged changes as known to the other side of the sync. A change
+        logged again in the meantime has a new change_seq and stays unsynced.
+
+        Returns:
+            Number of changes marked
+        """
+        with self.transaction():
+            self.execute_named("changes.mark_synced", [json.dumps([int(seq) for seq in seqs])])
+            return self._cursor.rowcount
+
+    def op_sync_watermark(self, name: str) -> int:
+        """Get a sync watermark set by op_sync_apply(), 0 if it was never set."""
+        self.load()
+        try:
+            result = self.execute_named("sync_state.get", [name])
+        finally:
+            self.close()
+        return result[0][0] if result else 0
+
+    def op_sync_projects(self) -> list:
+        """Get the IDs of the projects with logged item changes."""
+        self.load()
+        try:
+            return [row[0] for row in self.execute_named("changes.projects")]
+        finally:
+            self.close()
+
+    @write_op
+    def op_rates_import(self, path: str, base: str = "EUR", source: str = "ECB") -> Dict:
+        """
+        Load exchange rates from an ECB reference rate file (eurofxref.csv,
+        eurofxref-hist.csv or their .zip downloads).
+
+        Args:
+            path: Path of the CSV or ZIP file
+            base: Currency the rates of the file are quoted against
+            source: Name stored with the rates
+
+        Returns:
+            Summary dictionary with the keys rates, currencies, first_date and last_date
+        """
+        return self._rates.load_ecb_csv(path, base=base, source=source)
+
+    def op_rate_get(self, from_currency: str, to_currency: str, on_date=None) -> Optional[float]:
+        """
+        Get the exchange rate from_currency -> to_currency as of a day, see
+        functions/rates.py. Repeated lookups are answered from an LRU cache.
+
+        Args:
+            from_currency: 3-letter code of the currency converted from
+            to_currency: 3-letter code of the currency converted to
+            on_date: datetime, date or ISO string (default: today)
+
+        Returns:
+            The rate, or None if no rate is known up to that day
+        """
+        return self._rates.rate(from_currency, to_currency, on_date)
+
+    def op_rates_convert(self, amounts, currencies, dates, to_currency: str):
+        """
+        Convert arrays of amounts into one currency, each at the rate of its day,
+        in one vectorized call (needs NumPy).
+
+        Args:
+            amounts: Sequence or array of amounts
+            currencies: Currency code of each amount
+            dates: Date of each amount
+            to_currency: Currency to convert into
+
+        Returns:
+            NumPy float array of the converted amounts, NaN where no rate is known
+        """
+        return self._rates.convert(amounts, currencies, dates, to_currency)
+
+    def op_search(self, project_id: int, text: str, kinds=SEARCH_KINDS, since=None, until=None,
+                  page_size: int = 50, cursor: Optional[str] = None) -> Dict:
+        """
+        Full-text search over the item names and notes and the label names and
+        descriptions of a project, best matches first.
+
+        Matches are ranked with bm25, a match in the name weighing twice as much
+        as one in the note or description; pages are addressed with a keyset
+        cursor over (rank, kind, id). See functions/search.py for the search syntax
+        (words, "phrases" and prefix* terms).
+
+        Args:
+            project_id: The ID of the project
+            text: The search text
+            kinds: Kinds of results, any of "item" and "label" (default: both)
+            since: Only items bought at or after this date (labels are not restricted)
+            until: Only items bought before this date
+            page_size: Maximum number of results per page
+            cursor: Token returned as next_cursor by the previous page
+
+        Returns:
+            Dictionary with the list of results (results), each a dictionary with
+            the keys kind, id, name, text (note or description), bought_date (None
+            for labels) and rank, and the cursor of the next page (next_cursor),
+            which is None after the last page
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        kinds = [kinds] if isinstance(kinds, str) else list(kinds)
+        unknown = set(kinds) - set(SEARCH_KINDS)
+        if not kinds or unknown:
+            raise ValueError(f"kinds must be a selection of {', '.join(SEARCH_KINDS)}, got {kinds!r}")
+        match = build_match_query(text)
+
+        p = f"p{self._db_salt}"
+        selects = []
+        params = []
+        # CROSS JOIN keeps the full-text index as the outer loop; otherwise the
+        # planner may walk the project index and run the match once per row
+        if "item" in kinds:
+            conditions = [f"{p}_items_fts MATCH ?", "i.project_id = ?"]
+            params.extend([match, project_id])
+            if since is not None:
+                conditions.append("i.bought_date >= ?")
+                params.append(format_bought_date(since))
+            if until is not None:
+                conditions.append("i.bought_date < ?")
+                params.append(format_bought_date(until))
+            selects.append(f"""
+                SELECT 'item' AS kind, i.item_id AS id, i.name, i.note AS text, i.bought_date,
+                       bm25({p}_items_fts, 2.0, 1.0) AS rank
+                FROM {p}_items_fts AS f CROSS JOIN {p}_items AS i ON i.item_id = f.rowid
+                WHERE {' AND '.join(conditions)}""")
+        if "label" in kinds:
+            # deleted labels (label_status 0) are not found
+            selects.append(f"""
+                SELECT 'label' AS kind, l.label_id AS id, l.name, l.description AS text, NULL,
+                       bm25({p}_labels_fts, 2.0, 1.0) AS rank
+                FROM {p}_labels_fts AS f CROSS JOIN {p}_labels AS l ON l.label_id = f.rowid
+                WHERE {p}_labels_fts MATCH ? AND l.project_id = ? AND l.label_status != 0""")
+            params.extend([match, project_id])
+
+        after = ""
+        if cursor is not None:
+            after = "WHERE (rank, kind, id) > (?, ?, ?)"
+            params.extend(decode_search_cursor(cursor))
+        query = f"""
+            SELECT kind, id, name, text, bought_date, rank
+            FROM ({' UNION ALL '.join(selects)})
+            {after}
+            ORDER BY rank, kind, id
+            LIMIT ?
+        """
+        params.append(page_size)
+
+        self.load()
+        try:
+            result = self.execute_query(query, params)
+        finally:
+            self.close()
+
+        results = [{"kind": row[0], "id": row[1], "name": row[2], "text": row[3],
+                    "bought_date": row[4], "rank": row[5]} for row in result]
+        next_cursor = None
+        if len(results) == page_size:
+            last = results[-1]
+            next_cursor = encode_search_cursor(last["rank"], last["kind"], last["id"])
+        return {"results": results, "next_cursor": next_cursor}
 
     def op_get_current_user(self):
         """
@@ -911,4 +2064,42 @@ class SQLLiteHandler:
         }]
 
 
-        return {"users": u, "projects": p}
\ No newline at end of file
+        return {"users": u, "projects": p}
+
+
+class AsyncTransaction:
+    """
+    Handle yielded by SQLLiteHandler.atransaction(). Every op_ method of the
+    handler is available as a coroutine that runs on the transaction's thread.
+    """
+
+    def __init__(self, handler: SQLLiteHandler, executor: ThreadPoolExecutor):
+        self._handler = handler
+        self._executor = executor
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    @asynccontextmanager
+    async def savepoint(self, immediate: bool = True):
+        """Open a nested scope (a savepoint) inside the running transaction."""
+        scope = self._handler.transaction(immediate=immediate)
+        await self._run(scope.__enter__)
+        try:
+            yield self
+        except BaseException as e:
+            await self._run(scope.__exit__, type(e), e, e.__traceback__)
+            raise
+        else:
+            await self._run(scope.__exit__, None, None, None)
+
+    def __getattr__(self, name):
+        attr = getattr(self._handler, name)
+        if not name.startswith("op_") or not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self._run(attr, *args, **kwargs)
+
+        return call
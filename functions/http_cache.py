@@ -0,0 +1,193 @@
+"""
+On-disk cache of the read responses of the API backend.
+
+Project lists, label sets and exchange rates rarely change, so HandlerApi
+(functions/handler_api.py) keeps the responses of its reads in a SQLite
+file in the data directory:
+
+- A response is reused without a request while it is fresh, i.e. younger
+  than the max-age of its Cache-Control header.
+- An expired response with an ETag or Last-Modified validator is
+  revalidated with If-None-Match / If-Modified-Since. An unchanged
+  resource then costs a 304 without a body.
+- Within the stale-while-revalidate window, an expired response is served
+  at once and revalidated in the background.
+- The cache holds at most max_bytes of bodies. The least recently used
+  responses are evicted first.
+"""
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    max_age REAL NOT NULL DEFAULT 0,
+    stale_while_revalidate REAL NOT NULL DEFAULT 0,
+    must_revalidate INTEGER NOT NULL DEFAULT 0,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS http_cache_accessed ON http_cache (accessed_at);
+"""
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+    max_age: float
+    stale_while_revalidate: float
+    must_revalidate: bool
+
+    def age(self, now: float) -> float:
+        return now - self.stored_at
+
+    def is_fresh(self, now: float) -> bool:
+        """Usable without asking the server."""
+        return not self.must_revalidate and self.age(now) < self.max_age
+
+    def is_usable_stale(self, now: float) -> bool:
+        """Expired, but may be served while it is revalidated in the background."""
+        return not self.must_revalidate and self.age(now) < self.max_age + self.stale_while_revalidate
+
+    def validators(self) -> Dict[str, str]:
+        """Headers of a conditional request for this response."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def parse_cache_control(header: Optional[str]) -> Dict[str, Any]:
+    """Parse a Cache-Control header into a dictionary, e.g. {"max-age": 60.0, "no-store": True}."""
+    directives = {}
+    for part in (header or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if not name:
+            continue
+        value = value.strip().strip('"')
+        try:
+            directives[name.lower()] = float(value) if value else True
+        except ValueError:
+            directives[name.lower()] = value
+    return directives
+
+
+class HttpCache:
+    """
+    Response cache in a SQLite file, safe to share between threads.
+
+    Args:
+        path: File of the cache, e.g. http_cache.sqlite in the data directory
+        max_bytes: Maximum total size of the cached bodies
+        clock: Time source in seconds (time.time by default; the entries outlive the process)
+    """
+
+    def __init__(self, path: str, max_bytes: int = 32 * 1024 * 1024, clock: Callable[[], float] = time.time):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1")
+        self.path = path
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+        self.hits = self.misses = self.stores = self.revalidations = self.evictions = 0
+
+    def now(self) -> float:
+        return self._clock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return the cached response of key and mark it as recently used."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, stored_at, max_age, stale_while_revalidate, must_revalidate "
+                "FROM http_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute("UPDATE http_cache SET accessed_at = ? WHERE key = ?", (self.now(), key))
+        return CachedResponse(row[0], row[1], row[2], row[3], row[4], row[5], bool(row[6]))
+
+    def put(self, key: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None,
+            max_age: float = 0.0, stale_while_revalidate: float = 0.0) -> bool:
+        """
+        Store a response. Responses that can neither be reused nor revalidated,
+        and bodies larger than the whole cache, are not stored.
+
+        Returns:
+            True if the response was stored
+        """
+        if len(body) > self.max_bytes or not (etag or last_modified or max_age > 0):
+            return False
+        now = self.now()
+        with self._lock:
+            old = self._connection.execute("SELECT size FROM http_cache WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO http_cache (key, body, etag, last_modified, stored_at, max_age, "
+                "stale_while_revalidate, must_revalidate, accessed_at, size) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (key, body, etag, last_modified, now, max_age, stale_while_revalidate, now, len(body)))
+            self._bytes += len(body) - (old[0] if old else 0)
+            self.stores += 1
+            self._evict()
+        return True
+
+    def refresh(self, key: str, max_age: float = 0.0, stale_while_revalidate: float = 0.0) -> None:
+        """The server confirmed the cached response (304): it is fresh again."""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE http_cache SET stored_at = ?, max_age = ?, stale_while_revalidate = ?, must_revalidate = 0 "
+                "WHERE key = ?", (self.now(), max_age, stale_while_revalidate, key))
+            self.revalidations += 1
+
+    def expire_all(self) -> None:
+        """
+        Require a revalidation of every response, e.g. after a write that may
+        have changed them. Stale responses are not served in the meantime.
+        """
+        with self._lock:
+            self._connection.execute("UPDATE http_cache SET must_revalidate = 1")
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes:
+            rows = self._connection.execute(
+                "SELECT key, size FROM http_cache ORDER BY accessed_at LIMIT 16").fetchall()
+            if not rows:
+                self._bytes = 0
+                return
+            for key, size in rows:
+                self._connection.execute("DELETE FROM http_cache WHERE key = ?", (key,))
+                self._bytes -= size
+                self.evictions += 1
+                if self._bytes <= self.max_bytes:
+                    return
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM http_cache")
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of entries, their bytes and the hit, miss, store, revalidation and eviction counts."""
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM http_cache").fetchone()[0]
+            return {"entries": entries, "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "stores": self.stores,
+                    "revalidations": self.revalidations, "evictions": self.evictions}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
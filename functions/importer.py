@@ -0,0 +1,209 @@
+"""
+Streaming CSV import of items into pstand_items.
+
+The file is read row by row, so memory use does not depend on the file size.
+Rows are mapped to item fields, validated by functions/items.py and stored
+through SQLLiteHandler.op_item_create_many() in transactions of commit_every
+rows each.
+"""
+import contextlib
+import csv
+import io
+import os
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from functions.items import ITEM_FIELDS
+
+class _CountingReader(io.RawIOBase):
+    """Binary file wrapper that counts the bytes read, for progress reporting."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._raw.readinto(buffer)
+        self.bytes_read += n or 0
+        return n
+
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
+
+
+def parse_mapping(text: str) -> Dict[str, str]:
+    """
+    Parse a column mapping written as "field=Column, field=Column".
+
+    Args:
+        text: e.g. "name=Description, price=Amount, bought_date=Date"
+
+    Returns:
+        Dictionary of item field to CSV column name
+    """
+    mapping = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        if "=" not in part:
+            raise ValueError(f"Invalid mapping entry '{part.strip()}', expected field=Column")
+        field, column = (value.strip() for value in part.split("=", 1))
+        if field not in ITEM_FIELDS:
+            raise ValueError(f"Unknown item field '{field}', known fields: {', '.join(ITEM_FIELDS)}")
+        mapping[field] = column
+    return mapping
+
+
+def resolve_columns(header: List[str], mapping: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+    """
+    Find the CSV column of every item field.
+
+    Fields without an explicit mapping are matched to a column of the same
+    name, ignoring case.
+
+    Returns:
+        Dictionary of item field to column index
+    """
+    mapping = mapping or {}
+    lookup = {name.strip().lower(): index for index, name in enumerate(header)}
+
+    columns = {}
+    for field, column in mapping.items():
+        if column.strip().lower() not in lookup:
+            raise ValueError(f"Column '{column}' mapped to '{field}' is not in the file header")
+        columns[field] = lookup[column.strip().lower()]
+    for field in ITEM_FIELDS:
+        if field not in columns and field in lookup:
+            columns[field] = lookup[field]
+    return columns
+
+
+def read_csv_items(handle, mapping: Optional[Dict[str, str]] = None,
+                   defaults: Optional[Dict[str, Any]] = None,
+                   delimiter: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Read item dictionaries from an open text file, one row at a time.
+
+    Args:
+        handle: Text file object positioned at the header row
+        mapping: Item field to CSV column name, see resolve_columns()
+        defaults: Values for fields the file does not provide, e.g. bought_by_id
+        delimiter: Column delimiter; detected from the header when None
+
+    Yields:
+        Tuples of the line of the file the row starts on (the header is
+        line 1) and its item dictionary; empty cells fall back to defaults.
+        Blank rows are skipped, and a quoted cell may span several lines, so
+        the line is not the count of the rows before.
+    """
+    defaults = defaults or {}
+    if delimiter is None:
+        header_line = handle.readline()
+        try:
+            delimiter = csv.Sniffer().sniff(header_line, delimiters=",;\t|").delimiter
+        except csv.Error:
+            delimiter = ","
+        header = next(csv.reader([header_line], delimiter=delimiter), [])
+    else:
+        header = None
+
+    reader = csv.reader(handle, delimiter=delimiter)
+    # reader.line_num counts the lines the reader consumed, not the header read above
+    offset = 1 if header is not None else 0
+    if header is None:
+        header = next(reader, [])
+    columns = list(resolve_columns(header, mapping).items())
+
+    last_line = reader.line_num + offset
+    for row in reader:
+        line, last_line = last_line + 1, reader.line_num + offset
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        item = dict(defaults)
+        for field, index in columns:
+            if index < len(row) and row[index].strip():
+                item[field] = row[index].strip()
+        if isinstance(item.get("tags"), str):
+            # tags in a CSV cell are label IDs separated by spaces or semicolons
+            item["tags"] = [tag for tag in item["tags"].replace(";", " ").split() if tag]
+        yield line, item
+
+
+def import_csv(dbh, path: str, project_id: int, mapping: Optional[Dict[str, str]] = None,
+               defaults: Optional[Dict[str, Any]] = None, delimiter: Optional[str] = None,
+               encoding: str = "utf-8-sig", commit_every: int = 50000, chunk_size: int = 5000,
+               progress_every: int = 5000, skip_invalid: bool = True,
+               progress: Optional[Callable[[int, int, int], None]] = None,
+               should_stop: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Import the items of a CSV file into a project.
+
+    Args:
+        dbh: The SQLLiteHandler to store the items with
+        path: Path of the CSV file
+        project_id: The ID of the project
+        mapping: Item field to CSV column name
+        defaults: Values for fields the file does not provide, e.g. bought_by_id
+        delimiter: Column delimiter; detected when None
+        encoding: Text encoding of the file
+        commit_every: Rows per transaction. Smaller values keep the write-ahead
+            log small, larger ones save commits.
+        chunk_size: Rows per executemany() call
+        progress_every: Rows between two progress reports. Within a
+            transaction the rows are stored in steps of this size.
+        skip_invalid: Skip and report invalid rows instead of stopping the import
+        progress: Optional callable(bytes_read, bytes_total, rows_imported) called
+            every progress_every rows; the rows of the running transaction
+            are committed when it ends
+        should_stop: Optional callable returning True to stop after the current
+            transaction, e.g. when the import worker is cancelled
+
+    Returns:
+        Summary dictionary with keys created, skipped, errors (list of
+        (line, message), the line of the file the row starts on, with the
+        header as line 1), stopped and seconds
+    """
+    if commit_every < 1 or progress_every < 1:
+        raise ValueError("commit_every and progress_every must be at least 1")
+    total_bytes = os.path.getsize(path)
+    summary = {"created": 0, "skipped": 0, "errors": [], "stopped": False, "seconds": 0.0}
+
+    with open(path, "rb") as raw:
+        counter = _CountingReader(raw)
+        with io.TextIOWrapper(io.BufferedReader(counter), encoding=encoding, newline="") as handle:
+            rows = read_csv_items(handle, mapping=mapping, defaults=defaults, delimiter=delimiter)
+            step = min(progress_every, commit_every)
+            while True:
+                done = 0
+                with dbh.transaction() if hasattr(dbh, "transaction") else contextlib.nullcontext():
+                    while done < commit_every:
+                        batch = list(islice(rows, min(step, commit_every - done)))
+                        if not batch:
+                            break
+                        lines = [line for line, _ in batch]
+                        batch = [item for _, item in batch]
+                        result = dbh.op_item_create_many(project_id, batch, chunk_size=chunk_size,
+                                                          skip_invalid=skip_invalid, return_ids=False)
+                        summary["created"] += result["created"]
+                        summary["skipped"] += result["skipped"]
+                        summary["seconds"] += result["seconds"]
+                        # keep the report bounded for files full of broken rows
+                        room = 1000 - len(summary["errors"])
+                        summary["errors"].extend((lines[index], message)
+                                                 for index, message in result["errors"][:max(room, 0)])
+                        done += len(batch)
+
+                        if progress is not None:
+                            progress(counter.bytes_read, total_bytes, summary["created"])
+                if done < commit_every:
+                    break
+                if should_stop is not None and should_stop():
+                    summary["stopped"] = True
+                    break
+
+    summary["seconds"] = round(summary["seconds"], 3)
+    return summary
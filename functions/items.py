@@ -0,0 +1,231 @@
+"""
+Validation and normalization of pstand_items rows.
+
+Items can be given as dictionaries or as tuples. Tuples follow the order of
+ITEM_FIELDS and may be shorter than it; missing trailing fields get defaults.
+"""
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+# field order for items given as tuples
+ITEM_FIELDS = (
+    "name", "price", "currency", "bought_date", "bought_by_id", "bought_for_id",
+    "note", "tags", "price_final", "currency_final", "exchange_rate",
+    "exchange_rate_date", "item_uuid", "added_by_id",
+)
+
+# column order of the insert statement "items.insert"
+ITEM_COLUMNS = (
+    "item_uuid", "name", "note", "price", "price_final", "currency", "currency_final",
+    "bought_date", "bought_by_id", "bought_for_id", "added_by_id", "project_id",
+    "exchange_rate", "exchange_rate_date", "tags",
+)
+
+
+def parse_date(value: Any, field: str) -> datetime:
+    """Parse a datetime, date or ISO 8601 string."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str) and value.strip():
+        try:
+            return datetime.fromisoformat(value.strip())
+        except ValueError:
+            pass
+    raise ValueError(f"Field '{field}' must be an ISO date (YYYY-MM-DD[THH:MM:SS]), got {value!r}")
+
+
+def format_bought_date(value: Any) -> str:
+    """
+    Normalize a bought_date to 'YYYY-MM-DDTHH:MM:SS'. All item dates are stored
+    in this one format so they sort and compare correctly as text.
+    """
+    return parse_date(value, "bought_date").replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+def parse_amount(value: Any, field: str) -> float:
+    if isinstance(value, bool) or value is None or value == "":
+        raise ValueError(f"Field '{field}' must be a number, got {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(Decimal(str(value).strip()))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Field '{field}' must be a number, got {value!r}")
+
+
+def parse_id(value: Any, field: str) -> int:
+    if isinstance(value, bool):
+        raise ValueError(f"Field '{field}' must be an integer ID, got {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Field '{field}' must be an integer ID, got {value!r}")
+
+
+def parse_currency(value: Any, field: str) -> str:
+    if not isinstance(value, str) or len(value.strip()) != 3 or not value.strip().isalpha():
+        raise ValueError(f"Field '{field}' must be a 3-letter currency code, got {value!r}")
+    return value.strip().upper()
+
+
+def as_item_dict(item: Any) -> Dict[str, Any]:
+    """Turn an item given as dictionary or tuple into a dictionary."""
+    if isinstance(item, dict):
+        return item
+    if isinstance(item, (tuple, list)):
+        if len(item) > len(ITEM_FIELDS):
+            raise ValueError(f"Item tuple has {len(item)} fields, at most {len(ITEM_FIELDS)} are known")
+        return dict(zip(ITEM_FIELDS, item))
+    raise ValueError(f"Item must be a dict or a tuple, got {type(item).__name__}")
+
+
+def normalize_item(item: Any, project_id: int, currency_main: Optional[str] = None,
+                   added_by_id: Optional[int] = None,
+                   rate_lookup: Optional[Callable[[str, str, str], Optional[float]]] = None) -> Tuple:
+    """
+    Validate one item and return its values in ITEM_COLUMNS order.
+
+    Args:
+        item: Dictionary or tuple with the item fields:
+            - name (required): Item name (at most 64 characters)
+            - price (required): Price in the item's currency
+            - currency (required unless the project has a main currency): 3-letter code
+            - bought_date (required): datetime, date or ISO string
+            - bought_by_id (required): User who paid
+            - bought_for_id (optional): User the item was bought for (default: bought_by_id)
+            - note (optional): Free text (at most 255 characters)
+            - tags (optional): List of label IDs
+            - price_final (optional): Price in currency_final (default: price * exchange_rate)
+            - currency_final (optional): Project currency (default: project main currency)
+            - exchange_rate (optional): Rate currency -> currency_final (default:
+              rate_lookup's rate on the bought_date, else 1.0)
+            - exchange_rate_date (optional): Date of the rate (default: bought_date)
+            - item_uuid (optional): Generated when missing
+            - added_by_id (optional): User entering the item (default: added_by_id argument or bought_by_id)
+        project_id: The project the item belongs to
+        currency_main: Main currency of the project, used as default currency
+        added_by_id: Default for the user entering the items
+        rate_lookup: Optional callable(currency, currency_final, bought_date)
+            returning the exchange rate, e.g. RateStore.rate of functions/rates.py
+
+    Returns:
+        Tuple of column values in ITEM_COLUMNS order
+    """
+    item = as_item_dict(item)
+
+    name = item.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Required field 'name' is missing or empty")
+    name = name.strip()
+    if len(name) > 64:
+        raise ValueError(f"Field 'name' is longer than 64 characters: {name[:20]!r}...")
+
+    note = item.get("note") or ""
+    if len(note) > 255:
+        raise ValueError("Field 'note' is longer than 255 characters")
+
+    price = parse_amount(item.get("price"), "price")
+
+    currency = item.get("currency") or currency_main
+    if currency is None:
+        raise ValueError("Required field 'currency' is missing and the project has no main currency")
+    currency = parse_currency(currency, "currency")
+    currency_final = parse_currency(item.get("currency_final") or currency_main or currency, "currency_final")
+
+    if item.get("bought_date") in (None, ""):
+        raise ValueError("Required field 'bought_date' is missing")
+    bought_date = format_bought_date(item["bought_date"])
+
+    exchange_rate = item.get("exchange_rate")
+    if exchange_rate in (None, ""):
+        exchange_rate = None
+        if currency != currency_final and rate_lookup is not None:
+            exchange_rate = rate_lookup(currency, currency_final, bought_date)
+        exchange_rate = 1.0 if exchange_rate is None else exchange_rate
+    else:
+        exchange_rate = parse_amount(exchange_rate, "exchange_rate")
+    if currency == currency_final and exchange_rate != 1.0:
+        raise ValueError("Field 'exchange_rate' must be 1.0 when currency and currency_final are equal")
+
+    price_final = item.get("price_final")
+    if price_final in (None, ""):
+        price_final = round(price * exchange_rate, 2)
+    else:
+        price_final = parse_amount(price_final, "price_final")
+    exchange_rate_date = item.get("exchange_rate_date")
+    exchange_rate_date = (parse_date(exchange_rate_date, "exchange_rate_date") if exchange_rate_date
+                          else parse_date(bought_date, "bought_date")).date().isoformat()
+
+    if item.get("bought_by_id") in (None, ""):
+        raise ValueError("Required field 'bought_by_id' is missing")
+    bought_by_id = parse_id(item["bought_by_id"], "bought_by_id")
+    bought_for_id = parse_id(item.get("bought_for_id") or bought_by_id, "bought_for_id")
+    added_by = parse_id(item.get("added_by_id") or added_by_id or bought_by_id, "added_by_id")
+
+    tags = item.get("tags") or []
+    if isinstance(tags, str):
+        tags = json.loads(tags)
+    if not isinstance(tags, (list, tuple)):
+        raise ValueError(f"Field 'tags' must be a list of label IDs, got {tags!r}")
+    tags = [parse_id(tag, "tags") for tag in tags]
+
+    item_uuid = item.get("item_uuid") or str(uuid.uuid4())
+
+    return (
+        item_uuid, name, note, price, price_final, currency, currency_final,
+        bought_date, bought_by_id, bought_for_id, added_by, project_id,
+        exchange_rate, exchange_rate_date, json.dumps(tags) if tags else "[]",
+    )
+
+
+def chunked(iterable, size: int):
+    """Yield lists of at most size elements without materializing the iterable."""
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+
+# columns returned by item reads, in the order of item_row_to_dict()
+ITEM_SELECT_COLUMNS = ("item_id",) + ITEM_COLUMNS + ("created_at",)
+
+
+def item_row_to_dict(row: Sequence) -> Dict[str, Any]:
+    """Convert a row selected with ITEM_SELECT_COLUMNS into an item dictionary."""
+    item = dict(zip(ITEM_SELECT_COLUMNS, row))
+    try:
+        item["tags"] = json.loads(item["tags"]) if item["tags"] else []
+    except (TypeError, ValueError):
+        item["tags"] = []
+    return item
+
+
+def encode_cursor(bought_date: str, item_id: int) -> str:
+    """Encode the keyset position after an item as an opaque cursor token."""
+    raw = json.dumps([bought_date, item_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def item_cursor(item: Dict[str, Any]) -> str:
+    """Return the cursor token that continues an iteration right after item."""
+    return encode_cursor(item["bought_date"], item["item_id"])
+
+
+def decode_cursor(token: str) -> Tuple[str, int]:
+    """Decode a cursor token into its (bought_date, item_id) keyset position."""
+    try:
+        bought_date, item_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return str(bought_date), int(item_id)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError(f"Invalid cursor token: {token!r}")
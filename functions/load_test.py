@@ -0,0 +1,246 @@
+"""
+Load generator for the API mode.
+
+run_load() drives a FiWa API server with concurrent simulated clients. Each
+client runs a weighted mix of the app's reads and writes (OP_MIX) through
+HandlerApi.acall(). It reports throughput and the p50/p95/p99 latency,
+overall and per operation, together with the client's cache statistics.
+By default all clients share one HandlerApi, like the screens of one app
+do, so its connection pool, read coalescing and cache are measured under
+load. With shared=False every client has its own HandlerApi.
+
+Without --url the stand-in server of functions/api_server.py is started on
+a temporary database seeded with seed(), so no network access is needed:
+
+    python -m functions.load_test --clients 50 --duration 10
+    python -m functions.load_test --clients 50 --no-coalesce --cache
+    python -m functions.load_test --url http://127.0.0.1:8082 --project 1 --user 1
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+# relative weights of the operations of a simulated client
+OP_MIX = {
+    "op_label_get_all": 30,
+    "op_item_page": 30,
+    "op_rollup_get": 15,
+    "op_search": 10,
+    "op_item_create_many": 10,
+    "op_item_update": 5,
+}
+
+_WORDS = ("bread", "milk", "coffee", "rent", "train", "cinema", "books", "pharmacy", "garden", "repair")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """The q-th percentile (0-100) of values by the nearest-rank method, 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(min(rank, len(ordered))) - 1]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    """Count, mean, p50, p95, p99 and max of latencies in milliseconds."""
+    return {"count": len(values), "mean": sum(values) / len(values) if values else 0.0,
+            "p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+            "max": max(values) if values else 0.0}
+
+
+def seed(dbh, items: int = 1000, labels: int = 20, seed: int = 1) -> Dict[str, Any]:
+    """
+    Create a load test user and project with labels and items in a database.
+
+    Returns:
+        Dictionary with user_id, project_id and label_ids
+    """
+    rng = random.Random(seed)
+    user_id = dbh.op_user_create({"first_name": "Load", "last_name": "Test", "username": f"load{seed}",
+                                  "email": f"load{seed}@fiwa.com", "password": "load", "max_projects": 10})
+    project_id = dbh.op_project_create({"name": f"Load test {seed}", "currency_main": "EUR"}, user_id)
+    label_ids = [dbh.op_label_create({"name": f"{word.title()} {i}"}, project_id)
+                 for i, word in zip(range(labels), _WORDS * (labels // len(_WORDS) + 1))]
+    dbh.op_item_create_many(project_id, (
+        {"name": f"{rng.choice(_WORDS).title()} {i}", "price": round(rng.uniform(1, 200), 2),
+         "bought_date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "bought_by_id": user_id,
+         "note": " ".join(rng.sample(_WORDS, 3)), "tags": rng.sample(label_ids, min(2, len(label_ids)))}
+        for i in range(items)), return_ids=False)
+    return {"user_id": user_id, "project_id": project_id, "label_ids": label_ids}
+
+
+def _call(rng: random.Random, name: str, project_id: int, user_id: int, item_ids: List[int]):
+    """Arguments of one call of the operation name."""
+    if name == "op_label_get_all":
+        return (project_id,), {}
+    if name == "op_item_page":
+        return (project_id,), {"since": f"2025-{rng.randint(1, 12):02d}-01", "page_size": 50}
+    if name == "op_rollup_get":
+        return (project_id,), {"dimension": rng.choice(("project", "label"))}
+    if name == "op_search":
+        return (project_id, rng.choice(_WORDS)), {}
+    if name == "op_item_create_many":
+        item = {"name": f"{rng.choice(_WORDS).title()} load", "price": round(rng.uniform(1, 50), 2),
+                "bought_date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", "bought_by_id": user_id}
+        return (project_id, [item]), {"return_ids": False}
+    if name == "op_item_update":
+        return (rng.choice(item_ids), {"price": round(rng.uniform(1, 50), 2)}), {}
+    raise ValueError(f"Operation '{name}' is not part of the load test")
+
+
+async def run_load(base_url: str, project_id: int, user_id: int, clients: int = 20, duration: float = 10.0,
+                   mix: Optional[Dict[str, int]] = None, shared: bool = True, think_time: float = 0.0,
+                   seed: int = 1, **api_options) -> Dict[str, Any]:
+    """
+    Run simulated clients against a server for duration seconds.
+
+    Args:
+        base_url: URL of the API server
+        project_id: Project the clients work on
+        user_id: User entering the items
+        clients: Number of concurrent clients
+        duration: Seconds to run
+        mix: Relative weights of the operations (default: OP_MIX)
+        shared: All clients use one HandlerApi (default) instead of one each
+        think_time: Seconds a client waits between two calls
+        seed: Seed of the random choices
+        api_options: Further HandlerApi arguments, e.g. coalesce, cache, bearer_token
+
+    Returns:
+        Dictionary with clients, seconds, requests, errors (per exception
+        type), throughput (calls per second), latency (ms, see
+        latency_summary()), ops (latency per operation) and cache (the
+        HttpCache statistics, if any)
+    """
+    from functions.handler_api import HandlerApi
+
+    mix = mix or OP_MIX
+    names, weights = list(mix), list(mix.values())
+    apis = [HandlerApi(base_url=base_url, **api_options)] if shared else \
+        [HandlerApi(base_url=base_url, **api_options) for _ in range(clients)]
+    page = await apis[0].acall("op_item_page", project_id, page_size=500)
+    item_ids = [item["item_id"] for item in page["items"]]
+    if not item_ids:
+        weights = [0 if name == "op_item_update" else w for name, w in zip(names, weights)]
+
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {}
+
+    async def client(index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        api = apis[0] if shared else apis[index]
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            args, kwargs = _call(rng, name, project_id, user_id, item_ids)
+            start = time.perf_counter()
+            try:
+                await api.acall(name, *args, **kwargs)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            else:
+                latencies[name].append((time.perf_counter() - start) * 1000.0)
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    started = time.perf_counter()
+    deadline = started + duration
+    try:
+        await asyncio.gather(*[client(i) for i in range(clients)])
+    finally:
+        seconds = time.perf_counter() - started
+        for api in apis:
+            await api.aclose()
+            api.shutdown()
+
+    every = [value for values in latencies.values() for value in values]
+    cache = apis[0].cache
+    return {
+        "clients": clients,
+        "seconds": seconds,
+        "requests": len(every),
+        "errors": errors,
+        "throughput": len(every) / seconds if seconds else 0.0,
+        "latency": latency_summary(every),
+        "ops": {name: latency_summary(values) for name, values in latencies.items() if values},
+        "cache": cache.stats() if cache is not None else None,
+    }
+
+
+def format_report(report: Dict[str, Any], server_stats: Optional[Dict[str, Any]] = None) -> str:
+    """Render a run_load() report (and the stand-in server's stats) as a text table."""
+    latency = report["latency"]
+    lines = [
+        f"{report['clients']} clients, {report['seconds']:.1f}s: {report['requests']} calls, "
+        f"{report['throughput']:.1f} calls/s, {sum(report['errors'].values())} errors {report['errors'] or ''}",
+        f"{'operation':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    rows = sorted(report["ops"].items()) + [("all", latency)]
+    for name, summary in rows:
+        lines.append(f"{name:<22}{summary['count']:>8}{summary['p50']:>10.2f}{summary['p95']:>10.2f}"
+                     f"{summary['p99']:>10.2f}{summary['max']:>10.2f}")
+    if report.get("cache"):
+        lines.append(f"client cache: {report['cache']}")
+    if server_stats:
+        lines.append(f"server: {server_stats}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    """Command line entry point, see the module docstring."""
+    import os
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Load test of the FiWa API mode")
+    parser.add_argument("--url", default=None, help="server to test (default: a local stand-in server)")
+    parser.add_argument("--project", type=int, default=None, help="project ID on the server given by --url")
+    parser.add_argument("--user", type=int, default=None, help="user ID on the server given by --url")
+    parser.add_argument("--token", default=None, help="bearer token")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between two calls of a client")
+    parser.add_argument("--items", type=int, default=5000, help="items seeded into the stand-in server")
+    parser.add_argument("--per-client", action="store_true", help="one HandlerApi per client")
+    parser.add_argument("--no-coalesce", action="store_true", help="send every read on its own")
+    parser.add_argument("--cache", action="store_true", help="use an HttpCache in a temporary directory")
+    parser.add_argument("--max-connections", type=int, default=20)
+    parser.add_argument("--max-keepalive", type=int, default=10, help="idle connections kept open")
+    parser.add_argument("--writer", action="store_true", help="stand-in server commits writes together")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="fiwa-load-")
+    server = None
+    if args.url is None:
+        from functions.api_server import ApiServer
+        from functions.handler_sqllite import SQLLiteHandler
+        from functions.loader import get_abs_path
+
+        dbh = SQLLiteHandler(db_path=os.path.join(workdir, "server.sqlite"), pool_size=8)
+        dbh.initialize_database(schema_path=os.path.join(get_abs_path(), "database", "schema.sql"))
+        ids = seed(dbh, items=args.items)
+        server = ApiServer(dbh, port=0, bearer_token=args.token, writer=args.writer).start_in_thread()
+        url, project_id, user_id = server.url, ids["project_id"], ids["user_id"]
+        print(f"Stand-in server on {url} with {args.items} items ({workdir})")
+    else:
+        if args.project is None or args.user is None:
+            parser.error("--url needs --project and --user")
+        url, project_id, user_id = args.url, args.project, args.user
+
+    api_options = {"coalesce": not args.no_coalesce, "max_connections": args.max_connections,
+                   "max_keepalive": args.max_keepalive, "bearer_token": args.token}
+    if args.cache:
+        from functions.http_cache import HttpCache
+        api_options["cache"] = HttpCache(os.path.join(workdir, "http_cache.sqlite"))
+    try:
+        report = asyncio.run(run_load(url, project_id, user_id, clients=args.clients, duration=args.duration,
+                                      shared=not args.per_client, think_time=args.think_time, **api_options))
+        print(format_report(report, server.stats() if server is not None else None))
+    finally:
+        if server is not None:
+            server.stop_thread()
+
+
+if __name__ == "__main__":
+    main()
@@ -65,6 +65,20 @@ def identify_os(os_folder:str="fiwa-cli") -> [str, str]:
 
     return os_system, os_home_dir
 
+def print_storage_info(dbh) -> Dict[str, Any]:
+    """
+    Print the active SQLite storage profile and the settings in effect.
+
+    Args:
+        dbh: The SQLLiteHandler of the application.
+    Returns:
+        Dict[str, Any]: The storage information as returned by op_storage_info().
+    """
+    info = dbh.op_storage_info()
+    settings = ", ".join(f"{key}={value}" for key, value in info.items() if key != "profile")
+    print(f"Storage profile: {info['profile']} ({settings})")
+    return info
+
 def setup_fiwa(abs_path:str = "", config: Dict[str, Any] = {}) -> None:
     """
     Set up the FiWa application with the given configuration.
@@ -105,7 +119,9 @@ def setup_fiwa(abs_path:str = "", config: Dict[str, Any] = {}) -> None:
         h = Handler(method="sqlite")
         dbh = h.load()
         dbh.set_path(sqlite_path)
+        dbh.set_storage_profile(config.get("storage"))
         dbh.initialize_database(schema_path=os.path.join(abs_path, "database", "schema.sql"))
+        print_storage_info(dbh)
 
         # write config dictionary to a yaml file in the data directory for later use
         config_path = os.path.join(os_home_dir, "config.yml")
@@ -119,7 +135,68 @@ def setup_fiwa(abs_path:str = "", config: Dict[str, Any] = {}) -> None:
 
     elif opp_model == "api" and dev_config is None:
         # assume that you run this app with a remote API.
-        pass
+        api_base_url = config.get("api_base_url", "http://127.0.0.1:8082")
+        print(f"Running in api mode with server: {api_base_url}")
+
+        from functions.handler import Handler
+
+        os_system, os_home_dir = identify_os(os_folder="fiwa-cli")
+        os.makedirs(os_home_dir, exist_ok=True)
+        print(f"Data directory: {os_home_dir}")
+
+        # optional client settings (timeouts, retries, http2, ...) of functions/handler_api.py;
+        # "cache" and "outbox" hold the options of the response cache (max_bytes) and
+        # of the offline write queue (retry_delay, ...), or false to disable them
+        from functions.http_cache import HttpCache
+        from functions.outbox import Outbox
+        api_options = dict(config.get("api", {}))
+        cache_options = api_options.pop("cache", {})
+        if cache_options is not False:
+            api_options["cache"] = HttpCache(os.path.join(os_home_dir, "http_cache.sqlite"), **(cache_options or {}))
+        outbox_options = api_options.pop("outbox", {})
+        if outbox_options is not False:
+            api_options["outbox"] = Outbox(os.path.join(os_home_dir, "outbox.sqlite"), **(outbox_options or {}))
+
+        h = Handler(method="api", base_url=api_base_url, bearer_token=config.get("bearer_token"), **api_options)
+        dbh = h.load()
+
+        config["data_directory"] = os_home_dir
+        config["dbh"] = dbh
+        return config
+
+    elif opp_model == "hybrid" and dev_config is None:
+        # full local replica in data.sqlite, kept in sync with the remote API:
+        # reads and writes run locally, only changed items travel (functions/sync.py)
+        api_base_url = config.get("api_base_url", "http://127.0.0.1:8082")
+        print(f"Running in hybrid mode with server: {api_base_url}")
+
+        from functions.handler import Handler
+        from functions.sync import DeltaSync
+
+        os_system, os_home_dir = identify_os(os_folder="fiwa-cli")
+        os.makedirs(os_home_dir, exist_ok=True)
+        print(f"Data directory: {os_home_dir}")
+
+        h = Handler(method="sqlite")
+        dbh = h.load()
+        dbh.set_path(os.path.join(os_home_dir, "data.sqlite"))
+        dbh.set_storage_profile(config.get("storage"))
+        dbh.initialize_database(schema_path=os.path.join(abs_path, "database", "schema.sql"))
+        print_storage_info(dbh)
+
+        # "sync" holds the options of the sync (interval in seconds, page_size, project_ids);
+        # the client settings of "api" apply to the sync requests, without cache and outbox
+        sync_options = dict(config.get("sync", {}))
+        interval = sync_options.pop("interval", 30.0)
+        api_options = {key: value for key, value in config.get("api", {}).items() if key not in ("cache", "outbox")}
+        api = Handler(method="api", base_url=api_base_url, bearer_token=config.get("bearer_token"),
+                      **api_options).load()
+
+        config["data_directory"] = os_home_dir
+        config["dbh"] = dbh
+        config["sync"] = DeltaSync(dbh, api, **sync_options)
+        config["sync_interval"] = interval
+        return config
 
     elif dev_config is not None:
 
@@ -150,7 +227,9 @@ def setup_fiwa(abs_path:str = "", config: Dict[str, Any] = {}) -> None:
         h = Handler(method="sqlite")
         dbh = h.load()
         dbh.set_path(sqlite_path)
+        dbh.set_storage_profile(config.get("storage"))
         dbh.initialize_database(schema_path=os.path.join(abs_path, "database", "schema.sql"))
+        print_storage_info(dbh)
 
         from .db_faker import faker_users, faker_user_login, faker_projects, faker_labels
 
@@ -0,0 +1,402 @@
+"""
+Versioned schema migrations for the SQLite database.
+
+The schema version of a database file is stored in PRAGMA user_version. A new
+database is created from database/schema.sql, which always describes the
+latest version, and is stamped with LATEST_VERSION right away. An existing
+database runs every registered migration above its version, in order.
+
+A migration is a function decorated with @migration(version, description) that
+receives the SQLLiteHandler and a progress callback. Small migrations run in
+one transaction together with the version bump. Migrations registered with
+online=True commit on their own (e.g. batch by batch through rewrite_table())
+and must therefore be safe to re-run after an interruption.
+"""
+import sqlite3
+import time
+from typing import Callable, Dict, List, Optional
+
+MIGRATIONS: List[Dict] = []
+
+
+def migration(version: int, description: str, online: bool = False):
+    """
+    Register a migration step.
+
+    Args:
+        version: Schema version the database has after this step
+        description: Short description shown in the progress output
+        online: The step commits on its own instead of running in one transaction
+    """
+    def register(func):
+        if any(m["version"] == version for m in MIGRATIONS):
+            raise ValueError(f"Migration version {version} is registered twice")
+        MIGRATIONS.append({
+            "version": version,
+            "description": description,
+            "online": online,
+            "apply": func,
+        })
+        MIGRATIONS.sort(key=lambda m: m["version"])
+        return func
+    return register
+
+
+def latest_version(migrations: Optional[List[Dict]] = None) -> int:
+    migrations = MIGRATIONS if migrations is None else migrations
+    return migrations[-1]["version"] if migrations else 0
+
+
+def print_progress(step: str, done: int, total: int) -> None:
+    """Default progress callback: print the state of the running step."""
+    print(f"{step}: {done}/{total}")
+
+
+def get_version(dbh) -> int:
+    dbh.load()
+    result = dbh.execute_query("PRAGMA user_version")
+    dbh.close()
+    return result[0][0]
+
+
+def set_version(dbh, version: int) -> None:
+    # PRAGMA arguments cannot be bound as parameters
+    dbh.execute_query(f"PRAGMA user_version = {int(version)}")
+
+
+def run_migrations(dbh, migrations: Optional[List[Dict]] = None,
+                   progress: Optional[Callable[[str, int, int], None]] = None) -> List[int]:
+    """
+    Bring a database up to the latest schema version.
+
+    Args:
+        dbh: The SQLLiteHandler of the database
+        migrations: Migration steps to use (default: all registered ones)
+        progress: Optional callable(step, done, total) reporting the progress
+
+    Returns:
+        List of the versions that were applied
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    progress = progress or print_progress
+
+    current = get_version(dbh)
+    pending = [m for m in migrations if m["version"] > current]
+
+    applied = []
+    for m in pending:
+        step = f"Migration {m['version']} ({m['description']})"
+        print(f"Applying {step}")
+        start = time.perf_counter()
+
+        def step_progress(done, total, _step=step):
+            progress(_step, done, total)
+
+        if m["online"]:
+            m["apply"](dbh, step_progress)
+            dbh.load()
+            set_version(dbh, m["version"])
+            dbh.close()
+        else:
+            with dbh.transaction():
+                m["apply"](dbh, step_progress)
+                set_version(dbh, m["version"])
+
+        print(f"Applied {step} in {time.perf_counter() - start:.2f}s")
+        applied.append(m["version"])
+
+    return applied
+
+
+def rewrite_table(dbh, table: str, create_sql: str, columns: List[str], select_exprs: List[str] = None,
+                  key: str = None, post_sql: List[str] = None, batch_size: int = 5000,
+                  progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Rebuild a table with a new layout while the application keeps working on it.
+
+    The rows are copied into "<table>_new" in batches of batch_size, each batch
+    in its own short transaction, so other connections can read and write in
+    between. Triggers on the old table mirror inserts, updates and deletes into
+    the new table while the copy runs. The copy position is stored in the
+    migration state table, so an interrupted rewrite continues where it
+    stopped. Finally the new table replaces the old one in one transaction.
+    The indexes and triggers of the old table are recreated on it (indexes
+    on columns it no longer has are left out; post_sql can replace what does
+    not fit the new layout), and its AUTOINCREMENT sequence is carried over.
+
+    Args:
+        dbh: The SQLLiteHandler of the database
+        table: Name of the table to rewrite
+        create_sql: CREATE TABLE statement for the new layout, with {table} as
+            placeholder for the name of the new table
+        columns: Columns of the new table that are filled from the old one
+        select_exprs: SQL expression per column computing its value from the old
+            row (default: the same column name)
+        key: INTEGER PRIMARY KEY column shared by both tables
+        post_sql: Statements to run after the swap, e.g. CREATE INDEX
+        batch_size: Number of rows copied per transaction
+        progress: Optional callable(copied, total)
+
+    Returns:
+        Number of rows copied
+    """
+    select_exprs = select_exprs or list(columns)
+    if len(select_exprs) != len(columns):
+        raise ValueError("select_exprs must have one expression per column")
+    if key not in columns:
+        raise ValueError(f"Key column '{key}' must be one of the copied columns")
+
+    new_table = f"{table}_new"
+    state_table = f"p{dbh._db_salt}_migration_state"
+    column_list = ", ".join(columns)
+    select_list = ", ".join(select_exprs)
+    copy_row = (f"INSERT OR REPLACE INTO {new_table} ({column_list}) "
+                f"SELECT {select_list} FROM {table} WHERE {key} = NEW.{key};")
+
+    with dbh.transaction():
+        dbh.execute_query(create_sql.replace("{table}", new_table).replace("CREATE TABLE ", "CREATE TABLE IF NOT EXISTS ", 1))
+        dbh.execute_query(f"""CREATE TABLE IF NOT EXISTS {state_table}
+            (table_name VARCHAR(255) PRIMARY KEY, last_key INTEGER NOT NULL)""")
+        dbh.execute_query(f"INSERT OR IGNORE INTO {state_table} (table_name, last_key) VALUES (?, ?)",
+                          [table, -1])
+        # keep rows that change during the copy in sync
+        dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {new_table}_sync_insert
+            AFTER INSERT ON {table} BEGIN {copy_row} END""")
+        dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {new_table}_sync_update
+            AFTER UPDATE ON {table} BEGIN
+                DELETE FROM {new_table} WHERE {key} = OLD.{key};
+                {copy_row}
+            END""")
+        dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {new_table}_sync_delete
+            AFTER DELETE ON {table} BEGIN
+                DELETE FROM {new_table} WHERE {key} = OLD.{key};
+            END""")
+
+    dbh.load()
+    try:
+        total = dbh.execute_query(f"SELECT COUNT(*) FROM {table}")[0][0]
+        last_key = dbh.execute_query(f"SELECT last_key FROM {state_table} WHERE table_name = ?", [table])[0][0]
+        copied = dbh.execute_query(f"SELECT COUNT(*) FROM {table} WHERE {key} <= ?", [last_key])[0][0]
+
+        while True:
+            with dbh.transaction():
+                rows = dbh.execute_query(
+                    f"SELECT {key} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?",
+                    [last_key, batch_size]
+                )
+                if not rows:
+                    break
+                upper = rows[-1][0]
+                dbh.execute_query(
+                    f"""INSERT OR REPLACE INTO {new_table} ({column_list})
+                        SELECT {select_list} FROM {table} WHERE {key} > ? AND {key} <= ?""",
+                    [last_key, upper]
+                )
+                dbh.execute_query(f"UPDATE {state_table} SET last_key = ? WHERE table_name = ?",
+                                  [upper, table])
+            last_key = upper
+            copied += len(rows)
+            if progress is not None:
+                progress(copied, total)
+
+        with dbh.transaction():
+            for suffix in ("insert", "update", "delete"):
+                dbh.execute_query(f"DROP TRIGGER IF EXISTS {new_table}_sync_{suffix}")
+            # DROP TABLE drops the indexes and triggers of the table as well
+            # (FTS, label associations, change log): recreate them on the new
+            # table. Indexes on columns the new layout lacks can not be.
+            indexes = dbh.execute_query(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL "
+                "ORDER BY name", [table])
+            triggers = dbh.execute_query(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? ORDER BY name", [table])
+            # keep AUTOINCREMENT from handing out the keys of rows deleted from the end
+            sequence = dbh.execute_query(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", [table]) if _has_sequence(dbh) else []
+            dbh.execute_query(f"DROP TABLE {table}")
+            dbh.execute_query(f"ALTER TABLE {new_table} RENAME TO {table}")
+            for (index_sql,) in indexes:
+                try:
+                    dbh.execute_query(index_sql)
+                except sqlite3.OperationalError:
+                    pass
+            for (trigger_sql,) in triggers:
+                dbh.execute_query(trigger_sql)
+            if sequence and "AUTOINCREMENT" in create_sql.upper():
+                dbh.execute_query("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?",
+                                  [sequence[0][0], table])
+                dbh.execute_query("""INSERT INTO sqlite_sequence (name, seq)
+                    SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)""",
+                                  [table, sequence[0][0], table])
+            for statement in post_sql or []:
+                dbh.execute_query(statement)
+            dbh.execute_query(f"DELETE FROM {state_table} WHERE table_name = ?", [table])
+    finally:
+        dbh.close()
+
+    return copied
+
+
+def _has_sequence(dbh) -> bool:
+    """Whether the database has a sqlite_sequence table, i.e. an AUTOINCREMENT table."""
+    return bool(dbh.execute_query("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_sequence'"))
+
+
+@migration(1, "indexes for hot access paths")
+def _migration_1_indexes(dbh, progress):
+    dbh.op_ensure_indexes(schema_path=dbh._schema_path,
+                          progress=lambda done, total, name, seconds: progress(done, total))
+
+
+@migration(2, "monthly rollups in the aggregates table")
+def _migration_2_rollups(dbh, progress):
+    dbh.op_ensure_indexes(schema_path=dbh._schema_path,
+                          progress=lambda done, total, name, seconds: None)
+    progress(0, 1)
+    dbh.op_rollup_rebuild()
+    progress(1, 1)
+
+
+@migration(3, "item to label association table")
+def _migration_3_item_labels(dbh, progress):
+    p = f"p{dbh._db_salt}"
+    copy_labels = f"""INSERT OR IGNORE INTO {p}_item_labels (item_id, label_id, project_id, bought_date)
+                SELECT NEW.item_id, value, NEW.project_id, NEW.bought_date FROM json_each(NEW.tags);"""
+    dbh.execute_query(f"""CREATE TABLE IF NOT EXISTS {p}_item_labels
+        (
+            item_id INTEGER NOT NULL REFERENCES {p}_items (item_id),
+            label_id INTEGER NOT NULL REFERENCES {p}_labels (label_id),
+            project_id INTEGER NOT NULL,
+            bought_date TIMESTAMP NOT NULL,
+            PRIMARY KEY (item_id, label_id)
+        ) WITHOUT ROWID""")
+    dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {p}_item_labels_insert
+        AFTER INSERT ON {p}_items
+        BEGIN
+            {copy_labels}
+        END""")
+    dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {p}_item_labels_update
+        AFTER UPDATE OF tags, project_id, bought_date ON {p}_items
+        BEGIN
+            DELETE FROM {p}_item_labels WHERE item_id = OLD.item_id;
+            {copy_labels}
+        END""")
+    dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {p}_item_labels_delete
+        AFTER DELETE ON {p}_items
+        BEGIN
+            DELETE FROM {p}_item_labels WHERE item_id = OLD.item_id;
+        END""")
+
+    # backfill from the JSON lists, then build the label index in one go
+    progress(0, 1)
+    dbh.execute_query(f"""INSERT OR IGNORE INTO {p}_item_labels (item_id, label_id, project_id, bought_date)
+        SELECT i.item_id, j.value, i.project_id, i.bought_date FROM {p}_items AS i, json_each(i.tags) AS j""")
+    dbh.op_ensure_indexes(schema_path=dbh._schema_path,
+                          progress=lambda done, total, name, seconds: None)
+    progress(1, 1)
+
+
+@migration(4, "closure table of the composite label hierarchy")
+def _migration_4_label_closure(dbh, progress):
+    import json
+
+    p = f"p{dbh._db_salt}"
+    dbh.execute_query(f"""CREATE TABLE IF NOT EXISTS {p}_label_closure
+        (
+            ancestor_id INTEGER NOT NULL REFERENCES {p}_labels (label_id),
+            descendant_id INTEGER NOT NULL REFERENCES {p}_labels (label_id),
+            depth INTEGER NOT NULL,
+            paths INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (ancestor_id, descendant_id, depth)
+        ) WITHOUT ROWID""")
+    dbh.op_ensure_indexes(schema_path=dbh._schema_path,
+                          progress=lambda done, total, name, seconds: None)
+
+    # every label reaches itself, then the edges of the composite lists are added
+    dbh.execute_query(f"""INSERT OR IGNORE INTO {p}_label_closure (ancestor_id, descendant_id, depth, paths)
+        SELECT label_id, label_id, 0, 1 FROM {p}_labels""")
+    labels = dbh.execute_query(f"SELECT label_id, project_id, composite FROM {p}_labels WHERE composite != '[]'")
+    for done, (label_id, project_id, composite) in enumerate(labels, start=1):
+        try:
+            children = dbh._label_children(json.loads(composite or "[]"))
+            with dbh.transaction():
+                dbh._label_set_children(label_id, project_id, [], children)
+        except ValueError as e:
+            print(f"Label {label_id}: composite {composite} skipped: {str(e)}")
+        progress(done, len(labels))
+
+
+@migration(5, "exchange rate table")
+def _migration_5_exchange_rates(dbh, progress):
+    dbh.execute_query(f"""CREATE TABLE IF NOT EXISTS p{dbh._db_salt}_exchange_rates
+        (
+            base VARCHAR(3) NOT NULL,
+            quote VARCHAR(3) NOT NULL,
+            rate_date DATE NOT NULL,
+            rate DECIMAL NOT NULL,
+            source VARCHAR(64) NOT NULL,
+            PRIMARY KEY (base, quote, rate_date)
+        ) WITHOUT ROWID""")
+
+
+@migration(6, "full-text search indexes of items and labels")
+def _migration_6_search(dbh, progress):
+    p = f"p{dbh._db_salt}"
+    sources = [("items", "item_id", ("name", "note")), ("labels", "label_id", ("name", "description"))]
+    for done, (table, key, columns) in enumerate(sources, start=1):
+        fts = f"{p}_{table}_fts"
+        column_list = ", ".join(columns)
+        insert = (f"INSERT INTO {fts} (rowid, {column_list}) "
+                  f"VALUES (NEW.{key}, {', '.join('NEW.' + c for c in columns)});")
+        delete = (f"INSERT INTO {fts} ({fts}, rowid, {column_list}) "
+                  f"VALUES ('delete', OLD.{key}, {', '.join('OLD.' + c for c in columns)});")
+        dbh.execute_query(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5
+            (
+                {column_list},
+                content='{p}_{table}', content_rowid='{key}',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )""")
+        dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {fts}_insert
+            AFTER INSERT ON {p}_{table} BEGIN {insert} END""")
+        dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {fts}_update
+            AFTER UPDATE OF {column_list} ON {p}_{table} BEGIN {delete} {insert} END""")
+        dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {fts}_delete
+            AFTER DELETE ON {p}_{table} BEGIN {delete} END""")
+        # index the rows that already exist
+        dbh.execute_query(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        progress(done, len(sources))
+
+
+@migration(7, "change log of the items for the delta sync")
+def _migration_7_changes(dbh, progress):
+    p = f"p{dbh._db_salt}"
+    now = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+    dbh.execute_query(f"""CREATE TABLE IF NOT EXISTS {p}_changes
+        (
+            change_seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_uuid VARCHAR(36) NOT NULL UNIQUE,
+            project_id INTEGER NOT NULL,
+            deleted BOOLEAN NOT NULL DEFAULT 0,
+            changed_at TEXT NOT NULL,
+            synced BOOLEAN NOT NULL DEFAULT 0
+        )""")
+    for event, row, deleted in (("insert", "NEW", 0), ("update", "NEW", 0), ("delete", "OLD", 1)):
+        dbh.execute_query(f"""CREATE TRIGGER IF NOT EXISTS {p}_changes_{event}
+            AFTER {event.upper()} ON {p}_items
+            BEGIN
+                INSERT OR REPLACE INTO {p}_changes (item_uuid, project_id, deleted, changed_at)
+                    VALUES ({row}.item_uuid, {row}.project_id, {deleted}, {now});
+            END""")
+    dbh.execute_query(f"""CREATE TABLE IF NOT EXISTS {p}_sync_state
+        (
+            name VARCHAR(255) PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID""")
+
+    # the existing items are the first changes, so a replica can pull them from 0
+    progress(0, 1)
+    dbh.execute_query(f"""INSERT OR IGNORE INTO {p}_changes (item_uuid, project_id, deleted, changed_at)
+        SELECT item_uuid, project_id, 0, {now} FROM {p}_items ORDER BY item_id""")
+    dbh.op_ensure_indexes(schema_path=dbh._schema_path,
+                          progress=lambda done, total, name, seconds: None)
+    progress(1, 1)
@@ -0,0 +1,344 @@
+"""
+Durable queue of the writes of the API backend.
+
+In API mode the writes whose result is only a confirmation (OUTBOX_OPS:
+item entry, item and label edits and deletes) should neither block the UI
+on a slow server nor get lost when it is unreachable. HandlerApi therefore
+stores them in an Outbox, a SQLite file in the data directory, and answers
+them at once. A background thread replays the queued writes in order:
+
+- Every write keeps the idempotency key it got when it was queued. A
+  replay after a lost response is recognized by the server and not run
+  twice.
+- Queued items get their item_uuid right away. Consecutive item entries
+  of one project are sent as one op_item_create_many() call with
+  skip_existing, so items stored by an earlier attempt are not stored
+  again.
+- A write that fails because of the network or the server (ApiUnavailable,
+  5xx, 429) stays pending. It is retried with exponential backoff, and the
+  writes behind it wait, so the order is kept.
+- A write the server rejects (e.g. a ValueError for a deleted label) is
+  marked failed and skipped. counts() reports the pending and failed
+  writes for the UI.
+"""
+import hashlib
+import inspect
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from functions.handler_api import ApiError, ApiUnavailable, decode_call, encode_call
+from functions.handler_sqllite import SQLLiteHandler
+from functions.items import as_item_dict
+
+# op_ methods the outbox accepts: their callers only need a confirmation
+OUTBOX_OPS = frozenset({"op_item_create_many", "op_item_update", "op_item_delete",
+                        "op_label_update", "op_label_delete"})
+# upper bound of the items sent in one merged op_item_create_many() call
+MAX_MERGED_ITEMS = 5000
+# default options of op_item_create_many(), left out of the queued calls
+_DEFAULTS = {name: parameter.default for name, parameter in
+             inspect.signature(SQLLiteHandler.op_item_create_many).parameters.items()}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    op TEXT NOT NULL,
+    call TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, seq);
+"""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """True for failures worth another attempt: network errors, 5xx and 429 answers."""
+    if isinstance(exc, ApiUnavailable):
+        return True
+    return isinstance(exc, ApiError) and (exc.status is None or exc.status >= 500 or exc.status == 429)
+
+
+class Outbox:
+    """
+    Writes waiting to be sent, in a SQLite file.
+
+    Args:
+        path: File of the outbox, e.g. outbox.sqlite in the data directory
+        batch_size: Number of queued writes read per replay pass
+        retry_delay: Seconds before the first retry of a failing write, doubled per attempt
+        max_retry_delay: Upper bound of the wait between two attempts
+        clock: Time source in seconds
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, retry_delay: float = 1.0,
+                 max_retry_delay: float = 300.0, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # a queued write must survive a crash or power loss
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.executescript(_SCHEMA)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ops(self) -> frozenset:
+        return OUTBOX_OPS
+
+    @staticmethod
+    def bind_call(op: str, args, kwargs) -> Tuple[list, Dict[str, Any], Dict[str, Any]]:
+        """
+        Bind the arguments of a write to the signature of its op_ method.
+
+        op_item_create_many() calls are brought into one form: the project ID
+        and the items (a list, even if a generator was given, each with its
+        item_uuid) as positional arguments, skip_existing and return_ids=False
+        as keyword arguments. Other calls are returned as given.
+
+        Returns:
+            The args and kwargs to queue, and all bound arguments with their defaults
+        """
+        if op not in OUTBOX_OPS:
+            raise ValueError(f"Operation '{op}' can not be queued, supported: {', '.join(sorted(OUTBOX_OPS))}")
+        try:
+            bound = inspect.signature(getattr(SQLLiteHandler, op)).bind(None, *args, **kwargs)
+        except TypeError as e:
+            raise TypeError(f"{op}: {e}")
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        arguments.pop("self")
+        if op != "op_item_create_many":
+            return list(args), dict(kwargs), arguments
+
+        items = []
+        for item in arguments["items"]:
+            item = dict(as_item_dict(item))
+            item.setdefault("item_uuid", str(uuid.uuid4()))
+            items.append(item)
+        arguments["items"] = items
+        options = {name: value for name, value in arguments.items()
+                   if name not in ("project_id", "items") and value != _DEFAULTS[name]}
+        options.update(skip_existing=True, return_ids=False)
+        return [arguments["project_id"], items], options, arguments
+
+    @staticmethod
+    def queued_result(op: str, arguments: Dict[str, Any]) -> Any:
+        """
+        The answer to a queued write, in the shape of the op_ method's result,
+        for the bound arguments of bind_call(). The IDs of queued items are
+        only known once the server stored them: item_ids holds one None per
+        item, item_uuids their UUIDs.
+        """
+        if op == "op_item_create_many":
+            items = arguments["items"]
+            summary = {"created": len(items), "skipped": 0, "errors": [], "existing": 0,
+                       "seconds": 0.0, "queued": True, "item_uuids": [item["item_uuid"] for item in items]}
+            if arguments.get("return_ids", True):
+                summary["item_ids"] = [None] * len(items)
+            return summary
+        return True
+
+    def submit(self, op: str, *args, **kwargs) -> Any:
+        """Queue a write and return the answer for its caller, see queued_result()."""
+        args, kwargs, arguments = self.bind_call(op, args, kwargs)
+        self._insert(op, args, kwargs)
+        return self.queued_result(op, arguments)
+
+    def enqueue(self, op: str, *args, **kwargs) -> str:
+        """
+        Queue a write and return its idempotency key. Items of
+        op_item_create_many() are given their item_uuid here.
+        """
+        args, kwargs, _ = self.bind_call(op, args, kwargs)
+        return self._insert(op, args, kwargs)
+
+    def _insert(self, op: str, args, kwargs) -> str:
+        key = uuid.uuid4().hex
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO outbox (idempotency_key, op, call, created_at) VALUES (?, ?, ?, ?)",
+                (key, op, encode_call(args, kwargs), self._clock()))
+        self._wakeup.set()
+        return key
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of pending and failed writes."""
+        with self._lock:
+            rows = dict(self._connection.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+        return {"pending": rows.get("pending", 0), "failed": rows.get("failed", 0)}
+
+    def entries(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return the queued writes in order, optionally only those with status "pending" or "failed"."""
+        query = "SELECT seq, idempotency_key, op, call, status, attempts, last_error FROM outbox"
+        params = []
+        if status is not None:
+            query += " WHERE status = ?"
+            params.append(status)
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY seq", params).fetchall()
+        return [{"seq": seq, "key": key, "op": op, "call": call, "status": st, "attempts": attempts,
+                 "last_error": error} for seq, key, op, call, st, attempts, error in rows]
+
+    def retry_failed(self) -> int:
+        """Queue the failed writes again; returns how many."""
+        with self._lock:
+            count = self._connection.execute(
+                "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = 0 "
+                "WHERE status = 'failed'").rowcount
+        self._wakeup.set()
+        return count
+
+    def discard_failed(self) -> int:
+        """Drop the failed writes; returns how many."""
+        with self._lock:
+            return self._connection.execute("DELETE FROM outbox WHERE status = 'failed'").rowcount
+
+    def _pending(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT seq, idempotency_key, op, call, attempts, next_attempt_at FROM outbox "
+                "WHERE status = 'pending' ORDER BY seq LIMIT ?", (self.batch_size,)).fetchall()
+        return [{"seq": seq, "key": key, "op": op, "call": call, "attempts": attempts, "due": due}
+                for seq, key, op, call, attempts, due in rows]
+
+    @staticmethod
+    def _groups(entries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        # consecutive item entries of one project with the same options are sent together
+        groups = []
+        items = 0
+        for entry in entries:
+            args, kwargs = decode_call(entry["call"])
+            if entry["op"] == "op_item_create_many":
+                # the items may have been queued as keyword argument by an older version
+                args, kwargs, _ = Outbox.bind_call(entry["op"], args, kwargs)
+            entry["args"], entry["kwargs"] = args, kwargs
+            previous = groups[-1][-1] if groups else None
+            if (previous is not None and entry["op"] == previous["op"] == "op_item_create_many"
+                    and args[0] == previous["args"][0] and kwargs == previous["kwargs"]
+                    and items + len(args[1]) <= MAX_MERGED_ITEMS):
+                groups[-1].append(entry)
+                items += len(args[1])
+            else:
+                groups.append([entry])
+                items = len(args[1]) if entry["op"] == "op_item_create_many" else 0
+        return groups
+
+    @staticmethod
+    def _send(api, group: List[Dict[str, Any]]) -> None:
+        first = group[0]
+        if len(group) == 1:
+            api.call_with_key(first["key"], first["op"], *first["args"], **first["kwargs"])
+            return
+        items = [item for entry in group for item in entry["args"][1]]
+        # the same group gets the same key on every attempt
+        key = hashlib.sha256(",".join(entry["key"] for entry in group).encode("ascii")).hexdigest()
+        api.call_with_key(key, first["op"], first["args"][0], items, **first["kwargs"])
+
+    def _done(self, group: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._connection.executemany("DELETE FROM outbox WHERE seq = ?", [(entry["seq"],) for entry in group])
+
+    def _failed(self, entry: Dict[str, Any], exc: BaseException) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE seq = ?",
+                (f"{type(exc).__name__}: {exc}", entry["seq"]))
+
+    def _defer(self, group: List[Dict[str, Any]], exc: BaseException) -> None:
+        attempts = group[0]["attempts"] + 1
+        due = self._clock() + min(self.max_retry_delay, self.retry_delay * 2 ** (attempts - 1))
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE seq = ?",
+                [(attempts, due, f"{type(exc).__name__}: {exc}", entry["seq"]) for entry in group])
+
+    def _replay_group(self, api, group: List[Dict[str, Any]]):
+        """Send one group; returns the writes sent and failed and whether the pass has to stop."""
+        try:
+            self._send(api, group)
+        except Exception as e:
+            if is_transient(e):
+                self._defer(group, e)
+                return 0, 0, True
+            if len(group) == 1:
+                self._failed(group[0], e)
+                return 0, 1, False
+            # the merged call was rejected as a whole: find the rejected entries
+            sent = failed = 0
+            for entry in group:
+                entry_sent, entry_failed, stop = self._replay_group(api, [entry])
+                sent, failed = sent + entry_sent, failed + entry_failed
+                if stop:
+                    return sent, failed, True
+            return sent, failed, False
+        self._done(group)
+        return len(group), 0, False
+
+    def replay(self, api) -> Dict[str, int]:
+        """
+        Send the pending writes in order through api (a HandlerApi) until the
+        queue is empty or a write has to wait for its retry.
+
+        Returns:
+            Dictionary with the writes sent and rejected (failed_now) in this
+            pass and the counts() of the writes still pending and failed
+        """
+        sent = failed = 0
+        while True:
+            entries = self._pending()
+            if not entries or entries[0]["due"] > self._clock():
+                break
+            for group in self._groups(entries):
+                group_sent, group_failed, stop = self._replay_group(api, group)
+                sent, failed = sent + group_sent, failed + group_failed
+                if stop:
+                    return {"sent": sent, "failed_now": failed, **self.counts()}
+        return {"sent": sent, "failed_now": failed, **self.counts()}
+
+    def start(self, api, interval: float = 5.0) -> None:
+        """
+        Replay in a background thread: right after every enqueue() and at
+        least every interval seconds while writes are pending.
+        """
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+
+        def run():
+            while not self._stopping.is_set():
+                try:
+                    self.replay(api)
+                except Exception:
+                    # e.g. the outbox file is locked; the next pass tries again
+                    pass
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+
+        self._thread = threading.Thread(target=run, name="fiwa-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the background replay; queued writes stay in the file for the next start."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join(timeout)
+
+    def close(self) -> None:
+        self.stop()
+        with self._lock:
+            self._connection.close()
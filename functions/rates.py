@@ -0,0 +1,236 @@
+"""
+Local exchange-rate store.
+
+Rates are stored in pstand_exchange_rates as "1 base = rate quote" per day,
+the way the European Central Bank publishes them (base EUR). They are loaded
+from ECB CSV files, the daily eurofxref.csv as well as the full history
+eurofxref-hist.csv (or the .zip files they are distributed in).
+
+A rate for a day without a published rate (weekends, holidays) is the last
+rate on or before that day ("as of" lookup). Pairs that are not stored
+directly are derived from their inverse or crossed through a common base, so
+USD -> GBP works from EUR -> USD and EUR -> GBP.
+
+Single lookups go through a bounded LRU cache of (from, to, date) keys;
+convert() converts whole arrays of amounts at once with NumPy.
+"""
+import csv
+import io
+import zipfile
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the installation
+    np = None
+
+from functions.cache import LRUCache
+from functions.items import parse_currency, parse_date
+
+_MISSING = object()
+
+
+def parse_rate_date(value: str) -> str:
+    """Parse the dates used in ECB files ('2026-10-16' or '16 October 2026') to 'YYYY-MM-DD'."""
+    value = value.strip()
+    try:
+        return datetime.strptime(value, "%d %B %Y").date().isoformat()
+    except ValueError:
+        return parse_date(value, "rate_date").date().isoformat()
+
+
+def read_ecb_csv(handle) -> Iterator[Tuple[str, str, float]]:
+    """
+    Read an ECB reference rate CSV file.
+
+    Args:
+        handle: Text file object of eurofxref.csv or eurofxref-hist.csv
+
+    Yields:
+        (rate_date, currency, rate) for every published rate; the N/A cells of
+        currencies that were not quoted on a day are skipped
+    """
+    reader = csv.reader(handle)
+    header = [cell.strip() for cell in next(reader, [])]
+    if not header or header[0].lower() != "date":
+        raise ValueError("Not an ECB rate file: the first column must be 'Date'")
+    currencies = [parse_currency(cell, "currency") if cell else None for cell in header[1:]]
+
+    for row in reader:
+        if not row or not row[0].strip():
+            continue
+        rate_date = parse_rate_date(row[0])
+        for currency, cell in zip(currencies, row[1:]):
+            cell = cell.strip()
+            if currency is None or not cell or cell.upper() == "N/A":
+                continue
+            yield rate_date, currency, float(cell)
+
+
+def open_rate_file(path: str):
+    """Open a rate CSV file as text, also when it is the first member of a .zip archive."""
+    if path.lower().endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        member = next(name for name in archive.namelist() if name.lower().endswith(".csv"))
+        return io.TextIOWrapper(archive.open(member), encoding="utf-8-sig", newline="")
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+class RateStore:
+    """
+    Exchange-rate lookups of one SQLLiteHandler.
+
+    Args:
+        dbh: The SQLLiteHandler of the database
+        cache_size: Number of (from, to, date) rates kept in memory
+    """
+
+    def __init__(self, dbh, cache_size: int = 4096):
+        self._dbh = dbh
+        self._cache = LRUCache(cache_size)
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    def load_ecb_csv(self, path: str, base: str = "EUR", source: str = "ECB",
+                     chunk_size: int = 5000) -> Dict:
+        """
+        Load an ECB CSV (or zipped CSV) file into the rates table. Rates already
+        stored for a day are replaced, so loading overlapping files is safe.
+
+        Returns:
+            Summary dictionary with the keys rates, currencies, first_date and last_date
+        """
+        base = parse_currency(base, "base")
+        dbh = self._dbh
+        count = 0
+        currencies = set()
+        first_date = last_date = None
+
+        with open_rate_file(path) as handle, dbh.transaction():
+            batch = []
+            for rate_date, currency, rate in read_ecb_csv(handle):
+                batch.append((base, currency, rate_date, rate, source))
+                currencies.add(currency)
+                first_date = min(first_date or rate_date, rate_date)
+                last_date = max(last_date or rate_date, rate_date)
+                if len(batch) >= chunk_size:
+                    dbh.execute_named_many("rates.upsert", batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                dbh.execute_named_many("rates.upsert", batch)
+                count += len(batch)
+
+        # new rates can change the answer of as-of lookups
+        self.clear_cache()
+        return {"rates": count, "currencies": sorted(currencies),
+                "first_date": first_date, "last_date": last_date}
+
+    def _as_of(self, base: str, quote: str, day: str) -> Optional[float]:
+        result = self._dbh.execute_named("rates.as_of", [base, quote, day])
+        return result[0][0] if result else None
+
+    def _lookup(self, from_currency: str, to_currency: str, day: str) -> Optional[float]:
+        rate = self._as_of(from_currency, to_currency, day)
+        if rate is not None:
+            return rate
+        rate = self._as_of(to_currency, from_currency, day)
+        if rate:
+            return 1.0 / rate
+        # cross through a base that quotes both currencies
+        for (base,) in self._dbh.execute_named("rates.bases"):
+            from_rate = 1.0 if base == from_currency else self._as_of(base, from_currency, day)
+            to_rate = 1.0 if base == to_currency else self._as_of(base, to_currency, day)
+            if from_rate and to_rate:
+                return to_rate / from_rate
+        return None
+
+    def rate(self, from_currency: str, to_currency: str, on_date=None) -> Optional[float]:
+        """
+        Return how many units of to_currency one unit of from_currency was
+        worth on a day, or None if no rate is known up to that day.
+
+        Args:
+            from_currency: 3-letter code of the currency converted from
+            to_currency: 3-letter code of the currency converted to
+            on_date: datetime, date or ISO string (default: today)
+        """
+        from_currency = parse_currency(from_currency, "from_currency")
+        to_currency = parse_currency(to_currency, "to_currency")
+        if from_currency == to_currency:
+            return 1.0
+        day = parse_date(on_date or datetime.now(), "on_date").date().isoformat()
+
+        key = (from_currency, to_currency, day)
+        rate = self._cache.get(key, _MISSING)
+        if rate is _MISSING:
+            self._dbh.load()
+            try:
+                rate = self._lookup(from_currency, to_currency, day)
+            finally:
+                self._dbh.close()
+            self._cache.put(key, rate)
+        return rate
+
+    def _series(self, base: str, quote: str):
+        """All rates of a pair as (days since the epoch, rates) arrays, sorted by day."""
+        key = ("series", base, quote)
+        series = self._cache.get(key, _MISSING)
+        if series is _MISSING:
+            self._dbh.load()
+            try:
+                rows = self._dbh.execute_named("rates.series", [base, quote])
+            finally:
+                self._dbh.close()
+            days = np.array([row[0] for row in rows], dtype="datetime64[D]").astype("i8")
+            series = (days, np.array([row[1] for row in rows], dtype="f8"))
+            self._cache.put(key, series)
+        return series
+
+    def _leg(self, base: str, currency: str, days) -> "np.ndarray":
+        """Rate base -> currency as of each day; NaN where none is known."""
+        if currency == base:
+            return np.ones(len(days))
+        series_days, series_rates = self._series(base, currency)
+        index = np.searchsorted(series_days, days, side="right") - 1
+        rates = series_rates[np.maximum(index, 0)] if len(series_rates) else np.zeros(len(days))
+        return np.where(index >= 0, rates, np.nan)
+
+    def convert(self, amounts, currencies, dates, to_currency: str, base: str = "EUR") -> "np.ndarray":
+        """
+        Convert arrays of amounts into one currency, each at the rate of its own day.
+
+        Every amount is converted through base (currency -> base -> to_currency),
+        with as-of lookups done by np.searchsorted over the stored rate series.
+
+        Args:
+            amounts: Sequence or array of amounts
+            currencies: Currency code of each amount
+            dates: Date of each amount (ISO strings, dates or datetime64)
+            to_currency: Currency to convert into
+            base: Base currency of the stored rates (default: EUR, as in ECB files)
+
+        Returns:
+            Float array of the converted amounts, NaN where no rate is known
+        """
+        if np is None:
+            raise ImportError("Batch conversion needs NumPy, install it with: pip install fiwa-cli[analytics]")
+        amounts = np.asarray(amounts, dtype="f8")
+        currencies = np.asarray([parse_currency(c, "currency") for c in currencies]) if len(amounts) else np.array([])
+        days = np.array([str(d)[:10] for d in dates], dtype="datetime64[D]").astype("i8")
+        if not (len(amounts) == len(currencies) == len(days)):
+            raise ValueError("amounts, currencies and dates must have the same length")
+        base = parse_currency(base, "base")
+        to_currency = parse_currency(to_currency, "to_currency")
+
+        to_rates = self._leg(base, to_currency, days)
+        result = np.full(len(amounts), np.nan)
+        for currency in np.unique(currencies):
+            mask = currencies == currency
+            if currency == to_currency:
+                result[mask] = amounts[mask]
+            else:
+                result[mask] = amounts[mask] * to_rates[mask] / self._leg(base, currency, days[mask])
+        return result
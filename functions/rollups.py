@@ -0,0 +1,48 @@
+"""
+Monthly rollups of the items, materialized in pstand_aggregates.
+
+Each rollup row holds the number of items and the sum of their price_final
+(the price in the project currency) for one project, dimension and calendar
+month, as the JSON object {"count": ..., "sum": ...} in aggregate_info.
+
+Dimensions (aggregate_type, aggregate_name):
+    0 "project"        all items of the project
+    1 "label:<id>"     items tagged with the label
+    2 "user:<id>"      items bought by the user (user_id is the user)
+    3 "user:<id>"      items bought for the user (user_id is the user)
+
+The rollups are kept up to date by SQLLiteHandler as items are created,
+updated and deleted, and can be recomputed with op_rollup_rebuild().
+"""
+from datetime import datetime
+from typing import Any, Dict, Sequence
+
+from functions.items import parse_date
+
+ROLLUP_TYPES = {
+    "project": 0,
+    "label": 1,
+    "bought_by": 2,
+    "bought_for": 3,
+}
+
+
+def month_begin(value: Any) -> str:
+    """Return the first day of the month of a date as 'YYYY-MM-01'."""
+    return parse_date(value, "date").strftime("%Y-%m-01")
+
+
+def next_month_begin(value: Any) -> str:
+    """Return the first day of the month after the month of a date."""
+    d = parse_date(value, "date")
+    return datetime(d.year + d.month // 12, d.month % 12 + 1, 1).strftime("%Y-%m-%d")
+
+
+def rollup_row_to_dict(row: Sequence) -> Dict[str, Any]:
+    """
+    Convert a row of the statement "aggregates.of_type" into a dictionary with
+    the keys begin, key (label or user ID, None for the project), count and sum.
+    """
+    begin, name, count, total = row
+    key = int(name.split(":", 1)[1]) if ":" in name else None
+    return {"begin": begin, "key": key, "count": count, "sum": total}
@@ -0,0 +1,70 @@
+"""
+Full-text search over items and labels.
+
+Item names and notes and label names and descriptions are indexed in the
+FTS5 tables {p}_items_fts and {p}_labels_fts (see database/schema.sql), which
+triggers keep in sync with every write. SQLLiteHandler.op_search() ranks the
+matches of both with bm25 and pages through them with a keyset cursor.
+
+Search text is turned into an FTS5 query with build_match_query(), so user
+input never reaches the FTS5 query parser unescaped:
+
+    hardware store      items containing both words (in any order)
+    "hardware store"    the phrase
+    hard*               words starting with "hard"
+    "hardware st"*      the phrase with a prefix as its last word
+"""
+import base64
+import json
+import re
+from typing import List, Tuple
+
+# kinds of search results
+SEARCH_KINDS = ("item", "label")
+
+_TERM_RE = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+_WORD_RE = re.compile(r"\w", re.UNICODE)
+
+
+def _phrase(text: str, prefix: bool) -> str:
+    return '"' + text.replace('"', '""') + '"' + (" *" if prefix else "")
+
+
+def build_match_query(text: str) -> str:
+    """
+    Build an FTS5 MATCH expression from search text.
+
+    Bare words and "quoted phrases" must all match; a trailing * makes the
+    (last word of the) term a prefix. Everything else is quoted, so FTS5
+    operators and punctuation in the text are searched as plain words.
+
+    Raises:
+        ValueError: If the text contains no searchable word
+    """
+    terms: List[str] = []
+    for phrase, phrase_star, word in _TERM_RE.findall(text or ""):
+        if word:
+            prefix = word.endswith("*")
+            phrase = word.rstrip("*")
+        else:
+            prefix = bool(phrase_star)
+        if _WORD_RE.search(phrase):
+            terms.append(_phrase(phrase.strip(), prefix))
+    if not terms:
+        raise ValueError(f"Search text must contain at least one word, got {text!r}")
+    return " AND ".join(terms)
+
+
+def encode_search_cursor(rank: float, kind: str, result_id: int) -> str:
+    """Encode the position after a search result as an opaque cursor token."""
+    raw = json.dumps([rank, kind, result_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_search_cursor(token: str) -> Tuple[float, str, int]:
+    """Decode a search cursor token into its (rank, kind, id) position."""
+    try:
+        rank, kind, result_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return float(rank), str(kind), int(result_id)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError(f"Invalid search cursor token: {token!r}")
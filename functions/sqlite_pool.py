@@ -0,0 +1,129 @@
+import queue
+import sqlite3
+import threading
+from typing import Callable, List, Optional
+
+
+class SQLitePool:
+    """
+    A small pool of long-lived sqlite3 connections.
+
+    Connections are opened lazily, kept open between operations and handed
+    out to one thread at a time. Borrowing is re-entrant per thread: nested
+    borrows on the same thread return the connection that thread already
+    holds, which lets one op_ method call another without opening a second
+    connection.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 30.0, cached_statements: int = 128,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None):
+        # an in-memory database only exists inside the connection that created it,
+        # so every borrower has to share the very same connection
+        if db_path == ":memory:":
+            size = 1
+
+        self._db_path = db_path
+        self._size = size
+        self._timeout = timeout
+        self._cached_statements = cached_statements
+        self._on_connect = on_connect
+
+        self._idle = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._retired = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def open_connections(self) -> int:
+        return len(self._all)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self._db_path,
+                                     timeout=self._timeout,
+                                     check_same_thread=False,
+                                     isolation_level=None,
+                                     cached_statements=self._cached_statements)
+        if self._on_connect is not None:
+            self._on_connect(connection)
+        return connection
+
+    def current(self) -> Optional[sqlite3.Connection]:
+        """Return the connection held by the calling thread, if any."""
+        return getattr(self._local, "connection", None)
+
+    def depth(self) -> int:
+        """Return how many nested borrows the calling thread currently holds."""
+        return getattr(self._local, "depth", 0)
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Borrow a connection for the calling thread.
+
+        Returns:
+            The connection the calling thread should use until release()
+        """
+        if self.depth() > 0:
+            self._local.depth += 1
+            return self._local.connection
+
+        connection = None
+        with self._lock:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                if len(self._all) < self._size:
+                    connection = self._connect()
+                    self._all.append(connection)
+
+        if connection is None:
+            try:
+                connection = self._idle.get(timeout=self._timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No database connection available after {self._timeout}s")
+
+        self._local.connection = connection
+        self._local.depth = 1
+        return connection
+
+    def release(self) -> None:
+        """Return the calling thread's connection once its outermost borrow ends."""
+        if self.depth() == 0:
+            return
+
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+
+        connection = self._local.connection
+        self._local.connection = None
+
+        if connection.in_transaction:
+            # never hand out a connection with a half-finished transaction
+            connection.rollback()
+
+        with self._lock:
+            if id(connection) in self._retired:
+                # the pool was closed while this connection was borrowed
+                self._retired.discard(id(connection))
+                connection.close()
+                return
+        self._idle.put(connection)
+
+    def close(self) -> None:
+        """Close every idle connection; borrowed ones are closed on release."""
+        with self._lock:
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            for connection in idle:
+                connection.close()
+            self._retired.update(id(c) for c in self._all if c not in idle)
+            self._all = []
@@ -0,0 +1,324 @@
+"""
+Registry of the named SQL statements used by SQLLiteHandler.
+
+Statements are written once with {p} as the table prefix placeholder (e.g.
+{p}_users). The registry renders them for a db_salt the first time they are
+needed and afterwards hands out the very same string objects, so the sqlite3
+statement cache of a connection finds every statement again instead of
+re-preparing it. It also counts executions and cumulative execution time per
+statement.
+"""
+import threading
+from typing import Dict, List
+
+
+def _rollup_upsert(condition: str) -> str:
+    """
+    Build the statement adding the items matching condition, multiplied by
+    :sign (1 to add, -1 to remove), to their monthly rollups in {p}_aggregates.
+    Every item counts towards the project, each of its labels, its buyer and
+    the user it was bought for; see functions/rollups.py.
+    """
+    return """WITH src AS (
+            SELECT project_id, price_final, bought_by_id, bought_for_id, tags,
+                   substr(bought_date, 1, 7) || '-01' AS begin
+            FROM {p}_items
+            WHERE """ + condition + """
+        ), dims AS (
+            SELECT project_id, begin, price_final, 0 AS aggregate_type,
+                   'project' AS aggregate_name, 0 AS user_id FROM src
+            UNION ALL
+            SELECT project_id, begin, price_final, 1, 'label:' || j.value, 0
+                FROM src, json_each(src.tags) AS j
+            UNION ALL
+            SELECT project_id, begin, price_final, 2, 'user:' || bought_by_id, bought_by_id FROM src
+            UNION ALL
+            SELECT project_id, begin, price_final, 3, 'user:' || bought_for_id, bought_for_id FROM src
+        )
+        INSERT INTO {p}_aggregates
+            (aggregate_uuid, user_id, project_id, begin, interval_seconds, aggregate_type,
+             aggregate_name, aggregate_description, aggregate_info)
+        SELECT lower(hex(randomblob(16))), user_id, project_id, begin,
+               CAST(round((julianday(begin, '+1 month') - julianday(begin)) * 86400) AS INTEGER),
+               aggregate_type, aggregate_name, 'monthly rollup',
+               json_object('count', :sign * COUNT(*), 'sum', round(:sign * SUM(price_final), 2))
+        FROM dims
+        GROUP BY project_id, aggregate_type, aggregate_name, begin
+        ON CONFLICT (project_id, aggregate_type, aggregate_name, begin, interval_seconds)
+        DO UPDATE SET aggregate_info = json_set(aggregate_info,
+            '$.count', json_extract(aggregate_info, '$.count') + json_extract(excluded.aggregate_info, '$.count'),
+            '$.sum', round(json_extract(aggregate_info, '$.sum') + json_extract(excluded.aggregate_info, '$.sum'), 2))"""
+
+
+STATEMENTS = {
+    # users
+    "users.count": "SELECT COUNT(*) FROM {p}_users",
+    "users.insert": """INSERT INTO {p}_users
+        (first_name, last_name, username, birthday, email, password_hash,
+         activated, is_superuser, scope, max_projects, unique_identifier)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+    "users.login": """SELECT user_id FROM {p}_users
+        WHERE (username = ? OR email = ?) AND password_hash = ? AND activated = 1""",
+    "users.info": """SELECT user_id, first_name, last_name, username, email, birthday,
+        activated, is_superuser, scope, max_projects, unique_identifier
+        FROM {p}_users WHERE user_id = ?""",
+    "users.max_projects": "SELECT max_projects FROM {p}_users WHERE user_id = ?",
+    "users.exists": "SELECT user_id FROM {p}_users WHERE user_id = ?",
+    "users.all_ids": "SELECT user_id FROM {p}_users",
+
+    # sessions
+    "sessions.all": "SELECT * FROM {p}_session_table",
+    "sessions.insert": """INSERT INTO {p}_session_table
+        (user_id, session_start, session_uuid, session_type)
+        VALUES (?, ?, ?, ?)""",
+    "sessions.delete_by_user": "DELETE FROM {p}_session_table WHERE user_id = ?",
+    "sessions.delete_by_uuid": "DELETE FROM {p}_session_table WHERE session_uuid = ?",
+    # session, user and projects of the user in one round trip: one row per
+    # project (a single row with NULL project columns without projects)
+    "sessions.context": """SELECT (SELECT COUNT(*) FROM {p}_session_table),
+        s.session_uuid, s.session_start, s.session_type,
+        u.user_id, u.first_name, u.last_name, u.username, u.email, u.birthday,
+        u.activated, u.is_superuser, u.scope, u.max_projects, u.unique_identifier,
+        p.project_id, p.name, p.description, p.created_at,
+        p.currency_main, p.currency_list, p.project_hash,
+        upm.project_primary, upm.project_perm_model
+        FROM {p}_session_table s
+        JOIN {p}_users u ON u.user_id = s.user_id
+        LEFT JOIN ({p}_user_project_map upm JOIN {p}_projects p ON p.project_id = upm.project_id)
+            ON upm.user_id = u.user_id
+        ORDER BY s.session_id, upm.project_id""",
+
+    # projects and memberships
+    "projects.of_user": """SELECT p.project_id, p.name, p.description, p.created_at,
+        p.currency_main, p.currency_list, p.project_hash,
+        upm.project_primary, upm.project_perm_model
+        FROM {p}_projects p
+        JOIN {p}_user_project_map upm ON p.project_id = upm.project_id
+        WHERE upm.user_id = ?""",
+    "projects.insert": """INSERT INTO {p}_projects
+        (name, description, created_at, currency_main, currency_list, project_hash)
+        VALUES (?, ?, ?, ?, ?, ?)""",
+    "projects.exists": "SELECT project_id FROM {p}_projects WHERE project_id = ?",
+    "projects.hash_fields": "SELECT name, description, currency_main FROM {p}_projects WHERE project_id = ?",
+    "projects.currency_main": "SELECT currency_main FROM {p}_projects WHERE project_id = ?",
+    "memberships.count_of_user": "SELECT COUNT(*) FROM {p}_user_project_map WHERE user_id = ?",
+    "memberships.find": "SELECT id FROM {p}_user_project_map WHERE user_id = ? AND project_id = ?",
+    "memberships.users_of_project": "SELECT user_id FROM {p}_user_project_map WHERE project_id = ?",
+    "memberships.insert": """INSERT INTO {p}_user_project_map
+        (user_id, project_id, created_at, project_perm_model, project_primary)
+        VALUES (?, ?, ?, ?, ?)""",
+
+    # labels
+    "labels.of_project": """SELECT label_id, name, description, created_at, composite,
+        label_status, label_type
+        FROM {p}_labels
+        WHERE project_id = ?
+        ORDER BY name""",
+    "labels.find_by_name": "SELECT label_id FROM {p}_labels WHERE name = ? AND project_id = ?",
+    "labels.exists": "SELECT label_id FROM {p}_labels WHERE label_id = ?",
+    "labels.insert": """INSERT INTO {p}_labels
+        (name, description, created_at, project_id, composite, label_status, label_type)
+        VALUES (?, ?, ?, ?, ?, ?, ?)""",
+    "labels.delete": "DELETE FROM {p}_labels WHERE label_id = ?",
+    "labels.soft_delete": "UPDATE {p}_labels SET label_status = 0 WHERE label_id = ?",
+    "labels.composite": "SELECT project_id, composite FROM {p}_labels WHERE label_id = ?",
+    "labels.set_composite": "UPDATE {p}_labels SET composite = ? WHERE label_id = ?",
+
+    # label hierarchy: the closure table counts the paths of each length from
+    # an ancestor to a descendant, so edges can be added and removed exactly
+    "label_closure.insert_self": """INSERT OR IGNORE INTO {p}_label_closure
+        (ancestor_id, descendant_id, depth, paths) VALUES (?, ?, 0, 1)""",
+    "label_closure.reaches": """SELECT 1 FROM {p}_label_closure
+        WHERE ancestor_id = ? AND descendant_id = ? LIMIT 1""",
+    "label_closure.add_edge": """INSERT INTO {p}_label_closure (ancestor_id, descendant_id, depth, paths)
+        SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1, SUM(a.paths * d.paths)
+        FROM {p}_label_closure AS a, {p}_label_closure AS d
+        WHERE a.descendant_id = :parent AND d.ancestor_id = :child
+        GROUP BY a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+        ON CONFLICT (ancestor_id, descendant_id, depth) DO UPDATE SET paths = paths + excluded.paths""",
+    "label_closure.remove_edge": """WITH delta AS (
+            SELECT a.ancestor_id AS ancestor_id, d.descendant_id AS descendant_id,
+                   a.depth + d.depth + 1 AS depth, SUM(a.paths * d.paths) AS paths
+            FROM {p}_label_closure AS a, {p}_label_closure AS d
+            WHERE a.descendant_id = :parent AND d.ancestor_id = :child
+            GROUP BY 1, 2, 3
+        )
+        UPDATE {p}_label_closure SET paths = {p}_label_closure.paths - delta.paths
+        FROM delta
+        WHERE {p}_label_closure.ancestor_id = delta.ancestor_id
+          AND {p}_label_closure.descendant_id = delta.descendant_id
+          AND {p}_label_closure.depth = delta.depth""",
+    "label_closure.prune": "DELETE FROM {p}_label_closure WHERE paths <= 0",
+    "label_closure.parents": """SELECT ancestor_id FROM {p}_label_closure
+        WHERE descendant_id = ? AND depth = 1""",
+    "label_closure.delete_label": """DELETE FROM {p}_label_closure
+        WHERE ancestor_id = ? OR descendant_id = ?""",
+    "label_closure.descendants": """SELECT descendant_id, MIN(depth) FROM {p}_label_closure
+        WHERE ancestor_id = ?
+        GROUP BY descendant_id
+        ORDER BY 2, 1""",
+    "label_closure.ancestors": """SELECT ancestor_id, MIN(depth) FROM {p}_label_closure
+        WHERE descendant_id = ?
+        GROUP BY ancestor_id
+        ORDER BY 2, 1""",
+    "label_closure.rollup": """SELECT COUNT(*), round(COALESCE(SUM(price_final), 0), 2)
+        FROM {p}_items
+        WHERE item_id IN (
+            SELECT il.item_id
+            FROM {p}_label_closure AS c
+            JOIN {p}_item_labels AS il ON il.label_id = c.descendant_id
+            WHERE c.ancestor_id = ? AND il.project_id = ? AND il.bought_date >= ? AND il.bought_date < ?
+        )""",
+
+    # items
+    "items.insert": """INSERT INTO {p}_items
+        (item_uuid, name, note, price, price_final, currency, currency_final,
+         bought_date, bought_by_id, bought_for_id, added_by_id, project_id,
+         exchange_rate, exchange_rate_date, tags)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+    # highest item_id ever handed out (AUTOINCREMENT never reuses IDs)
+    "items.last_id": "SELECT seq FROM sqlite_sequence WHERE name = '{p}_items'",
+    "items.existing_uuids": """SELECT item_uuid FROM {p}_items
+        WHERE item_uuid IN (SELECT value FROM json_each(?))""",
+    "items.get": """SELECT item_id, item_uuid, name, note, price, price_final, currency, currency_final,
+        bought_date, bought_by_id, bought_for_id, added_by_id, project_id,
+        exchange_rate, exchange_rate_date, tags, created_at
+        FROM {p}_items WHERE item_id = ?""",
+    "items.update": """UPDATE {p}_items
+        SET item_uuid = ?, name = ?, note = ?, price = ?, price_final = ?, currency = ?,
+            currency_final = ?, bought_date = ?, bought_by_id = ?, bought_for_id = ?,
+            added_by_id = ?, project_id = ?, exchange_rate = ?, exchange_rate_date = ?, tags = ?
+        WHERE item_id = ?""",
+    "items.delete": "DELETE FROM {p}_items WHERE item_id = ?",
+
+    # monthly rollups
+    "aggregates.add_item_range": _rollup_upsert("item_id > :first_id AND item_id <= :last_id"),
+    "aggregates.add_item": _rollup_upsert("item_id = :item_id"),
+    "aggregates.add_project": _rollup_upsert("project_id = :project_id"),
+    "aggregates.prune": """DELETE FROM {p}_aggregates
+        WHERE project_id = ? AND json_extract(aggregate_info, '$.count') <= 0""",
+    "aggregates.delete_project": "DELETE FROM {p}_aggregates WHERE project_id = ?",
+    "aggregates.count_project": "SELECT COUNT(*) FROM {p}_aggregates WHERE project_id = ?",
+    "aggregates.of_type": """SELECT begin, aggregate_name,
+        json_extract(aggregate_info, '$.count'), json_extract(aggregate_info, '$.sum')
+        FROM {p}_aggregates
+        WHERE project_id = ? AND aggregate_type = ? AND begin >= ? AND begin < ?
+        ORDER BY begin, aggregate_name""",
+    "projects.all_ids": "SELECT project_id FROM {p}_projects",
+
+    # report columns of functions/analytics.py, in item_id pages
+    "analytics.item_columns": """SELECT item_id, price_final, CAST(strftime('%s', bought_date) AS INTEGER),
+        bought_by_id, bought_for_id
+        FROM {p}_items
+        WHERE project_id = :project_id AND item_id > :after_item_id
+          AND bought_date >= :since AND bought_date < :until
+        ORDER BY item_id LIMIT :limit""",
+    "analytics.item_tags": """SELECT item_id, label_id FROM {p}_item_labels
+        WHERE project_id = :project_id AND item_id > :after_item_id AND item_id <= :last_item_id
+          AND bought_date >= :since AND bought_date < :until
+        ORDER BY item_id, label_id""",
+
+    # change log and watermarks of the delta sync
+    "changes.since": """SELECT c.change_seq, c.item_uuid, c.deleted, c.changed_at,
+        i.item_uuid, i.name, i.note, i.price, i.price_final, i.currency, i.currency_final,
+        i.bought_date, i.bought_by_id, i.bought_for_id, i.added_by_id, i.project_id,
+        i.exchange_rate, i.exchange_rate_date, i.tags
+        FROM {p}_changes AS c LEFT JOIN {p}_items AS i ON i.item_uuid = c.item_uuid
+        WHERE c.project_id = ? AND c.change_seq > ?
+        ORDER BY c.change_seq LIMIT ?""",
+    "changes.unsynced": """SELECT c.change_seq, c.item_uuid, c.deleted, c.changed_at,
+        i.item_uuid, i.name, i.note, i.price, i.price_final, i.currency, i.currency_final,
+        i.bought_date, i.bought_by_id, i.bought_for_id, i.added_by_id, i.project_id,
+        i.exchange_rate, i.exchange_rate_date, i.tags
+        FROM {p}_changes AS c LEFT JOIN {p}_items AS i ON i.item_uuid = c.item_uuid
+        WHERE c.synced = 0 AND c.project_id = ? AND c.change_seq > ?
+        ORDER BY c.change_seq LIMIT ?""",
+    "changes.of_uuid": """SELECT c.change_seq, c.item_uuid, c.deleted, c.changed_at,
+        i.item_uuid, i.name, i.note, i.price, i.price_final, i.currency, i.currency_final,
+        i.bought_date, i.bought_by_id, i.bought_for_id, i.added_by_id, i.project_id,
+        i.exchange_rate, i.exchange_rate_date, i.tags, i.item_id
+        FROM {p}_changes AS c LEFT JOIN {p}_items AS i ON i.item_uuid = c.item_uuid
+        WHERE c.item_uuid = ?""",
+    "changes.insert_deleted": """INSERT OR REPLACE INTO {p}_changes (item_uuid, project_id, deleted, changed_at)
+        VALUES (?, ?, 1, ?)""",
+    "changes.restamp": "UPDATE {p}_changes SET changed_at = ?, synced = ? WHERE item_uuid = ?",
+    "changes.mark_synced": """UPDATE {p}_changes SET synced = 1
+        WHERE change_seq IN (SELECT value FROM json_each(?))""",
+    "changes.mark_unsynced": "UPDATE {p}_changes SET synced = 0 WHERE item_uuid = ?",
+    "changes.projects": "SELECT DISTINCT project_id FROM {p}_changes ORDER BY project_id",
+    "sync_state.get": "SELECT value FROM {p}_sync_state WHERE name = ?",
+    "sync_state.set": "INSERT OR REPLACE INTO {p}_sync_state (name, value) VALUES (?, ?)",
+
+    # exchange rates, "1 base = rate quote"
+    "rates.upsert": """INSERT OR REPLACE INTO {p}_exchange_rates
+        (base, quote, rate_date, rate, source) VALUES (?, ?, ?, ?, ?)""",
+    "rates.as_of": """SELECT rate FROM {p}_exchange_rates
+        WHERE base = ? AND quote = ? AND rate_date <= ?
+        ORDER BY rate_date DESC LIMIT 1""",
+    "rates.series": """SELECT rate_date, rate FROM {p}_exchange_rates
+        WHERE base = ? AND quote = ? ORDER BY rate_date""",
+    "rates.bases": "SELECT DISTINCT base FROM {p}_exchange_rates",
+}
+
+
+class StatementRegistry:
+    """Renders the named statements per db_salt and keeps execution statistics."""
+
+    def __init__(self, statements: Dict[str, str] = None):
+        self._statements = dict(STATEMENTS if statements is None else statements)
+        self._rendered: Dict[str, Dict[str, str]] = {}
+        self._stats: Dict[str, List] = {name: [0, 0.0] for name in self._statements}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def names(self) -> List[str]:
+        return list(self._statements)
+
+    def sql(self, name: str, db_salt: str) -> str:
+        """
+        Return the statement called name for the tables of db_salt.
+
+        Args:
+            name: Name of the statement, e.g. "users.info"
+            db_salt: Table prefix salt of the handler
+
+        Returns:
+            The SQL text; the same object is returned on every call
+        """
+        rendered = self._rendered.get(db_salt)
+        if rendered is None:
+            prefix = f"p{db_salt}"
+            rendered = {key: text.format(p=prefix) for key, text in self._statements.items()}
+            self._rendered[db_salt] = rendered
+        try:
+            return rendered[name]
+        except KeyError:
+            raise KeyError(f"Unknown statement '{name}'")
+
+    def record(self, name: str, seconds: float) -> None:
+        """Count one execution of a statement and add its duration."""
+        with self._lock:
+            entry = self._stats[name]
+            entry[0] += 1
+            entry[1] += seconds
+
+    def stats(self) -> List[Dict]:
+        """
+        Return the execution statistics of all statements that ran at least once,
+        the ones with the highest cumulative time first.
+        """
+        with self._lock:
+            snapshot = [(name, count, total) for name, (count, total) in self._stats.items() if count]
+        snapshot.sort(key=lambda entry: entry[2], reverse=True)
+        return [{
+            "statement": name,
+            "count": count,
+            "total_ms": round(total * 1000, 3),
+            "mean_ms": round(total * 1000 / count, 3),
+        } for name, count, total in snapshot]
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {name: [0, 0.0] for name in self._statements}
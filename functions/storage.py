@@ -0,0 +1,122 @@
+from typing import Any, Dict, Tuple
+import sqlite3
+
+# Built-in SQLite performance profiles. config.yml can override single values
+# of these profiles or add new ones in its "storage: profiles:" section.
+STORAGE_PROFILES = {
+    # stock SQLite behaviour: rollback journal and an fsync on every commit
+    "safe": {
+        "journal_mode": "delete",
+        "synchronous": "full",
+        "cache_size": -2000,  # negative values are KiB, i.e. 2 MB
+        "mmap_size": 0,
+        "temp_store": "default",
+        "busy_timeout": 5000,
+    },
+    # write-ahead log, fsync only at checkpoints; survives application crashes
+    "balanced": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -16000,
+        "mmap_size": 67108864,  # 64 MB
+        "temp_store": "memory",
+        "busy_timeout": 5000,
+    },
+    # bulk imports: no fsync at all, a power loss may lose the last commits
+    "throughput": {
+        "journal_mode": "wal",
+        "synchronous": "off",
+        "cache_size": -65536,
+        "mmap_size": 268435456,  # 256 MB
+        "temp_store": "memory",
+        "busy_timeout": 10000,
+    },
+}
+
+DEFAULT_STORAGE_PROFILE = "safe"
+
+# PRAGMA values cannot be bound as parameters, so every value is checked
+# against these before it is put into a statement
+_ENUM_PRAGMAS = {
+    "journal_mode": ["delete", "truncate", "persist", "memory", "wal", "off"],
+    "synchronous": ["off", "normal", "full", "extra"],
+    "temp_store": ["default", "file", "memory"],
+}
+_INT_PRAGMAS = ["cache_size", "mmap_size", "busy_timeout"]
+
+# journal_mode first: it can only be changed outside of a transaction and
+# determines what synchronous=normal means
+PRAGMA_ORDER = ["journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout"]
+
+
+def validate_pragmas(pragmas: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Check the PRAGMA settings of a storage profile.
+
+    Args:
+        pragmas: Dictionary of PRAGMA name to value
+
+    Returns:
+        A normalized copy of the settings (enum values lower-cased, integers as int)
+    """
+    validated = {}
+    for name, value in pragmas.items():
+        if name in _ENUM_PRAGMAS:
+            if value is False:
+                # YAML reads an unquoted off as a boolean
+                value = "off"
+            value = str(value).lower()
+            if value not in _ENUM_PRAGMAS[name]:
+                raise ValueError(f"Invalid value '{value}' for storage setting '{name}', "
+                                 f"expected one of {_ENUM_PRAGMAS[name]}")
+        elif name in _INT_PRAGMAS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Storage setting '{name}' must be an integer, got '{value}'")
+        else:
+            raise ValueError(f"Unknown storage setting '{name}'")
+        validated[name] = value
+    return validated
+
+
+def resolve_storage_profile(storage_config: Dict[str, Any] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Resolve the active storage profile from the "storage" section of config.yml.
+
+    Args:
+        storage_config: The "storage" section, e.g.
+            {"profile": "balanced", "profiles": {"balanced": {"cache_size": -32000}}}
+
+    Returns:
+        The profile name and its validated PRAGMA settings
+    """
+    storage_config = storage_config or {}
+    name = storage_config.get("profile", DEFAULT_STORAGE_PROFILE)
+
+    profiles = {key: dict(value) for key, value in STORAGE_PROFILES.items()}
+    for key, overrides in (storage_config.get("profiles") or {}).items():
+        profiles.setdefault(key, {}).update(overrides or {})
+
+    if name not in profiles:
+        raise ValueError(f"Unknown storage profile '{name}', available: {sorted(profiles)}")
+
+    return name, validate_pragmas(profiles[name])
+
+
+def apply_pragmas(connection: sqlite3.Connection, pragmas: Dict[str, Any]) -> None:
+    """Apply validated PRAGMA settings to a freshly opened connection."""
+    for name in PRAGMA_ORDER:
+        if name in pragmas:
+            connection.execute(f"PRAGMA {name} = {pragmas[name]}").fetchall()
+
+
+def read_pragmas(connection: sqlite3.Connection) -> Dict[str, Any]:
+    """Read back the PRAGMA settings that are actually in effect on a connection."""
+    synchronous = ["off", "normal", "full", "extra"]
+    temp_store = ["default", "file", "memory"]
+
+    values = {name: connection.execute(f"PRAGMA {name}").fetchone()[0] for name in PRAGMA_ORDER}
+    values["synchronous"] = synchronous[values["synchronous"]]
+    values["temp_store"] = temp_store[values["temp_store"]]
+    return values
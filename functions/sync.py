@@ -0,0 +1,198 @@
+"""
+Incremental delta sync of the items between a local replica and the server.
+
+In hybrid mode the app works on a full local copy of the database
+(data.sqlite), so every read runs at local speed. DeltaSync exchanges only
+the items that changed since the last sync with the server (a HandlerApi),
+so the cost of a sync grows with the number of changes and not with the
+size of the ledger.
+
+Every database logs its item changes in {p}_changes (see database/schema.sql):
+one row per item_uuid with an increasing change_seq, the UTC time of the
+change and whether it was a delete. A sync of a project
+
+1. pushes the local changes not yet known to the server (synced = 0) with
+   op_sync_apply(), and marks them synced,
+2. pulls the server changes after the last pulled change_seq (a watermark
+   kept in {p}_sync_state) page by page with op_sync_changes(), applies
+   them locally and moves the watermark in the same transaction.
+
+Conflicts are resolved the same way on both sides: the change with the
+higher change_version() wins, i.e. the later changed_at, then a delete over
+an edit, then the higher digest of the item. Applied changes keep their
+original changed_at. Large request bodies are sent gzip compressed, and
+responses come compressed when the server supports it.
+
+Only items are synced; they are the one table identified by a UUID. Users,
+projects and labels keep the server's IDs, so the replica must have been set
+up with the same ones (e.g. from a copy of the server database).
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from functions.items import ITEM_COLUMNS
+
+# number of changes per op_sync_changes() page
+SYNC_PAGE_SIZE = 500
+
+
+def change_row_to_dict(row: Sequence) -> Dict[str, Any]:
+    """
+    Convert a row of the "changes.*" statements (change_seq, item_uuid,
+    deleted, changed_at and the ITEM_COLUMNS of the item) into a change
+    dictionary. item is None for deleted items.
+    """
+    seq, item_uuid, deleted, changed_at = row[:4]
+    values = row[4:4 + len(ITEM_COLUMNS)]
+    item = dict(zip(ITEM_COLUMNS, values)) if not deleted and values[0] is not None else None
+    return {"seq": seq, "item_uuid": item_uuid, "deleted": bool(deleted) or item is None,
+            "changed_at": changed_at, "item": item}
+
+
+def change_version(change: Dict[str, Any]) -> Tuple[str, bool, str]:
+    """
+    Sort key deciding which of two changes of an item wins: the later
+    changed_at, then a delete, then the higher digest of the item values.
+    Both sides of a sync compute the same order, so they end up equal.
+    """
+    item = change.get("item")
+    digest = hashlib.sha256(json.dumps(item, sort_keys=True).encode("utf-8")).hexdigest() if item else ""
+    return change["changed_at"], bool(change["deleted"]), digest
+
+
+class DeltaSync:
+    """
+    Two-way sync of the items between a local SQLLiteHandler and a remote
+    handler (a HandlerApi, or any handler with the op_sync_ methods).
+
+    Args:
+        local: Handler of the local replica
+        remote: Handler of the server
+        project_ids: Projects to sync (default: all projects with changes on either side)
+        page_size: Number of changes per request
+        name: Name of the server in the watermarks (default: the remote's base_url)
+    """
+
+    def __init__(self, local, remote, project_ids: Optional[Iterable[int]] = None,
+                 page_size: int = SYNC_PAGE_SIZE, name: Optional[str] = None):
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        self.local = local
+        self.remote = remote
+        self.project_ids = None if project_ids is None else list(project_ids)
+        self.page_size = page_size
+        self.name = name or getattr(remote, "base_url", "remote")
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _watermark(self, project_id: int) -> str:
+        return f"pull:{self.name}:{project_id}"
+
+    def push(self, project_id: int) -> Dict[str, int]:
+        """Send the unsynced local changes of a project; returns the changes applied and lost to conflicts."""
+        applied = conflicts = 0
+        after = 0
+        while True:
+            page = self.local.op_sync_changes(project_id, after, self.page_size, unsynced=True)
+            if not page["changes"]:
+                break
+            result = self.remote.op_sync_apply(project_id, page["changes"])
+            if result["conflicts"]:
+                # the server has newer versions of these items: take them
+                self.local.op_sync_apply(project_id, result["conflicts"], synced=True)
+            self.local.op_sync_mark_synced([change["seq"] for change in page["changes"]])
+            applied += result["applied"]
+            conflicts += len(result["conflicts"])
+            after = page["next_seq"]
+            if not page["more"]:
+                break
+        return {"pushed": applied, "push_conflicts": conflicts}
+
+    def pull(self, project_id: int) -> Dict[str, int]:
+        """Apply the server changes of a project after the watermark; returns the changes applied."""
+        watermark = self._watermark(project_id)
+        since = self.local.op_sync_watermark(watermark)
+        applied = conflicts = 0
+        while True:
+            page = self.remote.op_sync_changes(project_id, since, self.page_size)
+            if not page["changes"]:
+                break
+            result = self.local.op_sync_apply(project_id, page["changes"], synced=True,
+                                              watermark=[watermark, page["next_seq"]])
+            applied += result["applied"]
+            conflicts += len(result["conflicts"])
+            since = page["next_seq"]
+            if not page["more"]:
+                break
+        return {"pulled": applied, "pull_conflicts": conflicts}
+
+    def sync_project(self, project_id: int) -> Dict[str, Any]:
+        """Push, then pull the changes of one project."""
+        start = time.perf_counter()
+        with self._lock:
+            result = self.push(project_id)
+            result.update(self.pull(project_id))
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    def projects(self) -> List[int]:
+        if self.project_ids is not None:
+            return self.project_ids
+        return sorted(set(self.local.op_sync_projects()) | set(self.remote.op_sync_projects()))
+
+    def sync(self) -> Dict[str, Any]:
+        """
+        Sync all projects.
+
+        Returns:
+            Dictionary with the totals pushed, pulled and conflicts, the
+            per-project results (projects) and seconds
+        """
+        start = time.perf_counter()
+        projects = {project_id: self.sync_project(project_id) for project_id in self.projects()}
+        result = {
+            "pushed": sum(r["pushed"] for r in projects.values()),
+            "pulled": sum(r["pulled"] for r in projects.values()),
+            "conflicts": sum(r["push_conflicts"] + r["pull_conflicts"] for r in projects.values()),
+            "projects": projects,
+            "seconds": time.perf_counter() - start,
+        }
+        self.last_result = result
+        return result
+
+    def request_sync(self) -> None:
+        """Let the background thread sync right away, e.g. after a local write."""
+        self._wakeup.set()
+
+    def start(self, interval: float = 30.0) -> None:
+        """Sync in a background thread every interval seconds and on request_sync()."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+
+        def run():
+            while not self._stopping.is_set():
+                try:
+                    self.sync()
+                except Exception as e:
+                    # e.g. the server is not reachable; the next pass tries again
+                    self.last_result = {"error": f"{type(e).__name__}: {e}"}
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+
+        self._thread = threading.Thread(target=run, name="fiwa-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the background sync; changes not yet synced stay in the change log."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            thread.join(timeout)
@@ -0,0 +1,185 @@
+"""
+Single writer thread with group commit.
+
+SQLite allows one writer at a time. When several threads (UI edits, imports,
+web requests) write through their own connections, they queue up on the
+database lock, each pays a full commit, and under load some give up with
+"database is locked".
+
+SingleWriter funnels the writes through one thread instead. The thread owns
+one pooled connection and takes operations off a queue. It runs everything
+that is queued within a short latency window (up to max_batch operations)
+in one transaction. Each operation gets its own savepoint, so a failing
+operation only rolls back its own changes and fails its own future, and
+the batch is committed at once. Many concurrent writes therefore share one
+commit and one fsync.
+
+Once SQLLiteHandler.start_writer() has been called, the op_ methods marked
+with @write_op are routed through the writer transparently. A caller outside
+a transaction blocks until its operation is committed. Code that needs the
+future itself uses SingleWriter.submit(), and async code uses asubmit() or
+the AsyncHandler facade.
+"""
+import asyncio
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+_STOP = object()
+
+
+def write_op(func):
+    """
+    Mark an op_ method as a write. While the handler's writer runs, calls from
+    other threads are executed by the writer thread and wait for the commit;
+    calls inside a transaction() of the caller run directly, as before.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        writer = self._writer
+        if writer is None or not writer.running or writer.is_writer_thread() or self.in_transaction():
+            return func(self, *args, **kwargs)
+        return writer.submit(func.__name__, *args, **kwargs).result()
+
+    wrapper._write_op = True
+    return wrapper
+
+
+class SingleWriter:
+    """
+    Writer thread of one SQLLiteHandler.
+
+    Args:
+        handler: The SQLLiteHandler to write through
+        max_batch: Maximum number of operations committed together
+        max_delay: Seconds to wait for more operations after the first one of a
+            batch; 0 commits whatever is queued right away
+    """
+
+    def __init__(self, handler, max_batch: int = 256, max_delay: float = 0.002):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        if max_delay < 0:
+            raise ValueError("max_delay must not be negative")
+        self._handler = handler
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"operations": 0, "failed": 0, "batches": 0, "largest_batch": 0, "commit_seconds": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def is_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="fiwa-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Commit everything already queued, then end the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, op, *args, **kwargs) -> Future:
+        """
+        Queue a write operation.
+
+        Args:
+            op: Name of an op_ method of the handler, or a callable taking the
+                handler as first argument (for several statements that must
+                succeed or fail together)
+
+        Returns:
+            Future resolved with the result of the operation once its batch is
+            committed, or with its exception
+        """
+        if self._thread is None:
+            raise RuntimeError("The writer is not running, call start() first")
+        future = Future()
+        self._queue.put((op, args, kwargs, future))
+        return future
+
+    async def asubmit(self, op, *args, **kwargs) -> Any:
+        """Awaitable version of submit()."""
+        return await asyncio.wrap_future(self.submit(op, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of operations, failed operations, batches, the largest and mean batch size."""
+        stats = dict(self._stats)
+        stats["mean_batch"] = round(stats["operations"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["commit_seconds"] = round(stats["commit_seconds"], 6)
+        return stats
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        handler = self._handler
+        # the writer keeps its connection for its whole lifetime
+        handler.load()
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = batch[-1] is _STOP
+                if stop:
+                    batch.pop()
+                if batch:
+                    self._commit(batch)
+                if stop:
+                    return
+        finally:
+            handler.close()
+
+    def _commit(self, batch: list) -> None:
+        handler = self._handler
+        done = []
+        start = time.perf_counter()
+        try:
+            with handler.transaction():
+                for op, args, kwargs, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    func = getattr(handler, op) if isinstance(op, str) else functools.partial(op, handler)
+                    try:
+                        with handler.transaction():
+                            result = func(*args, **kwargs)
+                    except BaseException as e:
+                        self._stats["failed"] += 1
+                        future.set_exception(e)
+                    else:
+                        done.append((future, result))
+        except BaseException as e:
+            # the commit itself failed: none of the batch was written
+            for future, _ in done:
+                future.set_exception(e)
+            self._stats["failed"] += len(done)
+            return
+        finally:
+            self._stats["batches"] += 1
+            self._stats["operations"] += len(batch)
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+            self._stats["commit_seconds"] += time.perf_counter() - start
+
+        for future, result in done:
+            future.set_result(result)
@@ -6,6 +6,7 @@ from textual.containers import Horizontal
 from textual.widgets import Button, Footer, Static
 from textual.reactive import reactive
 
+from functions.handler_async import AsyncHandler
 from functions.loader import load_yaml_config
 from functions.loader import setup_fiwa, get_abs_path
 from components.header import FiwaHeader
@@ -42,6 +43,15 @@ class MyApp(App):
         self._mode = mode  # "terminal" or "web"
         self.count = 0
 
+        # Open the database handler's connection pool for the lifetime of the app;
+        # it is closed again in on_unmount
+        self.app._config["dbh"].open()
+        # Screens run their queries through the async facade, off the event loop
+        self._config["adbh"] = AsyncHandler(self._config["dbh"])
+        # Hybrid mode: exchange the changed items with the server in the background
+        if self._config.get("sync") is not None:
+            self._config["sync"].start(self._config.get("sync_interval", 30.0))
+
         # Note: app_state is initialized at class level as reactive variable
         # We can update it after initialization if needed from database
         u = self.app._config["dbh"].op_get_user_sessions()
@@ -88,8 +98,27 @@ class MyApp(App):
         yield Static(str(self.app._config["dbh"].op_get_current_user()))
         yield Static(str(self.count))
         yield Static(id="user_session_info")  # Will be updated reactively
+        yield Static(id="outbox_status")  # Writes waiting for the API server (API mode)
         yield Footer()
 
+    def on_mount(self) -> None:
+        """Show the state of the offline write queue while the app runs in API mode."""
+        if getattr(self._config["dbh"], "outbox", None) is not None:
+            self.update_outbox_status()
+            self.set_interval(2.0, self.update_outbox_status)
+
+    def update_outbox_status(self) -> None:
+        """Update the number of pending and failed writes of the outbox."""
+        counts = self._config["dbh"].outbox.counts()
+        status = self.query_one("#outbox_status", Static)
+        if not counts["pending"] and not counts["failed"]:
+            status.update("All changes synced")
+            return
+        text = f"{counts['pending']} changes waiting for the server"
+        if counts["failed"]:
+            text += f", {counts['failed']} rejected"
+        status.update(text)
+
     def watch_app_state(self, new_state: dict) -> None:
         """Called automatically when app_state changes."""
         if self.is_mounted:
@@ -157,6 +186,14 @@ class MyApp(App):
         #     username = self.app_state.get("user_name", "")
         #     self.push_screen(LoginScreen(is_logged_in=is_logged_in, username=username), handle_login_result)
 
+    def on_unmount(self) -> None:
+        """Release the database handler's worker threads and pooled connections on shutdown."""
+        if self._config.get("sync") is not None:
+            self._config["sync"].stop()
+            self._config["sync"].remote.shutdown()
+        self._config["adbh"].shutdown()
+        self._config["dbh"].shutdown()
+
     def action_quit_app(self) -> None:
         """An action to quit the app."""
         self.exit(0)
@@ -1,4 +1,5 @@
 """Base screen components - Login/Logout functionality."""
+from textual import work
 from textual.screen import ModalScreen
 from textual.containers import Vertical, Horizontal
 from textual.widgets import Static, Input, Button
@@ -126,7 +127,8 @@ class LoginScreen(ModalScreen):
         elif event.button.id == "cancel-button":
             self.dismiss()
 
-    def perform_login(self) -> None:
+    @work(exclusive=True, group="session")
+    async def perform_login(self) -> None:
         """Perform login operation with backend API.
 
         This function will:
@@ -136,8 +138,8 @@ class LoginScreen(ModalScreen):
         4. Update application state
         """
 
-        k = self.app._config["dbh"]
-        total_users = k.op_total_number_of_users()
+        k = self.app._config["adbh"]
+        total_users = await k.op_total_number_of_users()
         if total_users == 0:
             self.notify("No users found in the system. Create a user first", severity="error")
             return
@@ -164,17 +166,17 @@ class LoginScreen(ModalScreen):
         # 5. Update application state (user info, projects, etc.)
         # 6. Dismiss modal and refresh main app
         try:
-            k = self.app._config["dbh"]
-            user_session = k.op_user_login(username=username, password=password)
+            user_session = await k.op_user_login(username=username, password=password)
 
             if not user_session:
                 self.notify("Invalid username or password", severity="error")
                 return
 
-            # Fetch user and project information
+            # Fetch user and project information of the new session in one query
             user_id = user_session.get("user_id", -1)
-            user_info = k.op_user_get_info(user_id)
-            project_info = k.op_project_get_info(user_id)
+            context = await k.op_session_context()
+            user_info = context.get("user_info", {})
+            project_info = context.get("project_info", [])
 
             # Extract project data
             project_names = []
@@ -224,7 +226,8 @@ class LoginScreen(ModalScreen):
             self.notify(f"Login failed: {str(e)}", severity="error")
             return
 
-    def perform_logout(self) -> None:
+    @work(exclusive=True, group="session")
+    async def perform_logout(self) -> None:
         """Perform logout operation with backend API.
 
         This function will:
@@ -242,8 +245,8 @@ class LoginScreen(ModalScreen):
         # 5. Update application state to logged-out
         # 6. Dismiss modal and redirect to login or home screen
 
-        k = self.app._config["dbh"]
-        verify = k.op_user_logout(session_uuid=self.app.app_state["session_uuid"])
+        k = self.app._config["adbh"]
+        verify = await k.op_user_logout(session_uuid=self.app.app_state["session_uuid"])
         if verify:
             # Reset ALL app_state fields to initial values (same as main.py initialization)
             self.app.app_state = {
@@ -257,7 +260,9 @@ class LoginScreen(ModalScreen):
                 "project_id": 0,
             }
             self.notify(f"Logout of User {self._username} successful!", severity="success")
-            self.dismiss(result={"success": True, "action": "logout"})
+            # the menu logs out through a LoginScreen that was never shown
+            if self.is_mounted:
+                self.dismiss(result={"success": True, "action": "logout"})
         else:
             self.notify("Logout failed. Please try again.", severity="error")
 
@@ -1,9 +1,16 @@
 """Inputs screen - add transactions and items."""
+import os
+
+from textual import work
 from textual.screen import ModalScreen
-from textual.containers import Vertical
-from textual.widgets import Static, Button
+from textual.containers import Vertical, Horizontal
+from textual.widgets import Static, Button, Input, ProgressBar
+from textual.worker import get_current_worker
 from textual.app import ComposeResult
 
+from functions.importer import import_csv, parse_mapping
+
+
 class InputsScreen(ModalScreen):
     """Inputs screen - add transactions and items."""
 
@@ -27,6 +34,32 @@ class InputsScreen(ModalScreen):
     }
 
     InputsScreen #inputs-content {
+        height: auto;
+    }
+
+    InputsScreen .section-header {
+        text-style: bold;
+        padding: 1 0 0 0;
+        color: $accent;
+    }
+
+    InputsScreen Input {
+        margin: 0 0 1 0;
+    }
+
+    InputsScreen #import-buttons {
+        height: auto;
+    }
+
+    InputsScreen #import-buttons Button {
+        width: 1fr;
+    }
+
+    InputsScreen #import-progress {
+        margin: 1 0 0 0;
+    }
+
+    InputsScreen #import-status {
         height: 1fr;
     }
 
@@ -43,12 +76,103 @@ class InputsScreen(ModalScreen):
                 "Add new transactions here.\n\n"
                 "• Add expense\n"
                 "• Add income\n"
-                "• Quick entry\n"
-                "• Import from file",
+                "• Quick entry",
                 id="inputs-content"
             )
+            yield Static("Import from file (CSV)", classes="section-header")
+            yield Input(placeholder="Path to CSV file", id="import-path")
+            yield Input(placeholder="Column mapping, e.g. name=Description, price=Amount, bought_date=Date",
+                        id="import-mapping")
+            with Horizontal(id="import-buttons"):
+                yield Button("Import", id="import-button", variant="success")
+                yield Button("Stop", id="import-stop-button", variant="error", disabled=True)
+            yield ProgressBar(total=100, id="import-progress")
+            yield Static("", id="import-status")
             yield Button("Close", id="close-button", variant="primary")
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "close-button":
+            self.workers.cancel_group(self, "import")
             self.dismiss()
+        elif event.button.id == "import-button":
+            self.start_import()
+        elif event.button.id == "import-stop-button":
+            self.workers.cancel_group(self, "import")
+            self.query_one("#import-status", Static).update("Stopping after the current batch...")
+
+    def start_import(self) -> None:
+        """Validate the import form and start the import worker."""
+        project_id = self.app.app_state.get("project_id", 0)
+        user_id = self.app.app_state.get("user_id", -1)
+        if project_id <= 0 or user_id <= 0:
+            self.app.notify("Login and select a project to import items", severity="error")
+            return
+
+        path = os.path.expanduser(self.query_one("#import-path", Input).value.strip())
+        if not path or not os.path.isfile(path):
+            self.app.notify("Please enter the path of an existing CSV file", severity="error")
+            return
+
+        try:
+            mapping = parse_mapping(self.query_one("#import-mapping", Input).value)
+        except ValueError as e:
+            self.app.notify(f"Invalid column mapping: {str(e)}", severity="error")
+            return
+
+        self.query_one("#import-button", Button).disabled = True
+        self.query_one("#import-stop-button", Button).disabled = False
+        self.query_one("#import-progress", ProgressBar).update(total=os.path.getsize(path) or 1, progress=0)
+        self.query_one("#import-status", Static).update(f"Importing {os.path.basename(path)}...")
+
+        self.run_import(path, project_id, user_id, mapping)
+
+    @work(thread=True, exclusive=True, group="import")
+    def run_import(self, path: str, project_id: int, user_id: int, mapping: dict) -> None:
+        """Import the file in a worker thread, so the UI stays interactive."""
+        worker = get_current_worker()
+        dbh = self.app._config["dbh"]
+
+        def progress(bytes_read: int, bytes_total: int, rows: int) -> None:
+            if not worker.is_cancelled:
+                self.app.call_from_thread(self._show_progress, bytes_read, bytes_total, rows)
+
+        try:
+            summary = import_csv(
+                dbh, path, project_id,
+                mapping=mapping,
+                defaults={"bought_by_id": user_id, "added_by_id": user_id},
+                progress=progress,
+                should_stop=lambda: worker.is_cancelled,
+            )
+        except Exception as e:
+            self.app.call_from_thread(self._finish_import, None, str(e))
+            return
+        self.app.call_from_thread(self._finish_import, summary, None)
+
+    def _show_progress(self, bytes_read: int, bytes_total: int, rows: int) -> None:
+        if not self.is_mounted:
+            return
+        self.query_one("#import-progress", ProgressBar).update(total=bytes_total or 1, progress=bytes_read)
+        self.query_one("#import-status", Static).update(f"{rows} items imported")
+
+    def _finish_import(self, summary: dict | None, error: str | None) -> None:
+        # the screen may have been closed while the import was running
+        if not self.is_mounted:
+            return
+        self.query_one("#import-button", Button).disabled = False
+        self.query_one("#import-stop-button", Button).disabled = True
+        status = self.query_one("#import-status", Static)
+
+        if error is not None:
+            status.update(f"[bold red]Import failed:[/bold red] {error}")
+            self.app.notify(f"Import failed: {error}", severity="error")
+            return
+
+        lines = [f"{summary['created']} items imported, {summary['skipped']} rows skipped "
+                 f"in {summary['seconds']:.1f}s"]
+        if summary["stopped"]:
+            lines.append("Import stopped; the rows above were saved.")
+        for line, message in summary["errors"][:5]:
+            lines.append(f"Line {line}: {message}")
+        status.update("\n".join(lines))
+        self.app.notify(lines[0], severity="warning" if summary["skipped"] else "information")
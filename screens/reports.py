@@ -1,9 +1,15 @@
 """Reports screen - view financial reports and analytics."""
+from datetime import date, timedelta
+
+from textual import work
 from textual.screen import ModalScreen
-from textual.containers import Vertical
+from textual.containers import Vertical, Horizontal, VerticalScroll
 from textual.widgets import Static, Button
 from textual.app import ComposeResult
 
+from functions import analytics
+
+
 class ReportsScreen(ModalScreen):
     """Reports screen - view financial reports and analytics."""
 
@@ -26,8 +32,17 @@ class ReportsScreen(ModalScreen):
         text-align: center;
     }
 
-    ReportsScreen #reports-content {
+    ReportsScreen #report-buttons {
+        height: auto;
+    }
+
+    ReportsScreen #report-buttons Button {
+        width: 1fr;
+    }
+
+    ReportsScreen #reports-scroll {
         height: 1fr;
+        margin-top: 1;
     }
 
     ReportsScreen #close-button {
@@ -36,19 +51,104 @@ class ReportsScreen(ModalScreen):
     }
     """
 
+    def __init__(self):
+        super().__init__()
+        self._columns = None
+        self._label_names = {}
+        self._report = "monthly"
+
     def compose(self) -> ComposeResult:
         with Vertical():
             yield Static("Reports", id="reports-title")
-            yield Static(
-                "View financial reports and analytics.\n\n"
-                "• Monthly report\n"
-                "• Category breakdown\n"
-                "• Spending trends\n"
-                "• Export to PDF",
-                id="reports-content"
-            )
+            with Horizontal(id="report-buttons"):
+                yield Button("Monthly report", id="report-monthly")
+                yield Button("Category breakdown", id="report-categories")
+                yield Button("Spending trends", id="report-trends")
+            with VerticalScroll(id="reports-scroll"):
+                yield Static("Loading items...", id="reports-content")
             yield Button("Close", id="close-button", variant="primary")
 
+    def on_mount(self) -> None:
+        project_id = self.app.app_state.get("project_id", 0)
+        if analytics.np is None:
+            self.query_one("#reports-content", Static).update(
+                "Reports need NumPy, install it with: pip install fiwa-cli[analytics]")
+        elif project_id <= 0:
+            self.query_one("#reports-content", Static).update("Login and select a project to see reports.")
+        else:
+            self.load_items(project_id)
+
+    @work(thread=True, exclusive=True)
+    def load_items(self, project_id: int) -> None:
+        """Load the item columns once; every report is then computed from the arrays."""
+        dbh = self.app._config["dbh"]
+        try:
+            columns = analytics.load_item_columns(dbh, project_id)
+            label_names = {label["label_id"]: label["name"] for label in dbh.op_label_get_all(project_id)}
+        except Exception as e:
+            self.app.call_from_thread(self._show_message, f"[bold red]Failed to load items:[/bold red] {str(e)}")
+            return
+        self.app.call_from_thread(self._loaded, columns, label_names)
+
+    def _show_message(self, text: str) -> None:
+        self.query_one("#reports-content", Static).update(text)
+
+    def _loaded(self, columns, label_names) -> None:
+        self._columns = columns
+        self._label_names = label_names
+        self.show_report(self._report)
+
+    def show_report(self, report: str) -> None:
+        self._report = report
+        if self._columns is None:
+            return
+        if not len(self._columns):
+            text = "No items in this project yet."
+        elif report == "monthly":
+            text = self._monthly_report()
+        elif report == "categories":
+            text = self._category_report()
+        else:
+            text = self._trends_report()
+        self.query_one("#reports-content", Static).update(text)
+
+    def _monthly_report(self) -> str:
+        monthly = analytics.monthly_totals(self._columns)
+        lines = ["[b]Monthly report[/b] (last 12 months)", ""]
+        rows = list(zip(monthly["months"], monthly["totals"], monthly["counts"]))[-12:]
+        for month, total, count in reversed(rows):
+            lines.append(f"{month}   {total:>12,.2f}   {count:>6} items")
+        return "\n".join(lines)
+
+    def _category_report(self) -> str:
+        lines = ["[b]Category breakdown[/b]", ""]
+        entries = analytics.breakdown(self._columns, by="label")
+        if not entries:
+            lines.append("No labelled items yet.")
+        for entry in entries[:20]:
+            name = self._label_names.get(entry["key"], f"Label {entry['key']}")
+            lines.append(f"{name[:24]:<24} {entry['total']:>12,.2f}  {entry['share']:>6.1%}  "
+                         f"{entry['count']:>6} items")
+        return "\n".join(lines)
+
+    def _trends_report(self) -> str:
+        # spending year to date at the start of each month, against the year before
+        today = date.today()
+        # the last edge is tomorrow, so today's items are included
+        this_year = [date(today.year, month, 1) for month in range(1, today.month + 1)] + [today + timedelta(days=1)]
+        last_year = [d.replace(year=d.year - 1) if (d.month, d.day) != (2, 29) else date(d.year - 1, 2, 28)
+                     for d in this_year]
+        current = analytics.cumulative(self._columns, this_year)
+        previous = analytics.cumulative(self._columns, last_year)
+
+        lines = [f"[b]Spending trends[/b] (year to date {today.year} vs {today.year - 1})", ""]
+        for d, now, before in zip(this_year[1:], current[1:] - current[0], previous[1:] - previous[0]):
+            change = f"{(now - before) / before:+.1%}" if before else "n/a"
+            lines.append(f"until {min(d, today).isoformat()}   {now:>12,.2f}   {before:>12,.2f}   {change:>7}")
+        return "\n".join(lines)
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "close-button":
             self.dismiss()
+        elif event.button.id and event.button.id.startswith("report-"):
+            self.show_report(event.button.id[len("report-"):])
@@ -1,4 +1,5 @@
 """Settings screen - configure application settings."""
+from textual import work
 from textual.screen import ModalScreen, Screen
 from textual.containers import Vertical, Horizontal, ScrollableContainer
 from textual.widgets import Static, Button
@@ -199,8 +200,13 @@ class SettingsScreen(ReactiveScreen):
         Handle the ProjectCreated message from CreateProjectForm.
         Creates the project in the database and updates app_state.
         """
+        self.create_project(message.project_data)
+
+    @work(exclusive=True, group="create-project")
+    async def create_project(self, project_data: dict) -> None:
+        """Create the project in a worker, so the UI keeps running meanwhile."""
         try:
-            dbh = self.app._config["dbh"]
+            adbh = self.app._config["adbh"]
             user_id = self.app.app_state.get("user_id", -1)
 
             if user_id <= 0:
@@ -208,14 +214,15 @@ class SettingsScreen(ReactiveScreen):
                 return
 
             # Create project in database
-            project_id = dbh.op_project_create(message.project_data, user_id)
+            project_id = await adbh.op_project_create(project_data, user_id)
 
             if not project_id:
                 self.notify("Failed to create project", severity="error")
                 return
 
-            # Fetch updated project list for the user
-            project_info = dbh.op_project_get_info(user_id)
+            # Fetch updated project list for the user (from the session context,
+            # which op_project_create invalidated)
+            project_info = (await adbh.op_session_context()).get("project_info", [])
 
             # Extract project data for app_state
             project_names = []
@@ -242,7 +249,7 @@ class SettingsScreen(ReactiveScreen):
             }
 
             self.notify(
-                f"Project '{message.project_data['name']}' created successfully! "
+                f"Project '{project_data['name']}' created successfully! "
                 f"You can now select it from the project menu.",
                 severity="information"
             )
@@ -250,7 +257,7 @@ class SettingsScreen(ReactiveScreen):
             # Show success message
             self.show_content(
                 "Project Created",
-                f"Successfully created: {message.project_data['name']}\n\n"
+                f"Successfully created: {project_data['name']}\n\n"
                 f"Project ID: {project_id}\n"
                 f"You can now switch to this project using the project selector."
             )
@@ -4,7 +4,7 @@ from textual.containers import Vertical, Horizontal, ScrollableContainer, Grid
 from textual.app import ComposeResult
 from textual.message import Message
 
-from textual import on
+from textual import on, work
 
 class CreateLabelForm(Vertical):
     """Widget for creating a new label."""
@@ -222,7 +222,8 @@ class CreateLabelForm(Vertical):
             self.app.log(f"Error resetting inputs: {e}")
             self.app.notify("Error resetting form fields", severity="error")
 
-    def _create_label(self) -> None:
+    @work(exclusive=True)
+    async def _create_label(self) -> None:
         """Validate and create the label."""
         project_id = self.app.app_state.get("project_id", 0)
 
@@ -260,8 +261,7 @@ class CreateLabelForm(Vertical):
 
         # Save to database
         try:
-            dbh = self.app._config["dbh"]
-            label_id = dbh.op_label_create(label_data, project_id)
+            label_id = await self.app._config["adbh"].op_label_create(label_data, project_id)
 
             self.app.log(f"Created label: {name} (ID: {label_id})")
             self.app.notify(f"Label '{name}' created successfully!", severity="information")
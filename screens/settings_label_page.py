@@ -1,4 +1,5 @@
 # settings_label_page.py
+from textual import work
 from textual.widgets import Static, Button, Input, DataTable
 from textual.containers import Vertical, Horizontal, Container, Grid
 from textual.app import ComposeResult
@@ -6,6 +7,39 @@ from textual.message import Message
 from textual.screen import ModalScreen
 from datetime import datetime
 
+async def save_label_changes(adbh, project_id: int, new_labels, modified_labels):
+    """
+    Create the new labels and apply the changes of the modified ones in one
+    op_unit_of_work() call, i.e. one commit locally and one request in API
+    mode. A failing label does not undo the others.
+
+    Args:
+        adbh: AsyncHandler of the app
+        project_id: Project the labels belong to
+        new_labels: List of label dictionaries to create
+        modified_labels: Dictionary {label_id: changes}
+
+    Returns:
+        Tuple of the number of saved changes and the error messages
+    """
+    calls = [{"op": "op_label_create", "args": [label, project_id]} for label in new_labels]
+    calls += [{"op": "op_label_update", "args": [label_id, changes]} for label_id, changes in modified_labels.items()]
+    if not calls:
+        return 0, []
+
+    results = await adbh.op_unit_of_work(calls)
+    errors = []
+    for call, result in zip(calls, results):
+        if "error" not in result:
+            continue
+        message = result["error"]["message"]
+        if call["op"] == "op_label_create":
+            errors.append(f"Failed to create '{call['args'][0]['name']}': {message}")
+        else:
+            errors.append(f"Failed to update label {call['args'][0]}: {message}")
+    return len(calls) - len(errors), errors
+
+
 class LabelEditorModal(ModalScreen):
     """Modal screen for editing label name, description, and status."""
 
@@ -364,19 +398,33 @@ class LabelManagementForm(Vertical):
 
         yield Static(f"Project: {project_name}", classes="section-header")
 
-        # Load labels from database
-        if project_id > 0:
-            try:
-                dbh = self.app._config["dbh"]
-                self._labels = dbh.op_label_get_all(project_id)
-            except Exception as e:
-                self.app.log(f"Error loading labels: {e}")
-                self._labels = []
-
-        # Labels table
+        # Labels table, filled by load_labels() once the labels are read
         yield Static("Existing Labels:", classes="section-header")
         table = DataTable(id="labels-table")
         table.add_columns("Name", "Description", "Status", "Type", "Actions")
+        yield table
+
+        # Action buttons
+        with Horizontal(id="action-buttons"):
+            yield Button("New Label", id="new-label-button")
+            yield Button("Save All Changes", id="save-button")
+            yield Button("Cancel", id="cancel-button")
+
+    def on_mount(self) -> None:
+        project_id = self.app.app_state.get("project_id", 0)
+        if project_id > 0:
+            self.query_one("#labels-table", DataTable).loading = True
+            self.load_labels(project_id)
+
+    @work(exclusive=True, group="labels")
+    async def load_labels(self, project_id: int) -> None:
+        """Load the labels from the database without blocking the UI."""
+        table = self.query_one("#labels-table", DataTable)
+        try:
+            self._labels = await self.app._config["adbh"].op_label_get_all(project_id)
+        except Exception as e:
+            self.app.log(f"Error loading labels: {e}")
+            self._labels = []
 
         # Populate table with existing labels
         # Note: We store label_id as the row key for internal reference
@@ -391,14 +439,7 @@ class LabelManagementForm(Vertical):
                 "Edit",
                 key=f"label-id-{label['label_id']}"  # Store label_id in the row key
             )
-
-        yield table
-
-        # Action buttons
-        with Horizontal(id="action-buttons"):
-            yield Button("New Label", id="new-label-button")
-            yield Button("Save All Changes", id="save-button")
-            yield Button("Cancel", id="cancel-button")
+        table.loading = False
 
     def _get_status_text(self, status: int) -> str:
         """Convert status code to text."""
@@ -559,7 +600,8 @@ class LabelManagementForm(Vertical):
             severity="information"
         )
 
-    def _save_all_changes(self) -> None:
+    @work(exclusive=True, group="labels")
+    async def _save_all_changes(self) -> None:
         """Save all changes to the database."""
         project_id = self.app.app_state.get("project_id", 0)
 
@@ -567,28 +609,15 @@ class LabelManagementForm(Vertical):
             self.app.notify("No project selected", severity="error")
             return
 
-        dbh = self.app._config["dbh"]
+        adbh = self.app._config["adbh"]
         changes_count = 0
         errors = []
+        save_button = self.query_one("#save-button", Button)
+        save_button.disabled = True
 
         try:
-            # Create new labels
-            for new_label in self._new_labels:
-                try:
-                    label_id = dbh.op_label_create(new_label, project_id)
-                    changes_count += 1
-                    self.app.log(f"Created label: {new_label['name']} (ID: {label_id})")
-                except Exception as e:
-                    errors.append(f"Failed to create '{new_label['name']}': {str(e)}")
-
-            # Update modified labels
-            for label_id, changes in self._modified_labels.items():
-                try:
-                    dbh.op_label_update(label_id, changes)
-                    changes_count += 1
-                    self.app.log(f"Updated label ID: {label_id}")
-                except Exception as e:
-                    errors.append(f"Failed to update label {label_id}: {str(e)}")
+            changes_count, errors = await save_label_changes(adbh, project_id, self._new_labels,
+                                                             self._modified_labels)
 
             # Show results
             if errors:
@@ -609,3 +638,5 @@ class LabelManagementForm(Vertical):
 
         except Exception as e:
             self.app.notify(f"Error saving changes: {str(e)}", severity="error")
+        finally:
+            save_button.disabled = False
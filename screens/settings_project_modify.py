@@ -1,4 +1,5 @@
 # settings_project_modify.py
+from textual import work
 from textual.widgets import Static, Button, Input, TextArea
 from textual.containers import Vertical, Horizontal, Grid
 from textual.app import ComposeResult
@@ -103,66 +104,20 @@ class ModifyProjectForm(Vertical):
             super().__init__()
 
     def compose(self) -> ComposeResult:
-        # Get current project information from app_state
-        project_id = self.app.app_state.get("project_id", 0)
-        user_id = self.app.app_state.get("user_id", -1)
-
-        self.app.log(f"ModifyProjectForm.compose() called: project_id={project_id}, user_id={user_id}")
-
-        # Get project details from database
-        project_info = None
-        if project_id and user_id > 0:
-            dbh = self.app._config["dbh"]
-            all_projects = dbh.op_project_get_info(user_id)
-            self.app.log(f"Retrieved {len(all_projects)} projects for user {user_id}")
-            project_info = next((p for p in all_projects if p["project_id"] == project_id), None)
-            if project_info:
-                self.app.log(f"Found project: {project_info.get('project_name', 'Unknown')}")
-            else:
-                self.app.log(f"No project found with id {project_id}")
-
+        # The fields are filled with the current values by load_project()
         yield Static("Modify Project", classes="form-title")
-
-        # Show current project name as header
-        if project_info:
-            current_name = project_info.get("project_name", "Unknown Project")
-            yield Static(f"Currently Editing: {current_name}", classes="current-project-header")
-        else:
-            yield Static("No Project Loaded", classes="current-project-header")
-
-        # Pre-fill form fields with current values
-        current_description = ""
-        current_currency_main = ""
-        current_currency_list = ""
-
-        if project_info:
-            current_description = project_info.get("description", "")
-            current_currency_main = project_info.get("currency_main", "")
-
-            # Parse currency_list (stored as JSON string)
-            currency_list_raw = project_info.get("currency_list", "[]")
-            try:
-                if isinstance(currency_list_raw, str):
-                    currency_list_parsed = json.loads(currency_list_raw)
-                else:
-                    currency_list_parsed = currency_list_raw
-                current_currency_list = ", ".join(currency_list_parsed) if currency_list_parsed else ""
-            except (json.JSONDecodeError, TypeError, ValueError) as e:
-                self.app.log(f"Error parsing currency_list: {e}")
-                current_currency_list = ""
+        yield Static("No Project Loaded", id="current-project-header", classes="current-project-header")
 
         yield Static("Project Name *", classes="form-label")
         yield Input(
             placeholder="Enter project name",
             id="project-name",
             max_length=24,
-            value=project_info.get("project_name", "") if project_info else ""
         )
 
         yield Static("Description (128 characters)", classes="form-label")
         yield TextArea(
             id="project-description",
-            text=current_description,
         )
 
         with Grid(id="project-currency-grid"):
@@ -172,25 +127,74 @@ class ModifyProjectForm(Vertical):
                 placeholder="e.g., USD, EUR, GBP",
                 id="currency-main",
                 max_length=3,
-                value=current_currency_main
             )
             yield Input(
                 placeholder="e.g., USD,EUR,JPY",
                 id="currency-list",
-                value=current_currency_list
             )
 
         with Grid(id="project-buttons"):
             yield Button("Update", id="project-update-button")
             yield Button("Cancel", id="project-cancel-button")
 
+    def on_mount(self) -> None:
+        # Get current project information from app_state
+        project_id = self.app.app_state.get("project_id", 0)
+        user_id = self.app.app_state.get("user_id", -1)
+
+        self.app.log(f"ModifyProjectForm mounted: project_id={project_id}, user_id={user_id}")
+        if project_id and user_id > 0:
+            self.loading = True
+            self.load_project(project_id, user_id)
+
+    @work(exclusive=True)
+    async def load_project(self, project_id: int, user_id: int) -> None:
+        """Get the project details from the database without blocking the UI."""
+        try:
+            all_projects = await self.app._config["adbh"].op_project_get_info(user_id)
+        except Exception as e:
+            self.app.notify(f"Error loading project: {str(e)}", severity="error")
+            all_projects = []
+        finally:
+            self.loading = False
+
+        self.app.log(f"Retrieved {len(all_projects)} projects for user {user_id}")
+        project_info = next((p for p in all_projects if p["project_id"] == project_id), None)
+        if not project_info:
+            self.app.log(f"No project found with id {project_id}")
+            return
+        self.app.log(f"Found project: {project_info.get('project_name', 'Unknown')}")
+
+        # Show current project name as header
+        current_name = project_info.get("project_name", "Unknown Project")
+        self.query_one("#current-project-header", Static).update(f"Currently Editing: {current_name}")
+
+        # Pre-fill form fields with current values
+        current_currency_list = ""
+        # Parse currency_list (stored as JSON string)
+        currency_list_raw = project_info.get("currency_list", "[]")
+        try:
+            if isinstance(currency_list_raw, str):
+                currency_list_parsed = json.loads(currency_list_raw)
+            else:
+                currency_list_parsed = currency_list_raw
+            current_currency_list = ", ".join(currency_list_parsed) if currency_list_parsed else ""
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            self.app.log(f"Error parsing currency_list: {e}")
+
+        self.query_one("#project-name", Input).value = project_info.get("project_name", "")
+        self.query_one("#project-description", TextArea).text = project_info.get("description", "") or ""
+        self.query_one("#currency-main", Input).value = project_info.get("currency_main", "") or ""
+        self.query_one("#currency-list", Input).value = current_currency_list
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "project-cancel-button":
             self.app.notify("Project modification cancelled", severity="info")
         elif event.button.id == "project-update-button":
             self.update_project()
 
-    def update_project(self) -> None:
+    @work(exclusive=True)
+    async def update_project(self) -> None:
         """Validate and update the project."""
         project_id = self.app.app_state.get("project_id", 0)
         user_id = self.app.app_state.get("user_id", -1)
@@ -226,8 +230,7 @@ class ModifyProjectForm(Vertical):
 
         # Update in database
         try:
-            dbh = self.app._config["dbh"]
-            dbh.op_project_update(project_data)
+            await self.app._config["adbh"].op_project_update(project_data)
             self.app.notify("Project updated successfully!", severity="information")
             self.post_message(self.ProjectModified(project_data))
         except ValueError as e:
@@ -1,4 +1,5 @@
 # settings_project_new.py
+from textual import work
 from textual.widgets import Static, Button, Input, TextArea
 from textual.containers import Vertical, Horizontal, ScrollableContainer, Grid
 from textual.app import ComposeResult
@@ -114,6 +115,31 @@ class CreateProjectForm(ScrollableContainer):
     def compose(self) -> ComposeResult:
         yield Static("Create New Project", classes="form-title")
 
+        # Filled in by load_project_usage() once the project limit is read
+        yield Static("ℹ Checking your project limit...", id="project-usage", classes="info-box")
+
+        yield Static("Project Name *", classes="form-label")
+        yield Input(placeholder="Enter project name", id="project-name", max_length=24)
+
+        yield Static("Description", classes="form-label")
+        yield TextArea(id="project-description")
+
+        yield Static("Main Currency (3-letter code) *", classes="form-label")
+        yield Input(placeholder="e.g., USD, EUR, GBP", id="currency-main", max_length=3)
+
+        yield Static("Additional Currencies (comma-separated)", classes="form-label")
+        yield Input(placeholder="e.g., USD,EUR,JPY", id="currency-list")
+
+        with Grid(id="action-buttons"):
+            yield Button("Create", id="project-create-button")
+            yield Button("Cancel", id="project-cancel-button")
+
+    def on_mount(self) -> None:
+        self.load_project_usage()
+
+    @work(exclusive=True, group="project-usage")
+    async def load_project_usage(self) -> None:
+        """Show how many projects the user may still create, without blocking the UI."""
         # Get user info and project count from app_state
         user_id = self.app.app_state.get("user_id", -1)
         project_ids = self.app.app_state.get("project_ids", [])
@@ -122,48 +148,31 @@ class CreateProjectForm(ScrollableContainer):
 
         if user_id > 0:
             try:
-                dbh = self.app._config["dbh"]
-                max_projects = dbh.op_get_max_projects(user_id)
+                max_projects = await self.app._config["adbh"].op_get_max_projects(user_id)
             except Exception as e:
                 # If query fails, just use default max_projects
                 pass
 
         # Display warning/info message
+        usage = self.query_one("#project-usage", Static)
+        usage.remove_class("info-box")
         if current_projects >= max_projects:
-            yield Static(
+            usage.update(
                 f"⚠ WARNING: You have reached your maximum project limit!\n"
                 f"Current projects: {user_id} {current_projects} / {max_projects}\n"
-                f"You cannot create more projects.",
-                classes="error-box"
+                f"You cannot create more projects."
             )
+            usage.add_class("error-box")
         elif current_projects >= max_projects - 1:
-            yield Static(
+            usage.update(
                 f"⚠ WARNING: You are at your project limit!\n"
                 f"Current projects: {current_projects} / {max_projects}\n"
-                f"This will be your last project.",
-                classes="warning-box"
+                f"This will be your last project."
             )
+            usage.add_class("warning-box")
         else:
-            yield Static(
-                f"ℹ Project Usage: {current_projects} / {max_projects} projects used",
-                classes="info-box"
-            )
-
-        yield Static("Project Name *", classes="form-label")
-        yield Input(placeholder="Enter project name", id="project-name", max_length=24)
-
-        yield Static("Description", classes="form-label")
-        yield TextArea(id="project-description")
-
-        yield Static("Main Currency (3-letter code) *", classes="form-label")
-        yield Input(placeholder="e.g., USD, EUR, GBP", id="currency-main", max_length=3)
-
-        yield Static("Additional Currencies (comma-separated)", classes="form-label")
-        yield Input(placeholder="e.g., USD,EUR,JPY", id="currency-list")
-
-        with Grid(id="action-buttons"):
-            yield Button("Create", id="project-create-button")
-            yield Button("Cancel", id="project-cancel-button")
+            usage.update(f"ℹ Project Usage: {current_projects} / {max_projects} projects used")
+            usage.add_class("info-box")
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "project-cancel-button":
@@ -171,7 +180,8 @@ class CreateProjectForm(ScrollableContainer):
         elif event.button.id == "project-create-button":
             self.create_project()
 
-    def create_project(self) -> None:
+    @work(exclusive=True)
+    async def create_project(self) -> None:
         """Validate and create the project."""
         user_id = self.app.app_state.get("user_id", -1)
         project_ids = self.app.app_state.get("project_ids", [])
@@ -180,8 +190,7 @@ class CreateProjectForm(ScrollableContainer):
         # Check project limit before validation
         if user_id > 0:
             try:
-                dbh = self.app._config["dbh"]
-                max_projects = dbh.op_get_max_projects(user_id)
+                max_projects = await self.app._config["adbh"].op_get_max_projects(user_id)
 
                 # Check if limit reached
                 if current_projects >= max_projects:
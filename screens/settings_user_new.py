@@ -1,4 +1,5 @@
 """User creation form widget."""
+from textual import work
 from textual.containers import Vertical, Horizontal, Grid
 from textual.widgets import Static, Input, Button
 from textual.widget import Widget
@@ -80,7 +81,8 @@ class CreateUserForm(Widget):
         elif event.button.id == "user-cancel-button":
             self.cancel()
 
-    def create_user(self) -> None:
+    @work(exclusive=True)
+    async def create_user(self) -> None:
         """Validate and create user."""
         # Get input values
         first_name = self.query_one("#first-name-input", Input).value.strip()
@@ -127,9 +129,9 @@ class CreateUserForm(Widget):
         }
 
         # use the backend API to create the user:
-        k = self.app._config["dbh"]
+        k = self.app._config["adbh"]
         try:
-            user_id = k.op_user_create(user_data)
+            user_id = await k.op_user_create(user_data)
             if user_id is None:
                 self.notify("Failed to create user. Please try again.", severity="error")
                 return
@@ -0,0 +1,48 @@
+"""Shared fixtures for the FiWa tests."""
+import os
+
+import pytest
+
+from functions.api_server import ApiServer
+from functions.handler_sqllite import SQLLiteHandler
+from functions.loader import get_abs_path
+
+
+SCHEMA_PATH = os.path.join(get_abs_path(), "database", "schema.sql")
+
+
+@pytest.fixture
+def dbh(tmp_path):
+    """Create a handler on a freshly initialized database file."""
+    handler = SQLLiteHandler(db_path=str(tmp_path / "data.sqlite"))
+    handler.initialize_database(schema_path=SCHEMA_PATH)
+    yield handler
+    handler.shutdown()
+
+
+@pytest.fixture
+def user_id(dbh):
+    """Create a logged in user and return its ID."""
+    uid = dbh.op_user_create({
+        "first_name": "Test",
+        "last_name": "User",
+        "username": "tester",
+        "email": "tester@fiwa.com",
+        "password": "secret",
+    })
+    dbh.op_user_login("tester", "secret")
+    return uid
+
+
+@pytest.fixture
+def project_id(dbh, user_id):
+    """Create a project owned by the test user and return its ID."""
+    return dbh.op_project_create({"name": "Household", "currency_main": "EUR"}, user_id)
+
+
+@pytest.fixture
+def server(dbh):
+    """Start the stand-in API server of functions/api_server.py on the test database."""
+    srv = ApiServer(dbh, port=0, record=True).start_in_thread()
+    yield srv
+    srv.stop_thread()
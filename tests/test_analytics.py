@@ -0,0 +1,70 @@
+"""Tests for the vectorized analytics of the Reports screen."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from functions import analytics
+
+
+@pytest.fixture
+def columns(dbh, project_id, user_id):
+    food = dbh.op_label_create({"name": "Food"}, project_id)
+    home = dbh.op_label_create({"name": "Home"}, project_id)
+    dbh.op_item_create_many(project_id, [
+        {"name": "Bread", "price": 2.5, "bought_date": "2026-01-03", "bought_by_id": user_id, "tags": [food]},
+        {"name": "Lamp", "price": 30, "bought_date": "2026-01-20", "bought_by_id": user_id, "tags": [home]},
+        {"name": "Cheese", "price": 7.25, "bought_date": "2026-03-01", "bought_by_id": user_id,
+         "tags": [food, home]},
+    ])
+    return analytics.load_item_columns(dbh, project_id), food, home
+
+
+def test_monthly_totals_include_empty_months(columns):
+    cols, _, _ = columns
+    assert len(cols) == 3
+    assert analytics.monthly_totals(cols) == {
+        "months": ["2026-01", "2026-02", "2026-03"],
+        "totals": [32.5, 0.0, 7.25],
+        "counts": [2, 0, 1],
+    }
+
+
+def test_breakdown_and_pivot_by_label(columns):
+    cols, food, home = columns
+    entries = analytics.breakdown(cols, by="label")
+    assert [(e["key"], e["total"], e["count"]) for e in entries] == [(home, 37.25, 2), (food, 9.75, 2)]
+
+    table = analytics.pivot(cols, by="label")
+    assert table["months"] == ["2026-01", "2026-02", "2026-03"]
+    assert table["values"][:, table["keys"].index(food)].tolist() == [2.5, 0.0, 7.25]
+    with pytest.raises(ValueError):
+        analytics.breakdown(cols, by="shop")
+
+
+def test_cumulative_and_period_totals(columns):
+    cols, _, _ = columns
+    edges = ["2026-01-01", "2026-01-10", "2026-02-01", "2026-04-01"]
+    assert analytics.cumulative(cols, edges).tolist() == [0.0, 2.5, 32.5, 39.75]
+    assert analytics.period_totals(cols, edges).tolist() == [2.5, 30.0, 7.25]
+
+
+def test_load_item_columns_filters_dates(dbh, columns, project_id):
+    cols = analytics.load_item_columns(dbh, project_id, since="2026-02-01", chunk_size=1)
+    assert len(cols) == 1
+    assert sorted(cols.tag_label.tolist()) == sorted([columns[1], columns[2]])
+
+
+def test_load_item_columns_through_the_api(server, columns, project_id):
+    from functions.handler_api import HandlerApi
+
+    api = HandlerApi(base_url=server.url)
+    try:
+        cols = analytics.load_item_columns(api, project_id, chunk_size=2)
+    finally:
+        api.shutdown()
+    local = columns[0]
+    assert cols.item_id.tolist() == local.item_id.tolist()
+    assert cols.price.tolist() == local.price.tolist()
+    assert sorted(zip(cols.tag_item.tolist(), cols.tag_label.tolist())) == \
+        sorted(zip(local.tag_item.tolist(), local.tag_label.tolist()))
+    assert {r.op for r in server.requests} == {"op_item_columns"}
@@ -0,0 +1,119 @@
+"""Tests for the stand-in API server and the load generator."""
+import asyncio
+
+import httpx
+import pytest
+
+from functions.api_server import ApiServer
+from functions.handler_api import HandlerApi
+from functions.handler_sqllite import SQLLiteHandler
+from functions.load_test import format_report, percentile, run_load, seed
+from tests.conftest import SCHEMA_PATH
+
+
+@pytest.fixture
+def api_server(tmp_path):
+    """A stand-in server on its own seeded database, in a background thread."""
+    dbh = SQLLiteHandler(db_path=str(tmp_path / "server.sqlite"))
+    dbh.initialize_database(schema_path=SCHEMA_PATH)
+    ids = seed(dbh, items=200)
+    server = ApiServer(dbh, port=0, bearer_token="secret").start_in_thread()
+    server.ids = ids
+    yield server
+    server.stop_thread()
+
+
+@pytest.fixture
+def api(api_server):
+    handler = HandlerApi(base_url=api_server.url, bearer_token="secret", retries=0)
+    yield handler
+    handler.shutdown()
+
+
+def test_reads_and_writes_through_the_stand_in_server(api, api_server):
+    project_id, user_id = api_server.ids["project_id"], api_server.ids["user_id"]
+    assert len(api.op_label_get_all(project_id)) == 20
+    summary = api.op_item_create_many(project_id, [{"name": "Bread", "price": 2.0, "bought_date": "2026-01-01",
+                                                    "bought_by_id": user_id}])
+    assert summary["created"] == 1
+    assert api.op_search(project_id, "bread")["results"]
+    with pytest.raises(ValueError):
+        api.op_item_delete(999999)
+    assert api_server.stats()["statuses"][400] == 1
+
+
+def test_retried_writes_run_once(api, api_server):
+    project_id, user_id = api_server.ids["project_id"], api_server.ids["user_id"]
+    item = {"name": "Zucchini", "price": 1.0, "bought_date": "2026-01-01", "bought_by_id": user_id}
+    first = api.call_with_key("key-1", "op_item_create_many", project_id, [item])
+    assert api.call_with_key("key-1", "op_item_create_many", project_id, [item]) == first
+    assert api_server.stats()["replayed"] == 1
+    assert [r["id"] for r in api_server.dbh.op_search(project_id, "zucchini")["results"]] == first["item_ids"]
+
+
+def test_etags_compression_and_auth(api_server):
+    project_id = api_server.ids["project_id"]
+    url = f"{api_server.url}/api/ops/op_item_page"
+    params = {"call": '{"args":[%d],"kwargs":{"page_size":200}}' % project_id}
+    headers = {"Authorization": "Bearer secret"}
+    with httpx.Client() as client:
+        first = client.get(url, params=params, headers=headers)
+        assert first.status_code == 200 and first.headers["Content-Encoding"] == "gzip"
+        assert len(first.json()["result"]["items"]) == 200
+        again = client.get(url, params=params, headers=dict(headers, **{"If-None-Match": first.headers["ETag"]}))
+        assert again.status_code == 304
+        assert client.get(url, params=params).status_code == 401
+        assert client.get(f"{api_server.url}/api/ops/op_item_delete", headers=headers).status_code == 405
+    assert api_server.stats()["connections"] == 1
+
+
+def test_bad_requests_and_results_get_an_answer(api_server, monkeypatch):
+    monkeypatch.setattr(api_server.dbh, "op_label_get_all", lambda project_id: object())
+    headers = {"Authorization": "Bearer secret"}
+    with httpx.Client(base_url=api_server.url, headers=headers) as client:
+        response = client.get("/api/ops/op_label_get_all", params={"call": '{"args":[1]}'})
+        assert response.status_code == 500 and response.json()["error"]["type"] == "TypeError"
+        assert client.get("/api/ops/op_item_iter", params={"call": '{"args":[1]}'}).status_code == 404
+        # the connection is still served
+        assert client.get("/api/ops/op_total_number_of_users").status_code == 200
+
+    async def send_bad_length():
+        reader, writer = await asyncio.open_connection(api_server.host, api_server.port)
+        writer.write(b"POST /api/ops/op_label_create HTTP/1.1\r\nContent-Length: many\r\n\r\n")
+        await writer.drain()
+        status_line = await reader.readline()
+        writer.close()
+        return status_line
+
+    assert asyncio.run(send_bad_length()).startswith(b"HTTP/1.1 400")
+
+
+def test_batched_reads(api, api_server):
+    project_id = api_server.ids["project_id"]
+
+    async def reads():
+        try:
+            return await asyncio.gather(api.acall("op_label_get_all", project_id),
+                                        api.acall("op_rollup_get", project_id))
+        finally:
+            await api.aclose()
+
+    labels, rollups = asyncio.run(reads())
+    assert len(labels) == 20 and sum(r["count"] for r in rollups) == 200
+    assert api_server.stats()["batches"] == 1
+
+
+def test_load_generator_reports_latency_percentiles(api_server):
+    ids = api_server.ids
+    report = asyncio.run(run_load(api_server.url, ids["project_id"], ids["user_id"], clients=4, duration=0.5,
+                                  bearer_token="secret", retries=0))
+    assert report["requests"] > 0 and report["errors"] == {}
+    assert report["throughput"] > 0
+    assert report["latency"]["p50"] <= report["latency"]["p95"] <= report["latency"]["p99"] <= report["latency"]["max"]
+    assert "op_label_get_all" in format_report(report, api_server.stats())
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50, 95, 99)
+    assert percentile([7.0], 99) == 7.0 and percentile([], 50) == 0.0
@@ -0,0 +1,39 @@
+"""Tests for the in-process caches."""
+from functions.cache import LRUCache, TTLCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    now = [100.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2, ttl=1)
+    now[0] += 5
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    cache.put("c", 3)
+    cache.put("d", 4)  # full: "a" expires first and is evicted
+    assert len(cache) == 2 and cache.get("a") is None
+    assert cache.invalidate("c") is True
+    assert cache.invalidate("c") is False
+    now[0] += 10
+    assert cache.get("d") is None
+
+
+def test_lru_cache_put_skips_values_read_before_an_invalidation():
+    cache = LRUCache(maxsize=4)
+    generation = cache.generation
+    cache.invalidate("labels")
+    assert cache.put("labels", ["old"], generation=generation) is False
+    assert "labels" not in cache
+    assert cache.put("labels", ["new"], generation=cache.generation) is True
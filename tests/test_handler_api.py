@@ -0,0 +1,276 @@
+"""Tests for the HTTP backend against a stand-in server on localhost."""
+import asyncio
+import json
+import os
+import socket
+import threading
+
+import httpx
+import pytest
+
+from functions.handler_api import ApiError, ApiUnavailable, HandlerApi, REMOTE_OPS, WRITE_OPS, dispatch_batch
+from functions.handler_async import AsyncHandler
+from functions.http_cache import HttpCache
+from screens.settings_label_page import save_label_changes
+
+
+@pytest.fixture
+def api(server):
+    handler = HandlerApi(base_url=server.url, bearer_token="token", backoff=0.01)
+    yield handler
+    handler.shutdown()
+
+
+def test_api_mirrors_the_sqlite_handler(api, server, project_id, user_id):
+    label_id = api.op_label_create({"name": "Groceries"}, project_id)
+    assert [label["label_id"] for label in api.op_label_get_all(project_id)] == [label_id]
+    assert api.op_project_get_info(user_id)[0]["project_name"] == "Household"
+
+    with pytest.raises(ValueError, match="not found"):
+        api.op_label_update(999999, {"name": "Missing"})
+    with pytest.raises(AttributeError):
+        api.op_does_not_exist()
+
+    methods = {r.op: r.method for r in server.requests}
+    assert methods["op_label_create"] == "POST" and methods["op_label_get_all"] == "GET"
+    assert "op_label_create" in WRITE_OPS and "op_label_get_all" not in WRITE_OPS
+    assert {r.authorization for r in server.requests} == {"Bearer token"}
+    # all calls went over one kept-alive connection
+    assert server.stats()["connections"] == 1
+
+
+def test_server_only_runs_remote_ops(api, server, project_id, tmp_path):
+    from functions.handler_sqllite import SQLLiteHandler
+    from functions.outbox import OUTBOX_OPS
+
+    assert all(callable(getattr(SQLLiteHandler, name, None)) for name in REMOTE_OPS)
+    assert OUTBOX_OPS <= REMOTE_OPS
+    assert "op_ensure_indexes" not in REMOTE_OPS and "op_item_iter" not in REMOTE_OPS
+    with pytest.raises(AttributeError):
+        api.op_ensure_indexes
+
+    path = str(tmp_path / "rates.csv")
+    response = httpx.get(f"{server.url}/api/ops/op_ensure_indexes", params={"call": json.dumps({"args": [path]})})
+    assert response.status_code == 404
+    response = httpx.post(f"{server.url}/api/ops/op_unit_of_work", json={"args": [[
+        {"op": "op_label_create", "args": [{"name": "Smuggled"}, project_id]},
+        {"op": "op_rates_import", "args": [path]},
+    ]]})
+    assert response.status_code == 404
+    assert server.dbh.op_label_get_all(project_id) == []
+
+
+def test_api_retries_transient_failures(api, server, project_id):
+    server.fail_next = 2
+    assert api.op_label_create({"name": "Retried"}, project_id)
+    assert len(server.requests) == 3
+    assert len(server.dbh.op_label_get_all(project_id)) == 1
+
+    server.fail_next = 10
+    with pytest.raises(ApiError) as info:
+        api.op_label_get_all(project_id)
+    assert info.value.status == 503
+
+
+def test_api_reports_an_unreachable_server():
+    api = HandlerApi(base_url="http://127.0.0.1:9", retries=1, backoff=0.01, connect_timeout=0.5)
+    with pytest.raises(ApiUnavailable):
+        api.op_total_number_of_users()
+    api.shutdown()
+
+
+def test_api_item_iter_pages_through_items(api, project_id, user_id):
+    api.op_item_create_many(project_id, [
+        {"name": f"Item {i}", "price": 1.0, "bought_date": "2026-01-01", "bought_by_id": user_id}
+        for i in range(25)
+    ])
+    assert len(list(api.op_item_iter(project_id, page_size=10))) == 25
+
+
+@pytest.mark.asyncio
+async def test_async_handler_uses_the_async_client(server, project_id):
+    api = HandlerApi(base_url=server.url)
+    adbh = AsyncHandler(api)
+    try:
+        await asyncio.gather(*[adbh.op_label_create({"name": f"Label {i}"}, project_id) for i in range(5)])
+        labels = await adbh.op_label_get_all(project_id)
+    finally:
+        await api.aclose()
+        adbh.shutdown()
+    assert len(labels) == 5
+    assert adbh._executor is None
+
+
+@pytest.mark.asyncio
+async def test_label_changes_are_saved_in_one_request(server, project_id):
+    label_id = server.dbh.op_label_create({"name": "Groceries"}, project_id)
+    api = HandlerApi(base_url=server.url)
+    adbh = AsyncHandler(api)
+    try:
+        with pytest.raises(NotImplementedError):
+            adbh.atransaction()
+        saved, errors = await save_label_changes(
+            adbh, project_id, [{"name": "Travel"}, {"name": "Groceries"}],
+            {label_id: {"description": "food"}, 999999: {"name": "Missing"}})
+    finally:
+        await api.aclose()
+        adbh.shutdown()
+
+    assert saved == 2
+    assert len(errors) == 2 and "already exists" in errors[0] and "999999" in errors[1]
+    labels = {label["name"]: label for label in server.dbh.op_label_get_all(project_id)}
+    assert set(labels) == {"Groceries", "Travel"}
+    assert labels["Groceries"]["description"] == "food"
+    assert [r.op for r in server.requests] == ["op_unit_of_work"]
+
+
+def test_async_client_of_an_earlier_loop_is_closed(server, project_id):
+    api = HandlerApi(base_url=server.url)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(api.acall("op_label_get_all", project_id), loop).result(5)
+        first = api._aclient
+        asyncio.run(api.acall("op_label_get_all", project_id))
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.1), loop).result(5)
+        assert first.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+
+    # the loop of asyncio.run() is closed: its connections are shut down directly
+    pool = api._aclient._transport._pool
+    sock = pool.connections[0]._connection._network_stream.get_extra_info("socket")
+    with socket.socket(fileno=os.dup(sock.fileno())) as probe:
+        api.shutdown()
+        probe.settimeout(2)
+        assert probe.recv(1) == b""
+
+
+def test_api_reuses_one_client(api, server):
+    api.op_total_number_of_users()
+    client = api._get_client()
+    api.op_total_number_of_users()
+    assert api._get_client() is client
+    assert isinstance(client, httpx.Client)
+    assert server.stats()["connections"] == 1
+
+
+@pytest.mark.asyncio
+async def test_reads_of_one_iteration_share_a_batch_request(server, project_id, user_id):
+    api = HandlerApi(base_url=server.url)
+    label_id = server.dbh.op_label_create({"name": "Groceries"}, project_id)
+    try:
+        labels, again, projects, max_projects, missing = await asyncio.gather(
+            api.acall("op_label_get_all", project_id),
+            api.acall("op_label_get_all", project_id),
+            api.acall("op_project_get_info", user_id),
+            api.acall("op_get_max_projects", user_id),
+            api.acall("op_label_rollup", 999999),
+            return_exceptions=True)
+    finally:
+        await api.aclose()
+
+    assert [r.op for r in server.requests] == ["batch"]
+    assert labels == again and labels is not again
+    assert labels[0]["label_id"] == label_id
+    assert projects[0]["project_name"] == "Household"
+    assert max_projects == server.dbh.op_get_max_projects(user_id)
+    assert isinstance(missing, ValueError)
+
+
+@pytest.mark.asyncio
+async def test_reads_fall_back_to_single_requests_without_batch_endpoint(server, project_id, user_id):
+    server.batch = False
+    api = HandlerApi(base_url=server.url)
+    try:
+        for _ in range(2):
+            labels, projects = await asyncio.gather(api.acall("op_label_get_all", project_id),
+                                                    api.acall("op_project_get_info", user_id))
+    finally:
+        await api.aclose()
+
+    assert labels == [] and projects[0]["project_name"] == "Household"
+    # the batch endpoint is only tried once
+    assert [r.op for r in server.requests].count("batch") == 1
+    assert len(server.requests) == 5
+
+
+def test_batch_rejects_writes(dbh, project_id):
+    body = dispatch_batch(dbh, '{"calls": [{"op": "op_label_create", "call": {"args": [{"name": "X"}, 1]}},'
+                               ' {"op": "op_total_number_of_users"}]}')
+    assert body["results"][0]["status"] == 405
+    assert body["results"][1]["result"] == 1
+    assert dbh.op_label_get_all(project_id) == []
+
+
+@pytest.fixture
+def cached_api(server, tmp_path):
+    handler = HandlerApi(base_url=server.url, cache=HttpCache(str(tmp_path / "http_cache.sqlite")))
+    yield handler
+    handler.shutdown()
+    handler.cache.close()
+
+
+def test_repeated_reads_are_revalidated(cached_api, server, project_id):
+    first = cached_api.op_label_get_all(project_id)
+    again = cached_api.op_label_get_all(project_id)
+    assert first == again == []
+    assert [r.status for r in server.requests] == [200, 304]
+
+    # a write of this client forces a revalidation, which sees the change
+    cached_api.op_label_create({"name": "Groceries"}, project_id)
+    assert [label["name"] for label in cached_api.op_label_get_all(project_id)] == ["Groceries"]
+    assert server.requests[-1].status == 200
+
+
+def test_fresh_responses_are_served_without_request(cached_api, server, project_id):
+    server.cache_control = "max-age=60"
+    cached_api.op_label_get_all(project_id)
+    cached_api.op_label_get_all(project_id)
+    assert len(server.requests) == 1
+
+    server.cache_control = "no-store"
+    cached_api.op_project_get_info(1)
+    cached_api.op_project_get_info(1)
+    assert [r.status for r in server.requests[-2:]] == [200, 200]
+
+
+@pytest.mark.asyncio
+async def test_stale_responses_are_served_while_revalidating(server, project_id, tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite"))
+    api = HandlerApi(base_url=server.url, cache=cache, stale_while_revalidate=300)
+    try:
+        assert await api.acall("op_label_get_all", project_id) == []
+        server.dbh.op_label_create({"name": "Groceries"}, project_id)
+
+        # served from the cache at once, the revalidation runs in the background
+        assert await api.acall("op_label_get_all", project_id) == []
+        await asyncio.gather(*api._tasks)
+        labels = await api.acall("op_label_get_all", project_id)
+    finally:
+        await api.aclose()
+        cache.close()
+
+    assert [label["name"] for label in labels] == ["Groceries"]
+    assert [r.status for r in server.requests] == [200, 200, 304]
+
+
+@pytest.mark.asyncio
+async def test_batch_results_are_cached(server, project_id, user_id, tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite"))
+    api = HandlerApi(base_url=server.url, cache=cache)
+    try:
+        first = await asyncio.gather(api.acall("op_label_get_all", project_id),
+                                     api.acall("op_project_get_info", user_id))
+        second = await asyncio.gather(api.acall("op_label_get_all", project_id),
+                                      api.acall("op_project_get_info", user_id))
+    finally:
+        await api.aclose()
+        cache.close()
+
+    assert first == second
+    assert [r.op for r in server.requests] == ["batch", "op_label_get_all", "op_project_get_info"]
+    assert [r.status for r in server.requests[-2:]] == [304, 304]
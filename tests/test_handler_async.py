@@ -0,0 +1,43 @@
+"""Tests for the asyncio facade over the SQLite handler."""
+import asyncio
+import threading
+
+import pytest
+
+from functions.handler_async import AsyncHandler
+
+
+@pytest.mark.asyncio
+async def test_async_ops_run_off_the_event_loop(dbh, project_id, user_id):
+    adbh = AsyncHandler(dbh, max_workers=2)
+    threads = set()
+    original = dbh.op_label_create
+
+    def create(label_dict, project_id):
+        threads.add(threading.current_thread().name)
+        return original(label_dict, project_id)
+
+    dbh.op_label_create = create
+    try:
+        await asyncio.gather(*[adbh.op_label_create({"name": f"Label {i}"}, project_id) for i in range(6)])
+        labels = await adbh.op_label_get_all(project_id)
+    finally:
+        adbh.shutdown()
+
+    assert len(labels) == 6
+    assert threading.current_thread().name not in threads
+    assert 1 <= len(threads) <= 2
+    with pytest.raises(AttributeError):
+        adbh.execute_query
+
+
+@pytest.mark.asyncio
+async def test_async_item_iter_pages(dbh, project_id, user_id):
+    dbh.op_item_create_many(project_id, [
+        {"name": f"Item {i}", "price": 1, "bought_date": f"2026-01-{i + 1:02d}", "bought_by_id": user_id}
+        for i in range(7)
+    ])
+    adbh = AsyncHandler(dbh)
+    names = [item["name"] async for item in adbh.op_item_iter(project_id, page_size=3)]
+    adbh.shutdown()
+    assert names == [f"Item {i}" for i in range(7)]
@@ -0,0 +1,451 @@
+"""Tests for the SQLite database handler."""
+import threading
+
+import pytest
+
+from functions.cache import LRUCache
+from functions.handler_sqllite import SQLLiteHandler
+from functions.items import item_cursor
+from tests.conftest import SCHEMA_PATH
+
+
+def test_ops_reuse_pooled_connection(dbh, project_id):
+    """A chain of op_ calls borrows one warm connection instead of reconnecting."""
+    dbh.open()
+    first = dbh._pool._all[0]
+
+    session = dbh.op_get_user_sessions()
+
+    assert session["user_info"]["username"] == "tester"
+    assert session["project_info"][0]["project_id"] == project_id
+    assert dbh._pool.open_connections == 1
+    assert dbh._pool._all[0] is first
+    assert dbh._connection is None  # nothing stays borrowed after the op
+
+
+def test_pool_hands_each_thread_its_own_connection(dbh, user_id):
+    results = []
+
+    def worker():
+        results.append(dbh.op_user_get_info(user_id)["username"])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ["tester"] * 8
+    assert dbh._pool.open_connections <= dbh._pool.size
+
+
+def test_shutdown_closes_and_reopens_lazily(dbh, user_id):
+    dbh.open()
+    dbh.shutdown()
+    assert dbh._pool is None
+
+    assert dbh.op_total_number_of_users() == 1
+    assert dbh._pool.open_connections == 1
+
+
+def test_transaction_commits_all_ops_at_once(dbh, project_id):
+    with dbh.transaction():
+        for i in range(5):
+            dbh.op_label_create({"name": f"Label {i}"}, project_id)
+        # not yet visible to other connections
+        other = SQLLiteHandler(db_path=dbh._db_path)
+        assert other.op_label_get_all(project_id) == []
+        other.shutdown()
+
+    assert len(dbh.op_label_get_all(project_id)) == 5
+
+
+def test_transaction_rolls_back_on_error(dbh, project_id):
+    with pytest.raises(RuntimeError):
+        with dbh.transaction():
+            dbh.op_label_create({"name": "Groceries"}, project_id)
+            raise RuntimeError("boom")
+
+    assert dbh.op_label_get_all(project_id) == []
+    assert not dbh.in_transaction()
+
+
+def test_nested_transaction_is_a_savepoint(dbh, project_id):
+    with dbh.transaction():
+        dbh.op_label_create({"name": "Groceries"}, project_id)
+        with pytest.raises(ValueError):
+            with dbh.transaction():
+                dbh.op_label_create({"name": "Rent"}, project_id)
+                dbh.op_label_create({"name": "Groceries"}, project_id)  # duplicate
+        dbh.op_label_create({"name": "Travel"}, project_id)
+
+    names = [label["name"] for label in dbh.op_label_get_all(project_id)]
+    assert names == ["Groceries", "Travel"]
+
+
+@pytest.mark.asyncio
+async def test_async_transaction(dbh, project_id):
+    async with dbh.atransaction() as tx:
+        label_id = await tx.op_label_create({"name": "Groceries"}, project_id)
+        with pytest.raises(ValueError):
+            async with tx.savepoint():
+                await tx.op_label_update(label_id, {"description": "food"})
+                await tx.op_label_create({"name": "Groceries"}, project_id)
+
+    labels = dbh.op_label_get_all(project_id)
+    assert [label["description"] for label in labels] == [""]
+
+
+def test_unit_of_work_rolls_back_failing_calls_only(dbh, project_id):
+    results = dbh.op_unit_of_work([
+        {"op": "op_label_create", "args": [{"name": "Groceries"}, project_id]},
+        {"op": "op_label_create", "args": [{"name": "Groceries"}, project_id]},
+        {"op": "op_label_create", "args": [{"name": "Travel"}, project_id]},
+    ])
+    assert "result" in results[0] and "result" in results[2]
+    assert results[1]["error"]["type"] == "ValueError"
+    assert [label["name"] for label in dbh.op_label_get_all(project_id)] == ["Groceries", "Travel"]
+
+    with pytest.raises(ValueError, match="unknown operation"):
+        dbh.op_unit_of_work([{"op": "op_label_create", "args": [{"name": "Rent"}, project_id]},
+                             {"op": "op_unit_of_work", "args": [[]]}])
+    assert len(dbh.op_label_get_all(project_id)) == 2
+
+
+def test_storage_profile_is_applied_to_connections(dbh):
+    assert dbh.op_storage_info()["journal_mode"] == "delete"
+
+    name = dbh.set_storage_profile({"profile": "balanced", "profiles": {"balanced": {"cache_size": -32000}}})
+    info = dbh.op_storage_info()
+
+    assert name == "balanced"
+    assert info["profile"] == "balanced"
+    assert info["journal_mode"] == "wal"
+    assert info["synchronous"] == "normal"
+    assert info["cache_size"] == -32000
+    assert info["temp_store"] == "memory"
+
+
+def test_storage_profile_rejects_bad_settings(dbh):
+    with pytest.raises(ValueError):
+        dbh.set_storage_profile({"profile": "turbo"})
+    with pytest.raises(ValueError):
+        dbh.set_storage_profile({"profile": "safe", "profiles": {"safe": {"journal_mode": "wal; DROP TABLE x"}}})
+
+
+def test_ensure_indexes_upgrades_existing_database(tmp_path):
+    # a database created from the schema before it declared any indexes
+    schema = open(SCHEMA_PATH, encoding="utf-8").read()
+    old_schema = tmp_path / "old_schema.sql"
+    old_schema.write_text(schema.split("-- Indexes for the hot access paths")[0], encoding="utf-8")
+    handler = SQLLiteHandler(db_path=str(tmp_path / "data.sqlite"))
+    handler.initialize_database(schema_path=str(old_schema))
+
+    reported = []
+    created = handler.op_ensure_indexes(schema_path=SCHEMA_PATH,
+                                        progress=lambda done, total, name, seconds: reported.append((done, total)))
+
+    assert "pstand_users_username_idx" in created
+    assert reported[-1] == (len(created), len(created))
+    # a second run has nothing left to do
+    assert handler.op_ensure_indexes(schema_path=SCHEMA_PATH) == []
+
+    handler.load()
+    plan = handler.execute_query(
+        "EXPLAIN QUERY PLAN SELECT user_id FROM pstand_users WHERE username = ? OR email = ?", ["a", "a"])
+    handler.close()
+    handler.shutdown()
+    assert any("pstand_users_username_idx" in row[3] for row in plan)
+
+
+def test_named_statements_are_rendered_once_and_counted(dbh, project_id):
+    dbh.op_statement_stats(reset=True)
+    sql = dbh._statements.sql("labels.of_project", dbh._db_salt)
+    assert "pstand_labels" in sql
+    assert dbh._statements.sql("labels.of_project", dbh._db_salt) is sql
+
+    for _ in range(3):
+        dbh.op_total_number_of_users()
+
+    stats = {entry["statement"]: entry for entry in dbh.op_statement_stats()}
+    assert stats["users.count"]["count"] == 3
+    assert stats["users.count"]["total_ms"] >= 0
+    with pytest.raises(KeyError):
+        dbh.execute_named("labels.nope")
+
+
+def test_session_context_is_one_cached_query(dbh, project_id, user_id):
+    dbh.op_statement_stats(reset=True)
+    context = dbh.op_session_context()
+    assert context["user_info"]["username"] == "tester"
+    assert [p["project_id"] for p in context["project_info"]] == [project_id]
+
+    context["project_info"].clear()  # callers get their own copy
+    assert dbh.op_get_user_sessions()["project_info"][0]["project_primary"] is True
+    stats = {entry["statement"]: entry["count"] for entry in dbh.op_statement_stats()}
+    assert stats == {"sessions.context": 1}
+
+    # membership changes, logout and login invalidate the cached context
+    second = dbh.op_project_create({"name": "Holidays", "currency_main": "EUR"}, user_id)
+    assert [p["project_id"] for p in dbh.op_session_context()["project_info"]] == [project_id, second]
+    dbh.op_user_logout(context["session_info"]["session_uuid"])
+    assert dbh.op_session_context() == {}
+    dbh.op_user_login("tester", "secret")
+    assert dbh.op_session_context()["user_id"] == user_id
+
+
+def test_session_context_of_a_rolled_back_login_is_not_cached(dbh, user_id):
+    dbh.op_user_logout(dbh.op_session_context()["session_info"]["session_uuid"])
+    assert dbh.op_session_context() == {}
+    with pytest.raises(RuntimeError):
+        with dbh.transaction():
+            dbh.op_user_login("tester", "secret")
+            assert dbh.op_session_context()["user_id"] == user_id
+            raise RuntimeError("rolled back")
+    assert dbh.op_session_context() == dbh.op_session_context(refresh=True) == {}
+
+
+def test_read_cache_skips_results_overtaken_by_a_write(dbh, project_id, monkeypatch):
+    execute_named = dbh.execute_named
+
+    def read_then_write(name, params=None):
+        result = execute_named(name, params)
+        if name == "labels.of_project":
+            # another thread commits a label after this read, before its result is cached
+            writer = threading.Thread(target=dbh.op_label_create, args=({"name": "Food"}, project_id))
+            writer.start()
+            writer.join()
+        return result
+
+    monkeypatch.setattr(dbh, "execute_named", read_then_write)
+    assert dbh.op_label_get_all(project_id) == []
+    monkeypatch.setattr(dbh, "execute_named", execute_named)
+    assert [label["name"] for label in dbh.op_label_get_all(project_id)] == ["Food"]
+
+
+def test_read_cache_is_invalidated_by_writes(dbh, project_id, user_id):
+    dbh.op_cache_stats(reset=True)
+    dbh.op_statement_stats(reset=True)
+    assert dbh.op_label_get_all(project_id) == []
+    dbh.op_label_get_all(project_id)[:] = [None]  # callers get their own copy
+    assert dbh.op_label_get_all(project_id) == []
+    assert dbh.op_get_max_projects(user_id) == dbh.op_get_max_projects(user_id) == 3
+    stats = {entry["statement"]: entry["count"] for entry in dbh.op_statement_stats()}
+    assert stats == {"labels.of_project": 1, "users.max_projects": 1}
+
+    label_id = dbh.op_label_create({"name": "Food"}, project_id)
+    assert [label["name"] for label in dbh.op_label_get_all(project_id)] == ["Food"]
+    dbh.op_label_update(label_id, {"name": "Groceries"})
+    assert [label["name"] for label in dbh.op_label_get_all(project_id)] == ["Groceries"]
+    dbh.op_label_delete(label_id)
+    assert dbh.op_label_get_all(project_id)[0]["label_status"] == 0
+
+    other = dbh.op_user_create({"first_name": "O", "last_name": "U", "username": "other",
+                                "email": "other@fiwa.com", "password": "secret"})
+    assert dbh.op_project_get_info(other) == []
+    dbh.op_project_add_user(project_id, other)
+    dbh.op_project_get_info(user_id)
+    dbh.op_project_update({"project_id": project_id, "name": "Home"})
+    assert dbh.op_project_get_info(other)[0]["project_name"] == "Home"
+    assert dbh.op_project_get_info(user_id)[0]["project_name"] == "Home"
+
+    # a rolled back write leaves nothing stale behind
+    with pytest.raises(RuntimeError):
+        with dbh.transaction():
+            dbh.op_label_create({"name": "Temporary"}, project_id)
+            assert len(dbh.op_label_get_all(project_id)) == 2
+            raise RuntimeError("rollback")
+    assert len(dbh.op_label_get_all(project_id)) == 1
+
+    stats = dbh.op_cache_stats()
+    assert stats["hits"] >= 3 and stats["misses"] >= 8 and stats["invalidations"] >= 5
+
+
+def test_read_cache_evicts_least_recently_used(dbh, user_id):
+    dbh._read_cache = LRUCache(maxsize=2)
+    for project_id in (1, 2, 3, 1):
+        dbh.op_label_get_all(project_id)
+    assert dbh.op_cache_stats() == {"size": 2, "maxsize": 2, "hits": 0, "misses": 4,
+                                    "evictions": 2, "invalidations": 0, "hit_rate": 0.0}
+
+
+def _items(count, user_id, start_day=1):
+    for i in range(count):
+        yield {
+            "name": f"Item {i}",
+            "price": f"{i}.50",
+            "bought_date": f"2026-01-{start_day + i % 28:02d}",
+            "bought_by_id": user_id,
+            "tags": [],
+        }
+
+
+def test_item_create_many_inserts_in_chunks(dbh, project_id, user_id):
+    summary = dbh.op_item_create_many(project_id, _items(25, user_id), chunk_size=10)
+
+    assert summary["created"] == 25
+    assert summary["skipped"] == 0
+    assert len(summary["item_ids"]) == 25
+
+    dbh.load()
+    rows = dbh.execute_query("SELECT item_id, price, currency, bought_date, item_uuid FROM pstand_items ORDER BY item_id")
+    dbh.close()
+    assert [row[0] for row in rows] == summary["item_ids"]
+    assert rows[3][1:4] == (3.5, "EUR", "2026-01-04T00:00:00")
+    assert len({row[4] for row in rows}) == 25
+
+
+def test_item_create_many_accepts_tuples(dbh, project_id, user_id):
+    summary = dbh.op_item_create_many(project_id, [("Coffee", 3.2, "usd", "2026-02-01T08:30:00", user_id)])
+    assert summary["created"] == 1
+
+
+def test_item_create_many_is_atomic(dbh, project_id, user_id):
+    items = list(_items(5, user_id))
+    items[3]["price"] = "abc"
+
+    with pytest.raises(ValueError, match="Item 3"):
+        dbh.op_item_create_many(project_id, items, chunk_size=2)
+    assert dbh.op_item_create_many(project_id, [], return_ids=False)["created"] == 0
+
+    summary = dbh.op_item_create_many(project_id, items, skip_invalid=True)
+    assert summary["created"] == 4
+    assert summary["errors"][0][0] == 3
+    assert summary["item_ids"] == [1, 2, 3, 4]
+
+
+def test_item_iter_pages_with_keyset_cursor(dbh, project_id, user_id):
+    items = list(_items(30, user_id))
+    for i, item in enumerate(items):
+        item["bought_date"] = "2026-03-01" if i % 2 else "2026-02-01"  # many equal dates
+        item["tags"] = [1] if i % 3 == 0 else []
+    dbh.op_item_create_many(project_id, items)
+
+    seen = list(dbh.op_item_iter(project_id, page_size=7))
+    keys = [(item["bought_date"], item["item_id"]) for item in seen]
+    assert len(seen) == 30
+    assert keys == sorted(keys)
+
+    page = dbh.op_item_page(project_id, page_size=10)
+    rest = list(dbh.op_item_iter(project_id, page_size=7, cursor=page["next_cursor"]))
+    assert [item["item_id"] for item in page["items"] + rest] == [item["item_id"] for item in seen]
+    assert item_cursor(seen[-1]) is not None
+    assert list(dbh.op_item_iter(project_id, cursor=item_cursor(seen[-1]))) == []
+
+    march = list(dbh.op_item_iter(project_id, since="2026-03-01", until="2026-04-01", page_size=4))
+    assert len(march) == 15
+    tagged = list(dbh.op_item_iter(project_id, labels=[1], page_size=4))
+    assert len(tagged) == 10
+    assert tagged[0]["tags"] == [1]
+
+    with pytest.raises(ValueError):
+        dbh.op_item_page(project_id, cursor="not-a-cursor")
+
+
+def test_item_label_filters_use_association_table(dbh, project_id, user_id):
+    items = list(_items(12, user_id))
+    for i, item in enumerate(items):
+        item["tags"] = [label for label, step in ((1, 2), (2, 3)) if i % step == 0]
+    ids = dbh.op_item_create_many(project_id, items)["item_ids"]
+
+    any_ids = [item["item_id"] for item in dbh.op_item_iter(project_id, labels=[1, 2], page_size=3)]
+    all_ids = [item["item_id"] for item in dbh.op_item_iter(project_id, labels=[1, 2], label_mode="all", page_size=3)]
+    assert any_ids == [ids[i] for i in range(12) if i % 2 == 0 or i % 3 == 0]
+    assert all_ids == [ids[0], ids[6]]
+
+    # the association table follows updates and deletes of the items
+    dbh.op_item_update(ids[1], {"tags": [1, 2]})
+    dbh.op_item_delete(ids[0])
+    all_ids = [item["item_id"] for item in dbh.op_item_iter(project_id, labels=[2, 1], label_mode="all")]
+    assert all_ids == [ids[1], ids[6]]
+
+    dbh.load()
+    plan = dbh.execute_query(
+        "EXPLAIN QUERY PLAN SELECT item_id FROM pstand_item_labels WHERE label_id = 1 AND project_id = 1 "
+        "ORDER BY bought_date, item_id")
+    dbh.close()
+    assert any("pstand_item_labels_label_idx" in row[3] for row in plan)
+    with pytest.raises(ValueError):
+        dbh.op_item_page(project_id, labels=[1], label_mode="most")
+
+def test_rollups_follow_item_writes(dbh, project_id, user_id):
+    food = dbh.op_label_create({"name": "Food", "description": ""}, project_id)
+    home = dbh.op_label_create({"name": "Home", "description": ""}, project_id)
+    ids = dbh.op_item_create_many(project_id, [
+        {"name": "Bread", "price": 2.5, "bought_date": "2026-01-03", "bought_by_id": user_id, "tags": [food]},
+        {"name": "Lamp", "price": 30, "bought_date": "2026-01-20", "bought_by_id": user_id, "tags": [home]},
+        {"name": "Cheese", "price": 7.25, "bought_date": "2026-02-01", "bought_by_id": user_id,
+         "tags": [food, home]},
+    ])["item_ids"]
+
+    monthly = dbh.op_rollup_get(project_id)
+    assert [(r["begin"], r["count"], r["sum"]) for r in monthly] == [("2026-01-01", 2, 32.5),
+                                                                     ("2026-02-01", 1, 7.25)]
+    by_label = dbh.op_rollup_get(project_id, "label", since="2026-02-15", until="2026-02-15")
+    assert {r["key"]: r["sum"] for r in by_label} == {food: 7.25, home: 7.25}
+
+    # moving the lamp to February and dropping the bread empties the food label in January
+    dbh.op_item_update(ids[1], {"bought_date": "2026-02-10", "price": "20"})
+    dbh.op_item_delete(ids[0])
+    assert [(r["begin"], r["count"], r["sum"]) for r in dbh.op_rollup_get(project_id)] == [("2026-02-01", 2, 27.25)]
+    assert [(r["key"], r["sum"]) for r in dbh.op_rollup_get(project_id, "label", until="2026-01-31")] == []
+    assert dbh.op_rollup_get(project_id, "bought_by")[0]["key"] == user_id
+    assert dbh.op_item_get(ids[1])["price_final"] == 20.0
+
+
+def test_rollup_rebuild_matches_incremental_rollups(dbh, project_id, user_id):
+    dbh.op_item_create_many(project_id, _items(100, user_id), chunk_size=30)
+    dbh.op_item_create_many(project_id, _items(10, user_id, start_day=2))
+    incremental = {dim: dbh.op_rollup_get(project_id, dim) for dim in ("project", "bought_for")}
+
+    assert dbh.op_rollup_rebuild(project_id) == 3  # project, bought_by and bought_for in January
+    assert {dim: dbh.op_rollup_get(project_id, dim) for dim in ("project", "bought_for")} == incremental
+    assert incremental["project"][0]["count"] == 110
+
+
+def test_label_closure_follows_composite_changes(dbh, project_id, user_id):
+    bread = dbh.op_label_create({"name": "Bread"}, project_id)
+    cheese = dbh.op_label_create({"name": "Cheese"}, project_id)
+    food = dbh.op_label_create({"name": "Food", "composite": [bread, cheese]}, project_id)
+    household = dbh.op_label_create({"name": "Household", "composite": [food]}, project_id)
+    dbh.op_item_create_many(project_id, [
+        {"name": "Baguette", "price": 2, "bought_date": "2026-01-03", "bought_by_id": user_id, "tags": [bread]},
+        {"name": "Sandwich", "price": 5, "bought_date": "2026-02-03", "bought_by_id": user_id,
+         "tags": [bread, cheese]},
+        {"name": "Soap", "price": 3, "bought_date": "2026-02-04", "bought_by_id": user_id, "tags": [household]},
+    ])
+
+    assert dbh.op_label_descendants(household) == [(household, 0), (food, 1), (bread, 2), (cheese, 2)]
+    assert dbh.op_label_ancestors(cheese) == [(cheese, 0), (food, 1), (household, 2)]
+    assert dbh.op_label_rollup(household) == {"label_id": household, "count": 3, "sum": 10.0}
+    assert dbh.op_label_rollup(food, since="2026-02-01")["sum"] == 5.0
+
+    # a second path to bread, then removing the first one keeps bread below household
+    dbh.op_label_update(household, {"composite": [food, bread]})
+    dbh.op_label_update(food, {"composite": [cheese]})
+    assert dbh.op_label_descendants(household) == [(household, 0), (bread, 1), (food, 1), (cheese, 2)]
+    assert dbh.op_label_ancestors(bread) == [(bread, 0), (household, 1)]
+
+    # a hard delete unlinks the label from its parents
+    dbh.op_label_delete(bread, hard_delete=True)
+    labels = {label["label_id"]: label for label in dbh.op_label_get_all(project_id)}
+    assert labels[household]["composite"] == [food]
+    assert dbh.op_label_descendants(household) == [(household, 0), (food, 1), (cheese, 2)]
+
+
+def test_label_composite_rejects_cycles(dbh, project_id):
+    leaf = dbh.op_label_create({"name": "Leaf"}, project_id)
+    middle = dbh.op_label_create({"name": "Middle", "composite": [leaf]}, project_id)
+    top = dbh.op_label_create({"name": "Top", "composite": [middle]}, project_id)
+
+    with pytest.raises(ValueError, match="cycle"):
+        dbh.op_label_update(leaf, {"composite": [top]})
+    with pytest.raises(ValueError, match="cycle"):
+        dbh.op_label_update(middle, {"composite": [leaf, middle]})
+    with pytest.raises(ValueError, match="not found"):
+        dbh.op_label_create({"name": "Other", "composite": [999]}, project_id)
+
+    # the failed updates left the hierarchy untouched
+    labels = {label["label_id"]: label for label in dbh.op_label_get_all(project_id)}
+    assert labels[leaf]["composite"] == []
+    assert dbh.op_label_ancestors(leaf) == [(leaf, 0), (middle, 1), (top, 2)]
@@ -0,0 +1,61 @@
+"""Tests for the on-disk HTTP response cache."""
+from functions.http_cache import HttpCache, parse_cache_control
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_control_is_parsed():
+    assert parse_cache_control('max-age=60, stale-while-revalidate="30", no-cache') == {
+        "max-age": 60.0, "stale-while-revalidate": 30.0, "no-cache": True}
+    assert parse_cache_control(None) == {}
+
+
+def test_freshness_and_revalidation(tmp_path):
+    clock = FakeClock()
+    cache = HttpCache(str(tmp_path / "cache.sqlite"), clock=clock)
+    assert not cache.put("plain", b"{}")
+    assert cache.put("key", b'{"result": 1}', etag='"a"', max_age=10, stale_while_revalidate=20)
+
+    entry = cache.get("key")
+    assert entry.is_fresh(clock.now) and entry.validators() == {"If-None-Match": '"a"'}
+    clock.now += 15
+    entry = cache.get("key")
+    assert not entry.is_fresh(clock.now) and entry.is_usable_stale(clock.now)
+    cache.refresh("key", max_age=10)
+    assert cache.get("key").is_fresh(clock.now)
+
+    cache.expire_all()
+    entry = cache.get("key")
+    assert not entry.is_fresh(clock.now) and not entry.is_usable_stale(clock.now)
+    cache.close()
+
+    # the entries outlive the process
+    reopened = HttpCache(str(tmp_path / "cache.sqlite"), clock=clock)
+    assert reopened.get("key").body == b'{"result": 1}'
+    assert reopened.stats()["bytes"] == 13
+    reopened.close()
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    clock = FakeClock()
+    cache = HttpCache(str(tmp_path / "cache.sqlite"), max_bytes=300, clock=clock)
+    for key in "abc":
+        clock.now += 1
+        cache.put(key, b"x" * 100, etag=key)
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.put("d", b"x" * 100, etag="d")
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert not cache.put("huge", b"x" * 301, etag="h")
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["bytes"] == 300 and stats["evictions"] == 1
+    cache.close()
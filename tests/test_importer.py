@@ -0,0 +1,71 @@
+"""Tests for the streaming CSV import."""
+from functions.importer import import_csv, parse_mapping
+
+
+def test_import_csv_maps_columns_and_reports_bad_rows(dbh, project_id, user_id, tmp_path):
+    path = tmp_path / "items.csv"
+    lines = ["Description;Amount;Date;Note"]
+    lines += [f"Item {i};{i}.50;2026-02-{i % 28 + 1:02d};" for i in range(1, 26)]
+    lines.insert(5, "Broken;not a number;2026-02-01;")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    calls = []
+    summary = import_csv(
+        dbh, str(path), project_id,
+        mapping=parse_mapping("name=Description, price=Amount, bought_date=Date"),
+        defaults={"bought_by_id": user_id},
+        commit_every=10,
+        progress=lambda read, total, rows: calls.append((read, total, rows)),
+    )
+
+    assert summary["created"] == 25
+    assert summary["skipped"] == 1
+    assert summary["errors"][0][0] == 6
+    assert "price" in summary["errors"][0][1]
+    assert len(calls) == 3
+    assert calls[-1] == (path.stat().st_size, path.stat().st_size, 25)
+
+    dbh.load()
+    rows = dbh.execute_query("SELECT name, price, currency, bought_by_id FROM pstand_items ORDER BY item_id")
+    dbh.close()
+    assert rows[0] == ("Item 1", 1.5, "EUR", user_id)
+
+
+def test_import_csv_stops_between_transactions(dbh, project_id, user_id, tmp_path):
+    path = tmp_path / "items.csv"
+    lines = ["name,price,bought_date"] + [f"Item {i},1,2026-01-01" for i in range(30)]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+    summary = import_csv(dbh, str(path), project_id, defaults={"bought_by_id": user_id},
+                         commit_every=10, should_stop=lambda: True)
+
+    assert summary["stopped"] is True
+    assert summary["created"] == 10
+
+
+def test_import_csv_reports_progress_within_a_transaction(dbh, project_id, user_id, tmp_path):
+    path = tmp_path / "items.csv"
+    lines = ["name,price,bought_date"] + [f"Item {i},1,2026-01-01" for i in range(25)]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+    calls = []
+    summary = import_csv(dbh, str(path), project_id, defaults={"bought_by_id": user_id},
+                         commit_every=20, progress_every=5,
+                         progress=lambda read, total, rows: calls.append(rows))
+
+    assert summary["created"] == 25
+    assert calls == [5, 10, 15, 20, 25]
+
+
+def test_import_csv_reports_the_file_line_of_bad_rows(dbh, project_id, user_id, tmp_path):
+    path = tmp_path / "items.csv"
+    path.write_text('name,price,bought_date,note\n'
+                    'Bread,1,2026-01-01,\n'
+                    '\n'
+                    'Lamp,30,2026-01-02,"two\nlines"\n'
+                    'Broken,cheap,2026-01-03,\n', encoding="utf-8")
+
+    summary = import_csv(dbh, str(path), project_id, defaults={"bought_by_id": user_id})
+
+    assert summary["created"] == 2
+    assert summary["errors"][0][0] == 6
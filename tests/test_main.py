@@ -39,6 +39,9 @@ def mock_config():
     # Mock the op_get_current_user method
     mock_dbh.op_get_current_user.return_value = "TestUser"
 
+    # a local handler has no outbox of offline writes
+    mock_dbh.outbox = None
+
     return {
         "dbh": mock_dbh,
         "other_key": "other_value"
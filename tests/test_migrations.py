@@ -0,0 +1,182 @@
+"""Tests for the versioned schema migrations."""
+import pytest
+
+from functions.handler_sqllite import SQLLiteHandler
+from functions.migrations import get_version, latest_version, rewrite_table, run_migrations
+from tests.conftest import SCHEMA_PATH
+
+
+def _add_items(dbh, project_id, user_id, count):
+    dbh.load()
+    with dbh.transaction():
+        for i in range(count):
+            dbh.execute_query(
+                """INSERT INTO pstand_items (item_uuid, name, price, price_final, currency, currency_final,
+                   bought_date, bought_by_id, bought_for_id, added_by_id, project_id, tags)
+                   VALUES (?, ?, ?, ?, 'EUR', 'EUR', ?, ?, ?, ?, ?, '[]')""",
+                [f"uuid-{i}", f"Item {i}", 1.25 + i, 1.25 + i, "2026-01-01", user_id, user_id, user_id, project_id]
+            )
+    dbh.close()
+
+
+def _strict_items_migration(fail_after=None):
+    """A test migration moving pstand_items to integer cents, optionally crashing mid-copy."""
+    batches = []
+
+    def apply(dbh, progress):
+        def report(copied, total):
+            batches.append(copied)
+            if fail_after is not None and len(batches) == fail_after:
+                raise RuntimeError("interrupted")
+            progress(copied, total)
+
+        rewrite_table(
+            dbh, "pstand_items",
+            create_sql="""CREATE TABLE {table} (
+                item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                price_cents INTEGER NOT NULL,
+                project_id INTEGER NOT NULL
+            ) STRICT""",
+            columns=["item_id", "name", "price_cents", "project_id"],
+            select_exprs=["item_id", "name", "CAST(ROUND(price * 100) AS INTEGER)", "project_id"],
+            key="item_id",
+            post_sql=["CREATE INDEX IF NOT EXISTS pstand_items_project_idx ON pstand_items (project_id)"],
+            batch_size=3,
+            progress=report,
+        )
+
+    return [{"version": latest_version() + 1, "description": "strict items", "online": True, "apply": apply}], batches
+
+
+def test_new_database_is_stamped_with_latest_version(dbh):
+    assert get_version(dbh) == latest_version()
+    assert run_migrations(dbh) == []
+
+
+def test_existing_database_is_migrated(tmp_path):
+    path = str(tmp_path / "data.sqlite")
+    schema = open(SCHEMA_PATH, encoding="utf-8").read()
+    old_schema = tmp_path / "old_schema.sql"
+    # the schema before the item label table and the indexes
+    old_schema.write_text(schema.split("-- Item to label associations")[0], encoding="utf-8")
+
+    old = SQLLiteHandler(db_path=path)
+    old.initialize_database(schema_path=str(old_schema))
+    uid = old.op_user_create({"first_name": "Old", "last_name": "User", "username": "old",
+                              "email": "old@fiwa.com", "password": "secret"})
+    pid = old.op_project_create({"name": "Household", "currency_main": "EUR"}, uid)
+    old.load()
+    old.execute_query("PRAGMA user_version = 0")
+    old.execute_query(
+        """INSERT INTO pstand_items (item_uuid, name, price, price_final, currency, currency_final,
+           bought_date, bought_by_id, bought_for_id, added_by_id, project_id, tags)
+           VALUES ('uuid-1', 'Bread', 2.5, 2.5, 'EUR', 'EUR', '2026-01-03T00:00:00', ?, ?, ?, ?, '[4, 7]')""",
+        [uid, uid, uid, pid])
+    for name, composite in (("Bread", "[]"), ("Food", "[1]")):
+        old.execute_query("""INSERT INTO pstand_labels (name, description, project_id, composite)
+                             VALUES (?, '', ?, ?)""", [name, pid, composite])
+    old.close()
+    old.shutdown()
+
+    handler = SQLLiteHandler(db_path=path)
+    assert handler.initialize_database(schema_path=SCHEMA_PATH) == 2
+    assert get_version(handler) == latest_version()
+    handler.load()
+    indexes = {row[0] for row in handler.execute_query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    labels = handler.execute_query("SELECT item_id, label_id, bought_date FROM pstand_item_labels ORDER BY label_id")
+    handler.close()
+    assert "pstand_items_project_date_idx" in indexes
+    assert labels == [(1, 4, "2026-01-03T00:00:00"), (1, 7, "2026-01-03T00:00:00")]
+    assert [r["count"] for r in handler.op_rollup_get(pid)] == [1]
+    assert handler.op_label_descendants(2) == [(2, 0), (1, 1)]
+    assert {(r["kind"], r["id"]) for r in handler.op_search(pid, "bread")["results"]} == {("item", 1), ("label", 1)}
+    assert [c["item_uuid"] for c in handler.op_sync_changes(pid)["changes"]] == ["uuid-1"]
+    handler.shutdown()
+
+
+def test_rewrite_table_resumes_after_interruption(dbh, project_id, user_id):
+    _add_items(dbh, project_id, user_id, 10)
+    migrations = _strict_items_migration(fail_after=2)[0]
+
+    with pytest.raises(RuntimeError):
+        run_migrations(dbh, migrations=migrations, progress=lambda *args: None)
+    assert get_version(dbh) == latest_version()
+
+    # changes made while the rewrite is paused are mirrored into the new table
+    dbh.load()
+    dbh.execute_query("UPDATE pstand_items SET price = 99 WHERE name = 'Item 0'")
+    dbh.execute_query("DELETE FROM pstand_items WHERE name = 'Item 9'")
+    dbh.close()
+
+    migrations, batches = _strict_items_migration()
+    assert run_migrations(dbh, migrations=migrations, progress=lambda *args: None) == [latest_version() + 1]
+    assert batches[0] == 9  # the first two batches were not copied again
+    assert get_version(dbh) == latest_version() + 1
+
+    dbh.load()
+    rows = dbh.execute_query("SELECT name, price_cents FROM pstand_items ORDER BY item_id")
+    dbh.close()
+    assert len(rows) == 9
+    assert rows[0] == ("Item 0", 9900)
+    assert rows[1] == ("Item 1", 225)
+
+
+def test_rewrite_table_keeps_the_triggers(dbh, project_id, user_id):
+    food = dbh.op_label_create({"name": "Food"}, project_id)
+    dbh.op_item_create_many(project_id, [
+        {"name": f"Bread {i}", "price": 2.5, "bought_date": "2026-01-03", "bought_by_id": user_id, "tags": [food]}
+        for i in range(5)
+    ])
+    dbh.load()
+    create_sql = dbh.execute_query("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'pstand_items'")[0][0]
+    columns = [row[1] for row in dbh.execute_query("PRAGMA table_info(pstand_items)")]
+    triggers = dbh.execute_query("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'pstand_items'")
+    dbh.close()
+
+    rewrite_table(dbh, "pstand_items", create_sql.replace("pstand_items", "{table}", 1), columns,
+                  key="item_id", batch_size=2)
+
+    dbh.load()
+    assert sorted(dbh.execute_query(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'pstand_items'")) == sorted(triggers)
+    dbh.close()
+    assert triggers
+
+    item_id = dbh.op_item_create_many(project_id, [
+        {"name": "Coffee", "price": 4, "bought_date": "2026-02-01", "bought_by_id": user_id, "tags": [food]}
+    ])["item_ids"][0]
+    assert item_id == 6
+    assert [r["id"] for r in dbh.op_search(project_id, "coffee")["results"]] == [item_id]
+    dbh.op_item_update(item_id, {"tags": []})
+    dbh.op_item_delete(1)
+
+    dbh.load()
+    labelled = dbh.execute_query("SELECT item_id FROM pstand_item_labels ORDER BY item_id")
+    dbh.close()
+    assert labelled == [(2,), (3,), (4,), (5,)]
+    changes = dbh.op_sync_changes(project_id)["changes"]
+    assert len(changes) == 6 and changes[-2]["item"]["name"] == "Coffee" and changes[-1]["deleted"]
+
+
+def test_rewrite_table_keeps_indexes_and_the_sequence(dbh, project_id, user_id):
+    _add_items(dbh, project_id, user_id, 5)
+    dbh.load()
+    dbh.execute_query("DELETE FROM pstand_items WHERE item_id > 3")
+    create_sql = dbh.execute_query("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'pstand_items'")[0][0]
+    columns = [row[1] for row in dbh.execute_query("PRAGMA table_info(pstand_items)")]
+    index_query = "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'pstand_items' AND sql IS NOT NULL"
+    indexes = sorted(dbh.execute_query(index_query))
+    dbh.close()
+    assert indexes
+
+    rewrite_table(dbh, "pstand_items", create_sql.replace("pstand_items", "{table}", 1), columns, key="item_id")
+
+    dbh.load()
+    assert sorted(dbh.execute_query(index_query)) == indexes
+    assert dbh.execute_query("SELECT seq FROM sqlite_sequence WHERE name = 'pstand_items'") == [(5,)]
+    dbh.close()
+    _add_items(dbh, project_id, user_id, 1)
+    dbh.load()
+    assert dbh.execute_query("SELECT MAX(item_id) FROM pstand_items") == [(6,)]
+    dbh.close()
@@ -0,0 +1,142 @@
+"""Tests for the durable outbox of the API backend."""
+import time
+
+import pytest
+
+from functions.handler_api import HandlerApi
+from functions.outbox import Outbox
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.sqlite"), clock=FakeClock())
+    yield box
+    box.close()
+
+
+@pytest.fixture
+def api(server, outbox):
+    handler = HandlerApi(base_url=server.url, outbox=outbox, retries=0)
+    yield handler
+    handler.shutdown()
+
+
+def test_writes_are_queued_and_replayed_in_order(api, outbox, server, project_id, user_id):
+    label_id = api.op_label_create({"name": "Groceries"}, project_id)
+    item = {"name": "Bread", "price": 2.0, "bought_date": "2026-01-01", "bought_by_id": user_id}
+    summary = api.op_item_create_many(project_id, [item, dict(item, name="Milk")])
+    api.op_item_create_many(project_id, [dict(item, name="Eggs")])
+    assert api.op_label_update(label_id, {"description": "Food"}) is True
+
+    # nothing reached the server yet except the label creation
+    assert summary["queued"] and summary["created"] == 2
+    assert [r.op for r in server.requests] == ["op_label_create"]
+    assert outbox.counts() == {"pending": 3, "failed": 0}
+
+    result = outbox.replay(api)
+    assert result["sent"] == 3 and result["pending"] == 0
+    # the two item entries of the project were merged into one call
+    assert [r.op for r in server.requests] == ["op_label_create", "op_item_create_many", "op_label_update"]
+    names = sorted(i["name"] for i in server.dbh.op_item_page(project_id)["items"])
+    assert names == ["Bread", "Eggs", "Milk"]
+    assert server.dbh.op_label_get_all(project_id)[0]["description"] == "Food"
+
+
+def test_replay_waits_for_an_unreachable_server(outbox, project_id, user_id, server):
+    offline = HandlerApi(base_url="http://127.0.0.1:9", outbox=outbox, retries=0, connect_timeout=0.5)
+    offline.op_item_create_many(project_id, [{"name": "Bread", "price": 2.0, "bought_date": "2026-01-01",
+                                              "bought_by_id": user_id}])
+    offline.op_item_delete(12345)
+
+    result = outbox.replay(offline)
+    assert result["sent"] == 0 and result["pending"] == 2
+    entries = outbox.entries()
+    assert entries[0]["attempts"] == 1 and "ApiUnavailable" in entries[0]["last_error"]
+    # the retry is not due yet
+    assert outbox.replay(offline)["sent"] == 0
+    offline.shutdown()
+
+    online = HandlerApi(base_url=server.url, outbox=outbox, retries=0)
+    outbox._clock.now += 10
+    result = outbox.replay(online)
+    online.shutdown()
+    # the item arrived, the delete of a missing item was rejected and kept as failed
+    assert result["sent"] == 1 and result["failed"] == 1 and result["pending"] == 0
+    assert outbox.entries("failed")[0]["op"] == "op_item_delete"
+    assert len(server.dbh.op_item_page(project_id)["items"]) == 1
+    assert outbox.retry_failed() == 1 and outbox.discard_failed() == 0
+
+
+def test_replayed_items_are_stored_once(api, outbox, server, project_id, user_id):
+    api.op_item_create_many(project_id, [{"name": "Bread", "price": 2.0, "bought_date": "2026-01-01",
+                                          "bought_by_id": user_id}])
+    entry = outbox.entries()[0]
+    outbox.replay(api)
+
+    # the response got lost: the same write is queued again under a new key
+    with outbox._lock:
+        outbox._connection.execute("INSERT INTO outbox (idempotency_key, op, call, created_at) VALUES (?, ?, ?, 0)",
+                                   ("other-key", entry["op"], entry["call"]))
+    assert outbox.replay(api)["sent"] == 1
+    assert len(server.dbh.op_item_page(project_id)["items"]) == 1
+
+
+def test_outbox_survives_a_restart(tmp_path, project_id, user_id):
+    path = str(tmp_path / "outbox.sqlite")
+    first = Outbox(path)
+    first.enqueue("op_label_delete", 1)
+    first.close()
+    second = Outbox(path)
+    assert second.counts() == {"pending": 1, "failed": 0}
+    with pytest.raises(ValueError):
+        second.enqueue("op_label_create", {"name": "X"}, 1)
+    second.close()
+
+
+def test_background_replay_after_open(server, tmp_path, project_id):
+    box = Outbox(str(tmp_path / "outbox.sqlite"))
+    api = HandlerApi(base_url=server.url, outbox=box)
+    label_id = server.dbh.op_label_create({"name": "Groceries"}, project_id)
+    api.open()
+    try:
+        api.op_label_update(label_id, {"name": "Food"})
+        for _ in range(200):
+            if box.counts()["pending"] == 0:
+                break
+            time.sleep(0.01)
+    finally:
+        api.shutdown()
+        box.close()
+    assert server.dbh.op_label_get_all(project_id)[0]["name"] == "Food"
+
+
+def test_item_writes_by_keyword_and_generator(api, outbox, server, project_id, user_id):
+    item = {"name": "Bread", "price": 2.0, "bought_date": "2026-01-01", "bought_by_id": user_id}
+    by_keyword = api.op_item_create_many(project_id, items=[item, dict(item, name="Milk")])
+    assert by_keyword["created"] == 2 and by_keyword["item_ids"] == [None, None]
+    assert len(set(by_keyword["item_uuids"])) == 2
+    from_generator = api.op_item_create_many(project_id, (dict(item, name=n) for n in ("Eggs", "Tea", "Jam")),
+                                             return_ids=False)
+    assert from_generator["created"] == 3 and "item_ids" not in from_generator
+    assert outbox.counts() == {"pending": 2, "failed": 0}
+
+    # both entries have the same form and travel in one merged call
+    assert outbox.replay(api)["sent"] == 2
+    assert [r.op for r in server.requests] == ["op_item_create_many"]
+    stored = {i["item_uuid"]: i["name"] for i in server.dbh.op_item_page(project_id)["items"]}
+    assert sorted(stored.values()) == ["Bread", "Eggs", "Jam", "Milk", "Tea"]
+    assert set(by_keyword["item_uuids"] + from_generator["item_uuids"]) == set(stored)
+
+
+def test_malformed_item_writes_are_not_queued(api, outbox, project_id):
+    with pytest.raises(TypeError):
+        api.op_item_create_many(project_id)
+    assert outbox.counts() == {"pending": 0, "failed": 0}
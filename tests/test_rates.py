@@ -0,0 +1,73 @@
+"""Tests for the local exchange-rate store."""
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+ECB_CSV = """Date,USD,GBP,
+2026-10-16,1.1000,0.8000,
+2026-10-15,1.0800,N/A,
+2026-10-14,1.0500,0.8500,
+"""
+
+
+@pytest.fixture
+def rates_file(tmp_path):
+    path = tmp_path / "eurofxref-hist.csv"
+    path.write_text(ECB_CSV, encoding="utf-8")
+    return str(path)
+
+
+def test_rates_import_and_as_of_lookups(dbh, rates_file):
+    summary = dbh.op_rates_import(rates_file)
+    assert summary == {"rates": 5, "currencies": ["GBP", "USD"],
+                       "first_date": "2026-10-14", "last_date": "2026-10-16"}
+
+    # Saturday falls back to Friday's rate; GBP was not quoted on the 15th
+    assert dbh.op_rate_get("EUR", "USD", "2026-10-17") == 1.1
+    assert dbh.op_rate_get("EUR", "GBP", "2026-10-15") == 0.85
+    assert dbh.op_rate_get("usd", "eur", "2026-10-14") == pytest.approx(1 / 1.05)
+    assert dbh.op_rate_get("USD", "GBP", "2026-10-16") == pytest.approx(0.8 / 1.1)
+    assert dbh.op_rate_get("EUR", "USD", "2026-10-13") is None
+    assert dbh.op_rate_get("EUR", "EUR", "2026-10-13") == 1.0
+
+
+def test_rates_reload_clears_cache(dbh, rates_file, tmp_path):
+    dbh.op_rates_import(rates_file)
+    assert dbh.op_rate_get("EUR", "USD", "2026-10-20") == 1.1
+
+    newer = tmp_path / "eurofxref.csv"
+    newer.write_text("Date, USD, \n19 October 2026, 1.2000, \n", encoding="utf-8")
+    dbh.op_rates_import(str(newer))
+    assert dbh.op_rate_get("EUR", "USD", "2026-10-20") == 1.2
+
+
+def test_items_get_exchange_rate_of_bought_date(dbh, project_id, user_id, rates_file):
+    dbh.op_rates_import(rates_file)
+    summary = dbh.op_item_create_many(project_id, [
+        {"name": "Book", "price": 11.0, "currency": "USD", "bought_date": "2026-10-16", "bought_by_id": user_id},
+        {"name": "Tea", "price": 2.0, "currency": "USD", "exchange_rate": 0.5,
+         "bought_date": "2026-10-16", "bought_by_id": user_id},
+    ])
+    book, tea = (dbh.op_item_get(item_id) for item_id in summary["item_ids"])
+    assert book["exchange_rate"] == pytest.approx(1 / 1.1)
+    assert book["price_final"] == pytest.approx(10.0)
+    assert tea["exchange_rate"] == 0.5
+
+    dbh.op_item_update(book["item_id"], {"bought_date": "2026-10-14"})
+    book = dbh.op_item_get(book["item_id"])
+    assert book["price_final"] == round(11.0 / 1.05, 2)
+    assert book["exchange_rate_date"].startswith("2026-10-14")
+
+
+def test_rates_convert_vectorized(dbh, rates_file):
+    dbh.op_rates_import(rates_file)
+    result = dbh.op_rates_convert(
+        [110.0, 10.0, 5.0, 1.0],
+        ["USD", "EUR", "GBP", "USD"],
+        ["2026-10-16", "2026-10-18", "2026-10-15", "2026-10-01"],
+        "EUR",
+    )
+    assert result[:3] == pytest.approx([100.0, 10.0, 5.0 / 0.85])
+    assert math.isnan(result[3])
@@ -0,0 +1,66 @@
+"""Tests for the full-text search over items and labels."""
+import pytest
+
+from functions.search import build_match_query
+
+
+def test_build_match_query_quotes_user_input():
+    assert build_match_query('hardware store') == '"hardware" AND "store"'
+    assert build_match_query('"hardware store" rec*') == '"hardware store" AND "rec" *'
+    assert build_match_query('"hardware st"* NEAR(') == '"hardware st" * AND "NEAR("'
+    with pytest.raises(ValueError):
+        build_match_query(' - * ')
+
+
+def test_search_follows_item_and_label_writes(dbh, project_id, user_id):
+    summary = dbh.op_item_create_many(project_id, [
+        {"name": "Screws", "note": "hardware store receipt", "price": 4.0,
+         "bought_date": "2026-04-12", "bought_by_id": user_id},
+        {"name": "Hardware", "note": "", "price": 9.0, "bought_date": "2025-04-12", "bought_by_id": user_id},
+        {"name": "Bread", "note": "bakery, not a store for hardware", "price": 2.0,
+         "bought_date": "2026-04-13", "bought_by_id": user_id},
+    ])
+    screws, hardware, bread = summary["item_ids"]
+    label_id = dbh.op_label_create({"name": "Household", "description": "Hardware and tools"}, project_id)
+
+    results = dbh.op_search(project_id, "hardware")["results"]
+    assert {(r["kind"], r["id"]) for r in results} == {
+        ("item", screws), ("item", hardware), ("item", bread), ("label", label_id)}
+    assert [r["rank"] for r in results] == sorted(r["rank"] for r in results)
+
+    phrase = dbh.op_search(project_id, '"hardware store"')["results"]
+    assert [(r["kind"], r["id"]) for r in phrase] == [("item", screws)]
+    assert phrase[0]["text"] == "hardware store receipt"
+
+    spring = dbh.op_search(project_id, "hard*", kinds="item", since="2026-03-01", until="2026-06-01")
+    assert {r["id"] for r in spring["results"]} == {screws, bread}
+
+    dbh.op_item_update(screws, {"note": "garden centre"})
+    dbh.op_item_delete(bread)
+    dbh.op_label_update(label_id, {"description": "Everything for the house"})
+    assert [r["id"] for r in dbh.op_search(project_id, "hardware")["results"]] == [hardware]
+    assert dbh.op_search(project_id, "garden")["results"][0]["id"] == screws
+    assert dbh.op_search(project_id, "house")["results"][0]["kind"] == "label"
+
+    other = dbh.op_project_create({"name": "Other", "currency_main": "EUR"}, user_id)
+    assert dbh.op_search(other, "hardware")["results"] == []
+
+
+def test_search_pages_with_cursor(dbh, project_id, user_id):
+    dbh.op_item_create_many(project_id, [
+        {"name": f"Coffee {i}", "note": "coffee " * (i % 4), "price": 1.0,
+         "bought_date": "2026-01-01", "bought_by_id": user_id}
+        for i in range(23)
+    ])
+    expected = dbh.op_search(project_id, "coffee", page_size=100)["results"]
+
+    seen = []
+    cursor = None
+    while True:
+        page = dbh.op_search(project_id, "coffee", page_size=10, cursor=cursor)
+        seen.extend(page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(expected) == 23
+    assert [(r["kind"], r["id"]) for r in seen] == [(r["kind"], r["id"]) for r in expected]
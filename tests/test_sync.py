@@ -0,0 +1,111 @@
+"""Tests for the delta sync between a local replica and the API server."""
+import time
+
+import pytest
+
+from functions.handler_api import HandlerApi
+from functions.handler_sqllite import SQLLiteHandler
+from functions.sync import DeltaSync, change_version
+from tests.conftest import SCHEMA_PATH
+
+
+@pytest.fixture
+def replica(tmp_path, dbh, project_id):
+    """A second database with the same user and project as the server's."""
+    handler = SQLLiteHandler(db_path=str(tmp_path / "replica.sqlite"))
+    handler.initialize_database(schema_path=SCHEMA_PATH)
+    uid = handler.op_user_create({"first_name": "Test", "last_name": "User", "username": "tester",
+                                  "email": "tester@fiwa.com", "password": "secret"})
+    assert handler.op_project_create({"name": "Household", "currency_main": "EUR"}, uid) == project_id
+    yield handler
+    handler.shutdown()
+
+
+@pytest.fixture
+def api(server):
+    handler = HandlerApi(base_url=server.url, retries=0)
+    yield handler
+    handler.shutdown()
+
+
+def _item(name, user_id, price=2.0):
+    return {"name": name, "price": price, "bought_date": "2026-01-01", "bought_by_id": user_id}
+
+
+def _items(handler, project_id):
+    return {i["item_uuid"]: (i["name"], i["price"]) for i in handler.op_item_page(project_id, page_size=1000)["items"]}
+
+
+def test_changes_travel_both_ways(replica, api, dbh, project_id, user_id):
+    dbh.op_item_create_many(project_id, [_item("Bread", user_id), _item("Milk", user_id)])
+    replica.op_item_create_many(project_id, [_item("Eggs", user_id, 3.0)])
+    sync = DeltaSync(replica, api, page_size=1)
+
+    result = sync.sync()
+    assert result["pushed"] == 1 and result["pulled"] == 2 and result["conflicts"] == 0
+    assert _items(replica, project_id) == _items(dbh, project_id)
+    assert replica.op_rollup_get(project_id) == dbh.op_rollup_get(project_id)
+
+    # nothing changed: the pushed item comes back once and is recognized, then nothing moves
+    assert sync.sync()["pulled"] == 0
+    assert sync.sync()["pushed"] == 0
+
+    eggs = next(i for i in replica.op_item_page(project_id)["items"] if i["name"] == "Eggs")
+    replica.op_item_update(eggs["item_id"], {"price": 4.0})
+    bread = next(i for i in dbh.op_item_page(project_id)["items"] if i["name"] == "Bread")
+    dbh.op_item_delete(bread["item_id"])
+    result = sync.sync()
+    assert result["pushed"] == 1 and result["pulled"] == 1
+    assert sorted(_items(replica, project_id).values()) == [("Eggs", 4.0), ("Milk", 2.0)]
+    assert _items(replica, project_id) == _items(dbh, project_id)
+    assert replica.op_rollup_get(project_id) == dbh.op_rollup_get(project_id)
+
+
+def test_the_later_change_wins_on_both_sides(replica, api, dbh, project_id, user_id):
+    dbh.op_item_create_many(project_id, [_item("Bread", user_id)])
+    sync = DeltaSync(replica, api)
+    sync.sync()
+    local_id = replica.op_item_page(project_id)["items"][0]["item_id"]
+    server_id = dbh.op_item_page(project_id)["items"][0]["item_id"]
+
+    replica.op_item_update(local_id, {"name": "Bread (local)"})
+    time.sleep(0.01)
+    dbh.op_item_update(server_id, {"name": "Bread (server)"})
+    result = sync.sync()
+    assert result["conflicts"] == 1
+    assert [name for name, _ in _items(replica, project_id).values()] == ["Bread (server)"]
+
+    # an edit of the replica after the server's wins the other way round
+    time.sleep(0.01)
+    replica.op_item_update(local_id, {"name": "Bread (local)"})
+    sync.sync()
+    assert [name for name, _ in _items(dbh, project_id).values()] == ["Bread (local)"]
+    assert sync.sync() == dict(sync.last_result, pushed=0, pulled=0, conflicts=0)
+
+
+def test_tie_breaks_are_the_same_on_both_sides():
+    edit = {"changed_at": "2026-01-01T00:00:00.000Z", "deleted": False, "item": {"name": "A"}}
+    other = dict(edit, item={"name": "B"})
+    delete = {"changed_at": edit["changed_at"], "deleted": True, "item": None}
+    assert change_version(delete) > change_version(edit)
+    assert max(edit, other, key=change_version) is max(other, edit, key=change_version)
+    assert change_version(dict(edit, changed_at="2026-01-01T00:00:00.001Z")) > change_version(delete)
+
+
+def test_large_payloads_are_compressed(replica, api, server, project_id, user_id):
+    replica.op_item_create_many(project_id, [_item(f"Item {i}", user_id) for i in range(200)])
+    DeltaSync(replica, api).sync()
+    assert len(_items(server.dbh, project_id)) == 200
+    # the pushed changes were sent compressed, the pulled page came back compressed
+    assert ("gzip", None) in [(r.request_encoding, r.response_encoding) for r in server.requests]
+    assert (None, "gzip") in [(r.request_encoding, r.response_encoding) for r in server.requests]
+
+
+def test_pull_watermark_survives_a_restart(replica, dbh, project_id, user_id):
+    dbh.op_item_create_many(project_id, [_item("Bread", user_id)])
+    assert DeltaSync(replica, dbh, name="server").sync()["pulled"] == 1
+    dbh.op_item_create_many(project_id, [_item("Milk", user_id)])
+    # a new sync object continues after the watermark stored in the replica
+    result = DeltaSync(replica, dbh, name="server").pull(project_id)
+    assert result["pulled"] == 1
+    assert replica.op_sync_watermark(f"pull:server:{project_id}") == 2
@@ -0,0 +1,82 @@
+"""Tests for the single writer thread with group commit."""
+import asyncio
+import threading
+
+import pytest
+
+from functions.handler_async import AsyncHandler
+
+
+def test_concurrent_writes_share_commits(dbh, project_id, user_id):
+    writer = dbh.start_writer(max_delay=0.02)
+    barrier = threading.Barrier(8)
+    ids = []
+
+    def create(n):
+        barrier.wait()
+        for i in range(5):
+            ids.append(dbh.op_label_create({"name": f"Label {n}-{i}"}, project_id))
+
+    threads = [threading.Thread(target=create, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = writer.stats()
+    assert len(set(ids)) == 40
+    assert stats["operations"] == 40
+    assert stats["batches"] < 40
+    assert stats["largest_batch"] > 1
+    # the cached label list was dropped by the writer's commits
+    assert len(dbh.op_label_get_all(project_id)) == 40
+
+    dbh.stop_writer()
+    assert dbh.writer is None
+    assert dbh.op_label_create({"name": "Direct"}, project_id)
+
+
+def test_failing_write_only_fails_its_own_future(dbh, project_id, user_id):
+    writer = dbh.start_writer(max_delay=0.05)
+
+    def fail(handler):
+        handler.op_label_create({"name": "Rolled back"}, project_id)
+        raise ValueError("rejected")
+
+    futures = [writer.submit("op_label_create", {"name": "First"}, project_id),
+               writer.submit(fail),
+               writer.submit("op_label_update", 999999, {"name": "Missing"}),
+               writer.submit("op_label_create", {"name": "Last"}, project_id)]
+    assert futures[0].result(timeout=5) and futures[3].result(timeout=5)
+    with pytest.raises(ValueError, match="rejected"):
+        futures[1].result(timeout=5)
+    with pytest.raises(ValueError):
+        futures[2].result(timeout=5)
+    assert writer.stats()["failed"] == 2
+
+    names = {label["name"] for label in dbh.op_label_get_all(project_id)}
+    assert names == {"First", "Last"}
+
+
+def test_writes_inside_a_transaction_bypass_the_writer(dbh, project_id, user_id):
+    writer = dbh.start_writer()
+    with dbh.transaction():
+        dbh.op_label_create({"name": "Inside"}, project_id)
+    assert writer.stats()["operations"] == 0
+    dbh.op_label_create({"name": "Outside"}, project_id)
+    assert writer.stats()["operations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_writes_are_awaited_on_the_writer(dbh, project_id, user_id):
+    writer = dbh.start_writer()
+    adbh = AsyncHandler(dbh, max_workers=2)
+    try:
+        ids = await asyncio.gather(*[adbh.op_label_create({"name": f"Label {i}"}, project_id) for i in range(10)])
+        assert await writer.asubmit("op_label_delete", ids[0], hard_delete=True)
+        labels = await adbh.op_label_get_all(project_id)
+    finally:
+        adbh.shutdown()
+
+    assert len(labels) == 9
+    assert writer.stats()["operations"] == 11